@@ -39,7 +39,9 @@ import re
 import os
 import hashlib
 import sqlite3
+import threading
 import requests
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import chromadb
@@ -61,59 +63,149 @@ EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 TOP_K_MEMORY = 5
 MEMORY_EXPIRE_DAYS = 90
 
+# SQLite连接配置
+SQLITE_SYNCHRONOUS = "NORMAL"   # WAL模式下NORMAL即可保证一致性
+SQLITE_CACHE_SIZE_KB = 16384    # 每条连接的页缓存大小（KB）
+SQLITE_STATEMENT_CACHE = 128    # 每条连接缓存的预编译语句数
+SQLITE_BUSY_TIMEOUT_MS = 5000   # 锁等待超时（毫秒）
+
 # ====================== 2. 元数据数据库类 ======================
+class SQLiteConnectionManager:
+    def __init__(self, db_path, synchronous=SQLITE_SYNCHRONOUS, cache_size_kb=SQLITE_CACHE_SIZE_KB,
+                 statement_cache=SQLITE_STATEMENT_CACHE, busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS):
+        """
+        SQLite连接管理器：每个线程持有一条长连接，复用预编译语句
+        :param db_path: 数据库文件路径
+        :param synchronous: 同步级别（WAL模式下NORMAL即可保证一致性）
+        :param cache_size_kb: 页缓存大小（KB）
+        :param statement_cache: 每条连接缓存的预编译语句数
+        :param busy_timeout_ms: 锁等待超时（毫秒）
+        """
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache = statement_cache
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+
+    def _connect(self):
+        """创建新连接并设置PRAGMA"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def get_connection(self):
+        """获取当前线程的长连接（不存在则创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            return conn
+        conn = self._connect()
+        with self._lock:
+            self._connections.append(conn)
+            self._local.conn = conn
+            self._local.generation = self._generation
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """事务上下文：正常退出提交，异常回滚"""
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def fetchall(self, sql, params=()):
+        """执行只读查询并返回全部结果"""
+        return self.get_connection().execute(sql, params).fetchall()
+
+    def close(self):
+        """关闭所有线程持有的连接"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    print(f"关闭SQLite连接失败：{e}")
+            self._connections = []
+            self._generation += 1
+
+# 语句文本保持固定，长连接上的预编译语句缓存才能命中
+CREATE_METADATA_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS memory_metadata (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_hash TEXT UNIQUE NOT NULL,
+        type TEXT NOT NULL,
+        create_time TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        weight REAL DEFAULT 1.0,
+        expire_time TEXT NOT NULL
+    )
+'''
+INSERT_METADATA_SQL = '''
+    INSERT OR REPLACE INTO memory_metadata 
+    (content_hash, type, create_time, user_id, weight, expire_time)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+FILTER_METADATA_SQL = '''
+    SELECT content_hash FROM memory_metadata 
+    WHERE user_id = ? AND expire_time > ?
+'''
+UPDATE_WEIGHT_SQL = '''
+    UPDATE memory_metadata 
+    SET weight = weight + ? 
+    WHERE content_hash = ? AND weight + ? <= 2.0
+'''
+SELECT_EXPIRED_SQL = '''
+    SELECT content_hash FROM memory_metadata 
+    WHERE user_id = ? AND expire_time <= ?
+'''
+DELETE_EXPIRED_SQL = '''
+    DELETE FROM memory_metadata 
+    WHERE user_id = ? AND expire_time <= ?
+'''
+
 class MemoryMetadataDB:
     def __init__(self, db_path):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool = SQLiteConnectionManager(db_path)
         self._init_db()
 
     def _init_db(self):
         """初始化元数据数据库表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS memory_metadata (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content_hash TEXT UNIQUE NOT NULL,
-                type TEXT NOT NULL,
-                create_time TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                weight REAL DEFAULT 1.0,
-                expire_time TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute(CREATE_METADATA_TABLE_SQL)
 
     def add_metadata(self, content_hash, memory_type, user_id, weight=1.0, expire_days=90):
         """添加记忆元数据"""
         create_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         expire_time = (datetime.now() + timedelta(days=expire_days)).strftime("%Y-%m-%d %H:%M:%S")
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO memory_metadata 
-                (content_hash, type, create_time, user_id, weight, expire_time)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (content_hash, memory_type, create_time, user_id, weight, expire_time))
-            conn.commit()
+            with self.pool.transaction() as conn:
+                conn.execute(INSERT_METADATA_SQL, (content_hash, memory_type, create_time, user_id, weight, expire_time))
             return True
         except Exception as e:
             print(f"添加元数据失败：{e}")
             return False
-        finally:
-            conn.close()
 
     def filter_by_metadata(self, user_id, memory_type=None, days=None):
         """基于元数据筛选记忆哈希"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        query = '''
-            SELECT content_hash FROM memory_metadata 
-            WHERE user_id = ? AND expire_time > ?
-        '''
+        query = FILTER_METADATA_SQL
         params = [user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
         
         if memory_type:
@@ -125,22 +217,22 @@ class MemoryMetadataDB:
             query += " AND create_time >= ?"
             params.append(start_time)
         
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        conn.close()
+        results = self.pool.fetchall(query, params)
         return [r[0] for r in results]
 
     def update_weight(self, content_hash, delta=0.1):
         """更新记忆权重"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE memory_metadata 
-            SET weight = weight + ? 
-            WHERE content_hash = ? AND weight + ? <= 2.0
-        ''', (delta, content_hash, delta))
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute(UPDATE_WEIGHT_SQL, (delta, content_hash, delta))
+
+    def get_expired_hashes(self, user_id, now):
+        """查询指定时间点已过期的记忆哈希"""
+        return [r[0] for r in self.pool.fetchall(SELECT_EXPIRED_SQL, (user_id, now))]
+
+    def delete_expired(self, user_id, now):
+        """删除指定时间点已过期的记忆元数据"""
+        with self.pool.transaction() as conn:
+            return conn.execute(DELETE_EXPIRED_SQL, (user_id, now)).rowcount
 
 # ====================== 3. 向量数据库类 ======================
 class VectorMemoryDB:
@@ -252,26 +344,13 @@ class VectorMemoryDB:
         if not self.use_vector_db:
             return 0
         
-        conn = sqlite3.connect(metadata_db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT content_hash FROM memory_metadata 
-            WHERE user_id = ? AND expire_time <= ?
-        ''', (user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        expired_hashes = [r[0] for r in cursor.fetchall()]
-        conn.close()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        expired_hashes = metadata_db.get_expired_hashes(user_id, now)
         
         if expired_hashes:
             self.collection.delete(ids=expired_hashes)
         
-        conn = sqlite3.connect(metadata_db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            DELETE FROM memory_metadata 
-            WHERE user_id = ? AND expire_time <= ?
-        ''', (user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-        conn.close()
+        metadata_db.delete_expired(user_id, now)
         return len(expired_hashes)
 
 # ====================== 4. 智能体核心类 ======================
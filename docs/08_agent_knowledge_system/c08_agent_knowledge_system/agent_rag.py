@@ -1,8 +1,10 @@
 import re
 import json
+import time
 import requests
-from dashscope import Generation
+from concurrent.futures import ThreadPoolExecutor
 from structured_memory import MemoryMetadataDB, VectorMemoryDB
+from memory_sweeper import ExpiredMemorySweeper
 from knowledge_manager import KnowledgeManager
 from config import *
 
@@ -14,9 +16,16 @@ class RAGEnabledAgent:
         # 初始化结构化记忆
         self.metadata_db = MemoryMetadataDB(SQLITE_DB_PATH)
         self.vector_db = VectorMemoryDB(VECTOR_DB_PATH, EMBEDDING_MODEL)
+        self.vector_db.sync_memory_metadata(self.metadata_db)
+        self.vector_db.sync_keyword_indexes()
+        self.memory_sweeper = ExpiredMemorySweeper(self.vector_db, self.metadata_db)
+        self.memory_sweeper.start()
         
         # 初始化知识库
-        self.knowledge_manager = KnowledgeManager()
+        self.knowledge_manager = KnowledgeManager(vector_db=self.vector_db)
+        # 记忆与知识库两路上下文并发检索
+        self._context_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-retrieval")
+        self.last_retrieval_stats = {}
         
         # 工具映射表
         self.tool_map = {
@@ -29,6 +38,7 @@ class RAGEnabledAgent:
     def call_llm(self, prompt):
         """调用通义千问API"""
         try:
+            from dashscope import Generation
             response = Generation.call(
                 model="qwen-turbo",
                 api_key=self.dashscope_api_key,
@@ -172,14 +182,18 @@ class RAGEnabledAgent:
                 memory_type=memory_info["type"]
             )
 
-    def retrieve_structured_memory(self, user_input):
-        """检索结构化记忆"""
+    def retrieve_structured_memory(self, user_input, query_embedding=None):
+        """
+        检索结构化记忆
+        :param query_embedding: 已编码的查询向量（与知识库检索共用，不再重复编码）
+        """
         retrieved_memories = self.vector_db.retrieve_memory(
             query=user_input,
             metadata_db=self.metadata_db,
             user_id=self.user_id,
             days=30,
-            top_k=TOP_K_MEMORY
+            top_k=TOP_K_MEMORY,
+            query_embedding=query_embedding
         )
         
         if retrieved_memories:
@@ -191,12 +205,45 @@ class RAGEnabledAgent:
             return ""
 
     # ---------------- RAG核心逻辑 ----------------
+    def _timed_context(self, retrieve_fn, *args):
+        """执行一路上下文检索并计时；失败时返回空上下文，不影响另一路"""
+        start = time.perf_counter()
+        try:
+            context = retrieve_fn(*args)
+        except Exception as e:
+            print(f"上下文检索失败：{e}")
+            context = ""
+        return context, (time.perf_counter() - start) * 1000
+
     def retrieve_all_context(self, user_input):
-        """获取所有上下文（记忆+知识库）"""
-        # 1. 结构化记忆
-        memory_context = self.retrieve_structured_memory(user_input)
-        # 2. 外部知识库
-        knowledge_context = self.knowledge_manager.search_knowledge(user_input)
+        """
+        获取所有上下文（记忆+知识库）
+        查询只编码一次，两路共用同一个向量并发检索，延迟约为较慢一路；各段耗时记录在 last_retrieval_stats
+        """
+        start = time.perf_counter()
+        query_embedding = None
+        if self.vector_db.use_vector_db:
+            try:
+                query_embedding = self.vector_db.encode(user_input)
+            except Exception as e:
+                print(f"查询编码失败，由各路检索自行编码：{e}")
+        encode_ms = (time.perf_counter() - start) * 1000
+        # 1. 结构化记忆 / 2. 外部知识库（并发）
+        memory_future = self._context_executor.submit(
+            self._timed_context, self.retrieve_structured_memory, user_input, query_embedding
+        )
+        knowledge_future = self._context_executor.submit(
+            self._timed_context, self.knowledge_manager.search_knowledge,
+            user_input, TOP_K_KNOWLEDGE, KNOWLEDGE_SEARCH_MODE, query_embedding
+        )
+        memory_context, memory_ms = memory_future.result()
+        knowledge_context, knowledge_ms = knowledge_future.result()
+        self.last_retrieval_stats = {
+            "encode_ms": round(encode_ms, 2),
+            "memory_ms": round(memory_ms, 2),
+            "knowledge_ms": round(knowledge_ms, 2),
+            "total_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
         # 合并
         full_context = ""
         if memory_context:
@@ -0,0 +1,82 @@
+import os
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+# ====================== 降级记忆日志存储 ======================
+class BasicMemoryJournal:
+    def __init__(self, path, max_items, legacy_path=None):
+        """
+        降级用记忆存储：追加写JSONL日志 + 内存尾部缓存，定期压缩
+        :param path: JSONL日志文件路径
+        :param max_items: 保留的最大记忆条数
+        :param legacy_path: 旧版JSON数组文件路径（存在时首次加载自动迁移）
+        """
+        self.path = path
+        self.max_items = max_items
+        self.legacy_path = legacy_path
+        self._items = deque(maxlen=max_items)
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """加载日志；遇到崩溃时写了一半的行则丢弃并重写日志，避免后续追加写接在残行上"""
+        if not os.path.exists(self.path):
+            self._migrate_legacy()
+            return
+        corrupted = False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    self._items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    corrupted = True
+        if corrupted:
+            self._compact()
+
+    def _migrate_legacy(self):
+        """将旧版JSON数组文件迁移为JSONL日志"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                self._items.extend(json.load(f))
+            self._compact()
+            os.replace(self.legacy_path, self.legacy_path + ".bak")
+            print(f"降级记忆已迁移为JSONL日志：{self.path}")
+        except Exception as e:
+            print(f"迁移旧版记忆文件失败：{e}")
+
+    def _compact(self):
+        """压缩：仅保留内存中的最近记录，写临时文件后原子替换"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for item in self._items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._lines = len(self._items)
+
+    def append(self, content):
+        """追加一条记忆：O(1)写入，日志超过两倍上限时压缩"""
+        item = {
+            "content": content,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._items.append(item)
+            self._lines += 1
+            if self._lines >= 2 * self.max_items:
+                self._compact()
+        return item
+
+    def items(self):
+        """返回内存中的记忆快照（按写入顺序）"""
+        with self._lock:
+            return list(self._items)
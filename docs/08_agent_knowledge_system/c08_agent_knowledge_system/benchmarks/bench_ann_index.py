@@ -0,0 +1,71 @@
+"""
+IVF近似索引基准：不同nprobe下的检索延迟与recall@10（以flat精确检索结果为基准）
+数据为归一化的高斯混合向量（模拟按主题聚集的文本嵌入），查询为库内向量加噪声
+用法：python benchmarks/bench_ann_index.py [--size 1000000] [--dim 384] [--nprobe 8 16 32 64]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from numpy_vector_store import NumpyVectorCollection
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def make_vectors(rng, n, topics, spread):
+    vectors = topics[rng.integers(0, len(topics), n)] + spread * rng.standard_normal((n, topics.shape[1])).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def search(collection, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query([query], n_results=10, include=())
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(result["ids"][0]))
+    return latencies, results
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--size", type=int, default=1000000)
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--topics", type=int, default=10000)
+    arg_parser.add_argument("--spread", type=float, default=0.03)
+    arg_parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32, 64])
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--batch", type=int, default=20000)
+    arg_parser.add_argument("--dtype", default="float32")
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((args.topics, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        metadata = {"vector_index": "ivf", "vector_dtype": args.dtype, "vector_rescore_factor": 4}
+        collection = NumpyVectorCollection("bench", tmp_dir, metadata=metadata)
+        start = time.perf_counter()
+        for offset in range(0, args.size, args.batch):
+            n = min(args.batch, args.size - offset)
+            collection.upsert(ids=[f"v{offset + i}" for i in range(n)], embeddings=make_vectors(rng, n, topics, args.spread))
+        print(f"写入 {args.size} 条（含索引训练）：{time.perf_counter() - start:.1f}s，簇数 {collection._ivf.nlist}")
+
+        start = time.perf_counter()
+        reloaded = NumpyVectorCollection("bench", tmp_dir)
+        print(f"重新加载（不重训）：{time.perf_counter() - start:.2f}s")
+
+        queries = make_vectors(rng, args.queries, topics, args.spread)
+        reloaded.modify(metadata={**metadata, "vector_index": "flat"})
+        exact_latencies, truth = search(reloaded, queries)
+        reloaded.modify(metadata=metadata)
+        print(f"{'nprobe':<10}{'p50(ms)':>10}{'p99(ms)':>10}{'recall@10':>12}")
+        print(f"{'flat':<10}{percentile(exact_latencies, 0.5):>10.2f}{percentile(exact_latencies, 0.99):>10.2f}{1.0:>12.3f}")
+        for nprobe in args.nprobe:
+            reloaded.nprobe = nprobe
+            latencies, results = search(reloaded, queries)
+            recall = np.mean([len(r & t) / len(t) for r, t in zip(results, truth)])
+            print(f"{nprobe:<10}{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.99):>10.2f}{recall:>12.3f}")
@@ -0,0 +1,87 @@
+"""
+Markdown解析基准：原实现（markdown渲染后丢弃HTML + 全文整体分割）与按章节解析的耗时、片段数与章节对齐度对比
+合成文档由多级标题、中英文正文和代码块组成，每个句子带所属章节编号（§n），据此统计：
+每个片段混入的章节数（对齐度，理想为1），以及覆盖一个章节需要的片段数（检索一个章节的答案要取回的片段数）
+用法：python benchmarks/bench_markdown_parser.py [--docs 50] [--sections 40]（原实现对比需安装markdown包）
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from document_parser import MarkdownParser
+from text_splitter import TextSplitter
+
+CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+WORDS = ["agent", "memory", "vector", "index", "query", "cache", "model", "token", "chunk", "embedding", "retrieval"]
+SECTION_RE = re.compile(r"§(\d+)")
+
+def make_markdown(rng, sections):
+    """生成一篇合成文档：章节随机为1~3级标题，正文若干句（带§章节号），约三分之一章节含代码块"""
+    lines = []
+    for sec in range(sections):
+        lines.append("#" * int(rng.integers(1, 4)) + f" 第{sec}节 {rng.choice(WORDS)}")
+        for _ in range(int(rng.integers(3, 25))):
+            if rng.random() < 0.6:
+                lines.append("".join(rng.choice(list(CHARS), int(rng.integers(10, 40)))) + f"§{sec}。")
+            else:
+                lines.append(" ".join(rng.choice(WORDS, int(rng.integers(5, 15)))).capitalize() + f" §{sec}.")
+        if rng.random() < 0.33:
+            lines += ["```python", f"# §{sec} example", "def handler(event):", "    return event.get('query')", "```"]
+        lines.append("")
+    return "\n".join(lines)
+
+def legacy_parse(splitter, file_path):
+    """原实现：渲染HTML后丢弃，全文整体分割"""
+    import markdown
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    markdown.markdown(content)
+    return splitter.split_text(content)
+
+def alignment(chunks):
+    """(每个片段平均混入的章节数, 覆盖一个章节平均需要的片段数)"""
+    per_chunk, per_section = [], {}
+    for idx, chunk in enumerate(chunks):
+        sections = set(SECTION_RE.findall(chunk))
+        if sections:
+            per_chunk.append(len(sections))
+        for sec in sections:
+            per_section.setdefault(sec, set()).add(idx)
+    return np.mean(per_chunk), np.mean([len(v) for v in per_section.values()])
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--docs", type=int, default=50)
+    arg_parser.add_argument("--sections", type=int, default=40)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    splitter = TextSplitter()
+    parser = MarkdownParser()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(args.docs):
+            path = os.path.join(tmp_dir, f"doc{i}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(make_markdown(rng, args.sections))
+            paths.append(path)
+        size_mb = sum(os.path.getsize(p) for p in paths) / 1024 / 1024
+
+        results = {}
+        for name, parse_fn in [("原实现", lambda p: legacy_parse(splitter, p)),
+                               ("按章节解析", lambda p: [c["content"] for c in parser.parse(p)])]:
+            start = time.perf_counter()
+            docs = [parse_fn(p) for p in paths]
+            elapsed = time.perf_counter() - start
+            mixed, covering = zip(*(alignment(chunks) for chunks in docs))
+            results[name] = (elapsed, sum(len(c) for c in docs), np.mean(mixed), np.mean(covering))
+
+    print(f"语料：{args.docs} 篇，{size_mb:.1f} MB")
+    print(f"{'方式':<12}{'耗时(s)':>10}{'片段数':>10}{'片段混入章节数':>16}{'覆盖章节所需片段':>18}")
+    for name, (elapsed, count, mixed, covering) in results.items():
+        print(f"{name:<12}{elapsed:>10.2f}{count:>10}{mixed:>16.2f}{covering:>18.2f}")
@@ -0,0 +1,65 @@
+"""
+记忆检索基准：向量库原生元数据过滤下，单用户记忆量增长时的查询延迟
+用法：python benchmarks/bench_memory_query.py [--sizes 100 1000 10000 100000] [--dim 384]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import chromadb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structured_memory import build_memory_metadata, build_memory_filter
+
+MEMORY_TYPES = ["USER_PREFERENCE", "TASK_RECORD", "TOOL_RESULT", "CONTEXT_INFO"]
+
+def add_memories(collection, user_id, start, count, dim, rng, batch_size=5000):
+    """为指定用户批量写入随机记忆向量"""
+    now = int(time.time())
+    for offset in range(start, start + count, batch_size):
+        n = min(batch_size, start + count - offset)
+        embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+        collection.add(
+            ids=[f"{user_id}_{offset + i}" for i in range(n)],
+            embeddings=embeddings,
+            documents=[f"memory {offset + i}" for i in range(n)],
+            metadatas=[build_memory_metadata(user_id, MEMORY_TYPES[i % 4], now, now + 90 * 86400) for i in range(n)]
+        )
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    arg_parser.add_argument("--noise", type=int, default=10000, help="其他用户的记忆条数")
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = chromadb.PersistentClient(path=tmp_dir)
+        collection = client.get_or_create_collection(name="bench_memory")
+        add_memories(collection, "noise_user", 0, args.noise, args.dim, rng)
+
+        print(f"{'用户记忆数':<12}{'p50(ms)':>10}{'p99(ms)':>10}")
+        current = 0
+        for size in sorted(args.sizes):
+            add_memories(collection, "bench_user", current, size - current, args.dim, rng)
+            current = size
+            latencies = []
+            for _ in range(args.queries):
+                query = rng.standard_normal(args.dim).astype(np.float32)
+                start = time.perf_counter()
+                collection.query(
+                    query_embeddings=[query],
+                    include=["documents", "distances"],
+                    where=build_memory_filter("bench_user", days=30),
+                    n_results=5
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"{size:<12}{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.99):>10.2f}")
@@ -0,0 +1,131 @@
+"""
+元数据库微基准：对比"每次调用新建连接"（旧实现）与长连接管理器（新实现）的吞吐
+用法：python benchmarks/bench_metadata_db.py [--rows 10000 1000000] [--users 1000]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structured_memory import MemoryMetadataDB, METADATA_MIGRATIONS
+
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+# ====================== 旧实现（每次调用新建连接） ======================
+class LegacyMetadataDB:
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def add_metadata(self, content_hash, memory_type, user_id, weight=1.0, expire_days=90):
+        create_time = datetime.now().strftime(TIME_FMT)
+        expire_time = (datetime.now() + timedelta(days=expire_days)).strftime(TIME_FMT)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT OR REPLACE INTO memory_metadata
+            (content_hash, type, create_time, user_id, weight, expire_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (content_hash, memory_type, create_time, user_id, weight, expire_time))
+        conn.commit()
+        conn.close()
+
+    def filter_by_metadata(self, user_id, memory_type=None, days=None):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT content_hash FROM memory_metadata
+            WHERE user_id = ? AND expire_time > ?
+        ''', (user_id, datetime.now().strftime(TIME_FMT))).fetchall()
+        conn.close()
+        return [r[0] for r in rows]
+
+    def update_weight(self, content_hash, delta=0.1):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            UPDATE memory_metadata
+            SET weight = weight + ?
+            WHERE content_hash = ? AND weight + ? <= 2.0
+        ''', (delta, content_hash, delta))
+        conn.commit()
+        conn.close()
+
+    def delete_expired(self, user_id, now):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("SELECT content_hash FROM memory_metadata WHERE user_id = ? AND expire_time <= ?", (user_id, now)).fetchall()
+        conn.close()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM memory_metadata WHERE user_id = ? AND expire_time <= ?", (user_id, now))
+        conn.commit()
+        conn.close()
+
+    def close(self):
+        pass
+
+# ====================== 工具函数 ======================
+def populate(db_path, rows, users):
+    """按旧版（v1）表结构批量生成测试数据，新实现打开时会原地迁移"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(METADATA_MIGRATIONS[0][1][0])
+    now = datetime.now()
+    create_time = now.strftime(TIME_FMT)
+    expire_time = (now + timedelta(days=90)).strftime(TIME_FMT)
+    batch = []
+    for i in range(rows):
+        batch.append((f"seed_{i}", "CONTEXT_INFO", create_time, f"user_{i % users}", 1.0, expire_time))
+        if len(batch) >= 50000:
+            conn.executemany("INSERT INTO memory_metadata (content_hash, type, create_time, user_id, weight, expire_time) VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO memory_metadata (content_hash, type, create_time, user_id, weight, expire_time) VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+def measure(fn, max_ops, max_seconds):
+    """在次数或时间上限内重复执行，返回ops/sec"""
+    count = 0
+    start = time.perf_counter()
+    while count < max_ops:
+        fn(count)
+        count += 1
+        if time.perf_counter() - start > max_seconds:
+            break
+    return count / (time.perf_counter() - start)
+
+def run_suite(db, rows, users, max_ops, max_seconds):
+    """依次测量四类操作"""
+    if isinstance(db, LegacyMetadataDB):
+        now = datetime.now().strftime(TIME_FMT)
+    else:
+        now = int(time.time())
+    return {
+        "add_metadata": measure(lambda i: db.add_metadata(f"bench_{i}_{random.random()}", "CONTEXT_INFO", f"user_{i % users}"), max_ops, max_seconds),
+        "filter_by_metadata": measure(lambda i: db.filter_by_metadata(f"user_{i % users}"), max_ops, max_seconds),
+        "update_weight": measure(lambda i: db.update_weight(f"seed_{i % rows}", 0.0), max_ops, max_seconds),
+        "delete_expired": measure(lambda i: db.delete_expired(f"user_{i % users}", now), max_ops, max_seconds),
+    }
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000])
+    arg_parser.add_argument("--users", type=int, default=1000)
+    arg_parser.add_argument("--max-ops", type=int, default=2000)
+    arg_parser.add_argument("--max-seconds", type=float, default=5.0)
+    args = arg_parser.parse_args()
+
+    for rows in args.rows:
+        print(f"\n=== {rows} 行元数据，{args.users} 个用户 ===")
+        results = {}
+        for name, db_cls in [("旧实现", LegacyMetadataDB), ("长连接", MemoryMetadataDB)]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                db_path = os.path.join(tmp_dir, "metadata.db")
+                populate(db_path, rows, args.users)
+                db = db_cls(db_path)
+                results[name] = run_suite(db, rows, args.users, args.max_ops, args.max_seconds)
+                db.close()
+        print(f"{'操作':<20}{'旧实现 ops/s':>15}{'长连接 ops/s':>15}{'加速比':>10}")
+        for op in results["旧实现"]:
+            before, after = results["旧实现"][op], results["长连接"][op]
+            print(f"{op:<20}{before:>15.1f}{after:>15.1f}{after / before:>9.1f}x")
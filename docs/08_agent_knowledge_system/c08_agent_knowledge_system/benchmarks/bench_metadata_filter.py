@@ -0,0 +1,91 @@
+"""
+元数据筛选基准：整数时间戳+组合索引下，百万行数据的单用户筛选延迟
+用法：python benchmarks/bench_metadata_filter.py [--rows 1000000] [--users 10000] [--queries 2000]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structured_memory import MemoryMetadataDB, METADATA_MIGRATIONS
+
+MEMORY_TYPES = ["USER_PREFERENCE", "TASK_RECORD", "TOOL_RESULT", "CONTEXT_INFO"]
+
+def populate(db, rows, users):
+    """批量写入测试数据：创建时间分布在最近180天，过期时间为创建后90天"""
+    now = int(time.time())
+    batch = []
+    with db.pool.transaction() as conn:
+        for i in range(rows):
+            create_time = now - random.randint(0, 180 * 86400)
+            batch.append((f"seed_{i}", MEMORY_TYPES[i % 4], create_time, f"user_{i % users}", 1.0, create_time + 90 * 86400))
+            if len(batch) >= 50000:
+                conn.executemany("INSERT INTO memory_metadata (content_hash, type, create_time, user_id, weight, expire_time) VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.executemany("INSERT INTO memory_metadata (content_hash, type, create_time, user_id, weight, expire_time) VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def time_queries(fn, users, queries):
+    """随机用户重复查询，返回毫秒延迟列表"""
+    latencies = []
+    for _ in range(queries):
+        user_id = f"user_{random.randrange(users)}"
+        start = time.perf_counter()
+        fn(user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def bench_migration(rows, users):
+    """测量旧版字符串时间戳数据库的原地迁移耗时"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "metadata.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(METADATA_MIGRATIONS[0][1][0])
+        conn.executemany(
+            "INSERT INTO memory_metadata (content_hash, type, create_time, user_id, weight, expire_time) VALUES (?, ?, ?, ?, ?, ?)",
+            ((f"seed_{i}", MEMORY_TYPES[i % 4], "2026-01-01 08:00:00", f"user_{i % users}", 1.0, "2026-04-01 08:00:00") for i in range(rows))
+        )
+        conn.commit()
+        conn.close()
+        start = time.perf_counter()
+        db = MemoryMetadataDB(db_path)
+        elapsed = time.perf_counter() - start
+        print(f"v1 → v{db.schema_version} 原地迁移 {rows} 行：{elapsed:.2f}s")
+        db.close()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--rows", type=int, default=1000000)
+    arg_parser.add_argument("--users", type=int, default=10000)
+    arg_parser.add_argument("--queries", type=int, default=2000)
+    arg_parser.add_argument("--skip-migration", action="store_true")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = MemoryMetadataDB(os.path.join(tmp_dir, "metadata.db"))
+        start = time.perf_counter()
+        populate(db, args.rows, args.users)
+        print(f"写入 {args.rows} 行（{args.users} 个用户）：{time.perf_counter() - start:.1f}s")
+
+        cases = {
+            "filter(user)": lambda u: db.filter_by_metadata(u),
+            "filter(user, days=30)": lambda u: db.filter_by_metadata(u, days=30),
+            "filter(user, type, days=30)": lambda u: db.filter_by_metadata(u, "USER_PREFERENCE", days=30),
+            "get_expired_hashes(user)": lambda u: db.get_expired_hashes(u, int(time.time())),
+        }
+        print(f"{'查询':<30}{'p50(ms)':>10}{'p99(ms)':>10}")
+        for name, fn in cases.items():
+            latencies = time_queries(fn, args.users, args.queries)
+            print(f"{name:<30}{percentile(latencies, 0.5):>10.3f}{percentile(latencies, 0.99):>10.3f}")
+        db.close()
+
+    if not args.skip_migration:
+        bench_migration(args.rows, args.users)
@@ -0,0 +1,56 @@
+"""
+NumPy向量库基准：不同规模下的精确top-k检索延迟（含/不含元数据过滤）
+用法：python benchmarks/bench_numpy_store.py [--sizes 10000 100000 1000000] [--dim 384]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from numpy_vector_store import NumpyVectorCollection
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def time_queries(collection, dim, queries, where, rng):
+    latencies = []
+    for _ in range(queries):
+        query = rng.standard_normal(dim).astype(np.float32)
+        start = time.perf_counter()
+        collection.query([query], n_results=5, where=where)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--queries", type=int, default=100)
+    arg_parser.add_argument("--batch", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = NumpyVectorCollection("bench", tmp_dir)
+        current = 0
+        print(f"{'向量数':<10}{'写入(s)':>10}{'无过滤p50(ms)':>16}{'无过滤p99(ms)':>16}{'过滤p50(ms)':>14}{'过滤p99(ms)':>14}")
+        for size in sorted(args.sizes):
+            start = time.perf_counter()
+            for offset in range(current, size, args.batch):
+                n = min(args.batch, size - offset)
+                collection.upsert(
+                    ids=[f"v{offset + i}" for i in range(n)],
+                    embeddings=rng.standard_normal((n, args.dim)).astype(np.float32),
+                    documents=[f"doc {offset + i}" for i in range(n)],
+                    metadatas=[{"user_id": f"user_{(offset + i) % 100}"} for i in range(n)]
+                )
+            write_s = time.perf_counter() - start
+            current = size
+            plain = time_queries(collection, args.dim, args.queries, None, rng)
+            filtered = time_queries(collection, args.dim, args.queries, {"user_id": "user_7"}, rng)
+            print(f"{size:<10}{write_s:>10.1f}{percentile(plain, 0.5):>16.2f}{percentile(plain, 0.99):>16.2f}"
+                  f"{percentile(filtered, 0.5):>14.2f}{percentile(filtered, 0.99):>14.2f}")
@@ -0,0 +1,78 @@
+"""
+压缩向量存储基准：float32 / float16 / int8（含/不含原始向量重排）的内存、磁盘、检索延迟与recall@k
+用法：python benchmarks/bench_quantized_store.py [--size 200000] [--dim 384] [--k 10]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from numpy_vector_store import NumpyVectorCollection
+
+MODES = [("float32", 0), ("float16", 0), ("float16", 4), ("int8", 0), ("int8", 4)]
+
+def make_corpus(size, dim, rng, clusters=1000):
+    """带聚类结构的合成向量（近似句向量分布，近邻之间距离差异小，更能体现量化误差）"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=size)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f.endswith(".npy"))
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--size", type=int, default=200000)
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--queries", type=int, default=50)
+    arg_parser.add_argument("--batch", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_corpus(args.size, args.dim, rng)
+    queries = make_corpus(args.queries, args.dim, np.random.default_rng(1))
+    ids = [f"v{i}" for i in range(args.size)]
+
+    # 精确近邻（float32暴力检索）作为recall基准
+    truth = []
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    for query in queries:
+        distances = sq_norms - 2 * (vectors @ query)
+        truth.append(set(np.argpartition(distances, args.k)[:args.k].tolist()))
+
+    print(f"{args.size} 条 × {args.dim} 维，top{args.k}")
+    print(f"{'存储精度':<18}{'检索数组(MB)':>14}{'磁盘(MB)':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'recall@k':>10}")
+    baseline = None
+    for dtype, rescore in MODES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            collection = NumpyVectorCollection("bench", tmp_dir, metadata={
+                "vector_dtype": dtype, "vector_rescore_factor": rescore
+            })
+            for start in range(0, args.size, args.batch):
+                collection.upsert(ids[start:start + args.batch], vectors[start:start + args.batch])
+            # 检索时常驻内存的部分：检索用向量 + 缩放系数（原始向量只在重排时按行读取）
+            resident = collection._vectors[:args.size].nbytes
+            if collection._scales is not None:
+                resident += collection._scales[:args.size].nbytes
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                result = collection.query([query], n_results=args.k, include=[])
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(expected & {int(i[1:]) for i in result["ids"][0]})
+            p50 = percentile(latencies, 0.5)
+            baseline = baseline or p50
+            name = dtype + (f"+重排×{rescore}" if rescore else "")
+            print(f"{name:<18}{resident / 2**20:>14.1f}{dir_size(tmp_dir) / 2**20:>10.1f}"
+                  f"{p50:>10.2f}{percentile(latencies, 0.99):>10.2f}{hits / (args.k * len(queries)):>10.3f}"
+                  f"  （延迟为float32的{p50 / baseline:.2f}倍）")
+            del collection
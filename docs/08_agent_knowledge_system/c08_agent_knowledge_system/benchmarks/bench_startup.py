@@ -0,0 +1,71 @@
+"""
+启动基准：在全新子进程中测量导入耗时、出现命令行提示的时间、首个回答的时间
+用法：python benchmarks/bench_startup.py [--think 2.0] [--with-llm]
+  --think     模拟用户输入问题前的思考时间（秒），预热在此期间进行
+  --with-llm  首个回答包含LLM调用（需配置DASHSCOPE_API_KEY），默认只计到上下文检索完成
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["chromadb", "sentence_transformers", "pdfplumber", "markdown", "PIL", "pytesseract", "dashscope"]
+
+IMPORT_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {project_dir!r})
+start = time.perf_counter()
+import agent_rag, warmup
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+FIRST_ANSWER_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {project_dir!r})
+from agent_rag import RAGEnabledAgent
+from warmup import AgentWarmup
+warmup = AgentWarmup(lambda: RAGEnabledAgent(user_id="bench_user"))
+if {use_warmup!r}:
+    warmup.start()
+else:
+    warmup.get()
+prompt_s = time.perf_counter() - start
+time.sleep({think!r})
+agent = warmup.get()
+query = "智能体支持哪些格式的文档？"
+if {with_llm!r}:
+    agent.run_with_rag(query)
+else:
+    agent.retrieve_all_context(query)
+print(json.dumps({{"prompt_s": prompt_s, "first_answer_s": time.perf_counter() - start}}))
+"""
+
+def run_script(script, cwd):
+    """在全新解释器中执行脚本，解析最后一行JSON输出"""
+    result = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--think", type=float, default=2.0)
+    arg_parser.add_argument("--with-llm", action="store_true")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        imported = run_script(IMPORT_SCRIPT.format(project_dir=PROJECT_DIR, heavy=HEAVY_MODULES), tmp_dir)
+        print(f"导入 agent_rag：{imported['import_s'] * 1000:.0f} ms，已加载的重依赖：{imported['loaded'] or '无'}")
+
+        print(f"\n用户思考时间 {args.think}s")
+        print(f"{'模式':<12}{'出现提示(s)':>14}{'首个回答(s)':>14}")
+        for name, use_warmup in [("同步加载", False), ("后台预热", True)]:
+            timing = run_script(FIRST_ANSWER_SCRIPT.format(
+                project_dir=PROJECT_DIR, use_warmup=use_warmup, think=args.think, with_llm=args.with_llm
+            ), tmp_dir)
+            print(f"{name:<12}{timing['prompt_s']:>14.2f}{timing['first_answer_s']:>14.2f}")
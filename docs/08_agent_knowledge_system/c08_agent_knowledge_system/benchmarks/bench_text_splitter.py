@@ -0,0 +1,100 @@
+"""
+文本分割基准：逐句encode计数（原实现）与批量分词+token数缓存+字节上界快速路径的耗时对比，并校验两者片段边界完全一致
+语料为合成的中英文混排页面（含反复出现的页眉页脚/版权声明等样板句子，以及少量短页），按页调用split_text
+用法：python benchmarks/bench_text_splitter.py [--mb 5] [--page-chars 1500]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from text_splitter import TextSplitter, TokenCountCache
+
+CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+WORDS = ["agent", "memory", "vector", "pdf", "markdown", "index", "query", "latency", "cache", "model",
+         "token", "chunk", "embedding", "retrieval", "knowledge", "sqlite", "chroma", "numpy", "python", "error"]
+BOILERPLATE = [
+    "本文档仅供内部参考，未经许可不得转载。",
+    "Copyright 2024 Agent Knowledge System. All rights reserved.",
+    "智能体工程实践手册（第二版）。",
+    "Confidential: do not distribute outside the engineering team.",
+]
+
+def make_pages(total_bytes, page_chars, rng):
+    """生成合成页面：中文句、英文句、样板句混排；约每10页有一页为短页"""
+    pages, produced = [], 0
+    while produced < total_bytes:
+        limit = page_chars if rng.random() > 0.1 else page_chars // 10
+        parts, length = [rng.choice(BOILERPLATE)], 0
+        while length < limit:
+            kind = rng.random()
+            if kind < 0.5:
+                sentence = "".join(rng.choice(list(CHARS), rng.integers(8, 40))) + "。"
+            elif kind < 0.85:
+                sentence = " ".join(rng.choice(WORDS, rng.integers(5, 20))).capitalize() + ". "
+            else:
+                sentence = rng.choice(BOILERPLATE)
+            parts.append(sentence)
+            length += len(sentence)
+        page = "".join(parts)
+        pages.append(page)
+        produced += len(page.encode("utf-8"))
+    return pages
+
+def legacy_merge(splitter, sentences):
+    """原实现：逐句调用tokenizer.encode计数"""
+    chunks, current_chunk, current_length = [], [], 0
+    for sentence in sentences:
+        sentence_tokens = len(splitter.tokenizer.encode(sentence))
+        if current_length + sentence_tokens > splitter.max_chunk_tokens and current_chunk:
+            chunks.append("".join(current_chunk))
+            current_chunk, current_length = [sentence], sentence_tokens
+        else:
+            current_chunk.append(sentence)
+            current_length += sentence_tokens
+    if current_chunk:
+        chunks.append("".join(current_chunk))
+    return chunks
+
+def run(split_fn, pages):
+    start = time.perf_counter()
+    chunks = [split_fn(page) for page in pages]
+    return chunks, time.perf_counter() - start
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--mb", type=float, default=5)
+    arg_parser.add_argument("--page-chars", type=int, default=1500)
+    arg_parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = arg_parser.parse_args()
+
+    pages = make_pages(int(args.mb * 1024 * 1024), args.page_chars, np.random.default_rng(0))
+    size_mb = sum(len(page.encode("utf-8")) for page in pages) / 1024 / 1024
+    splitter = TextSplitter(args.model)
+    print(f"语料：{len(pages)} 页，{size_mb:.1f} MB（UTF-8）")
+
+    def legacy_split(page):
+        if len(page) < 10:
+            return []
+        sentences = splitter._split_by_sentences(page)
+        return [chunk for chunk in legacy_merge(splitter, sentences) if len(chunk) > 10] if sentences else []
+
+    legacy_chunks, legacy_s = run(legacy_split, pages)
+    splitter.count_cache = TokenCountCache()
+    cold_chunks, cold_s = run(splitter.split_text, pages)
+    warm_chunks, warm_s = run(splitter.split_text, pages)
+    splitter.count_cache = TokenCountCache(max_items=0)
+    nocache_chunks, nocache_s = run(splitter.split_text, pages)
+
+    print(f"{'方式':<28}{'耗时(s)':>10}{'MB/s':>10}{'加速':>8}{'边界一致':>10}")
+    for name, chunks, seconds in [
+        ("逐句encode（原实现）", legacy_chunks, legacy_s),
+        ("批量分词（无缓存）", nocache_chunks, nocache_s),
+        ("批量分词+缓存（冷）", cold_chunks, cold_s),
+        ("批量分词+缓存（热）", warm_chunks, warm_s),
+    ]:
+        print(f"{name:<28}{seconds:>10.2f}{size_mb / seconds:>10.2f}{legacy_s / seconds:>8.1f}x"
+              f"{str(chunks == legacy_chunks):>10}")
+    print(f"片段数：{sum(len(c) for c in legacy_chunks)}")
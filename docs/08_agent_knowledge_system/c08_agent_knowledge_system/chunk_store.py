@@ -0,0 +1,211 @@
+import os
+import mmap
+import bisect
+import threading
+from sqlite_pool import SQLiteConnectionManager
+
+# ====================== 片段文本存储SQL ======================
+# 每次追加写入为一段（span）：文档内偏移doc_offset处的length字节，存放在数据文件的file_offset处
+# 片段在向量库中只记录文档内的字节偏移，压缩数据文件时只需改写file_offset
+CREATE_SPANS_SQL = '''
+    CREATE TABLE IF NOT EXISTS spans (
+        doc_id TEXT NOT NULL,
+        doc_offset INTEGER NOT NULL,
+        file_offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        PRIMARY KEY (doc_id, doc_offset)
+    )
+'''
+INSERT_SPAN_SQL = "INSERT INTO spans (doc_id, doc_offset, file_offset, length) VALUES (?, ?, ?, ?)"
+DELETE_DOC_SQL = "DELETE FROM spans WHERE doc_id = ?"
+DELETE_SPAN_SQL = "DELETE FROM spans WHERE doc_id = ? AND doc_offset = ?"
+SELECT_SPANS_SQL = "SELECT doc_id, doc_offset, file_offset, length FROM spans ORDER BY doc_id, doc_offset"
+UPDATE_FILE_OFFSET_SQL = "UPDATE spans SET file_offset = ? WHERE doc_id = ? AND doc_offset = ?"
+# 当前数据文件名：compact写入新文件后与偏移一起在同一事务中切换，中途崩溃不会出现偏移与文件不一致
+CREATE_META_SQL = "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+SELECT_META_SQL = "SELECT value FROM meta WHERE key = ?"
+UPSERT_META_SQL = "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+# 文档删除/压缩后记录其文档内偏移的高水位，之后追加的文本从这里继续编址：
+# 向量库中残留的旧片段偏移不会指到新文本上（读取时返回None）
+DOC_END_KEY = "doc_end:"
+SELECT_DOC_ENDS_SQL = "SELECT key, value FROM meta WHERE key LIKE 'doc_end:%'"
+
+# ====================== 片段文本存储 ======================
+class ChunkStore:
+    def __init__(self, path):
+        """
+        知识库片段文本存储：每个文档提取出的文本按片段顺序拼接，只在数据文件（texts.bin）中保存一份，
+        向量库中的片段只记录 (doc_id, start, end) 字节偏移；检索时只为最终进入Prompt的top-k片段读取文本
+        数据文件只追加、按内存映射读取（文本页由操作系统按需换入换出，不占常驻内存）；
+        删除文档只删除偏移记录，留下的空洞由 compact() 回收；整篇重新入库前应先 delete()，
+        断点续传重写的页等仍记在文档名下但已不被引用的旧文本，由 compact(references) 对照向量库中的引用回收
+        :param path: 存储目录
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.pool = SQLiteConnectionManager(os.path.join(path, "spans.db"))
+        with self.pool.transaction() as conn:
+            conn.execute(CREATE_SPANS_SQL)
+            conn.execute(CREATE_META_SQL)
+        rows = self.pool.fetchall(SELECT_META_SQL, ("data_file",))
+        self.data_path = os.path.join(path, rows[0][0] if rows else "texts.bin")
+        self._lock = threading.RLock()
+        self._doc_ends = {key[len(DOC_END_KEY):]: int(value) for key, value in self.pool.fetchall(SELECT_DOC_ENDS_SQL)}
+        self._spans = {}  # doc_id -> [(doc_offset, file_offset, length)]，按doc_offset升序
+        for doc_id, doc_offset, file_offset, length in self.pool.fetchall(SELECT_SPANS_SQL):
+            self._spans.setdefault(doc_id, []).append((doc_offset, file_offset, length))
+        # 崩溃时可能已追加文本但未提交偏移记录，截断到最后一段记录的末尾
+        live_end = max((f + n for spans in self._spans.values() for _, f, n in spans), default=0)
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > live_end:
+            with open(self.data_path, "r+b") as f:
+                f.truncate(live_end)
+        # 追加模式可读写：写入总在文件末尾，同一句柄用于内存映射
+        self._file = open(self.data_path, "a+b")
+        self._map = None
+
+    def _doc_length(self, doc_id):
+        spans = self._spans.get(doc_id)
+        return max(spans[-1][0] + spans[-1][2] if spans else 0, self._doc_ends.get(doc_id, 0))
+
+    def append(self, doc_id, texts):
+        """
+        追加一个文档的若干片段文本（同一文档可多次追加，例如流式入库的每一批）
+        :return: 每个片段在文档内的 (start, end) 字节偏移
+        """
+        if not texts:
+            return []
+        encoded = [text.encode("utf-8") for text in texts]
+        with self._lock:
+            doc_offset = self._doc_length(doc_id)
+            file_offset = self._file.tell()
+            self._file.write(b"".join(encoded))
+            self._file.flush()
+            # 文本落盘后再提交偏移记录：掉电后已提交的偏移不会指向文件末尾之外
+            os.fsync(self._file.fileno())
+            length = self._file.tell() - file_offset
+            with self.pool.transaction() as conn:
+                conn.execute(INSERT_SPAN_SQL, (doc_id, doc_offset, file_offset, length))
+            self._spans.setdefault(doc_id, []).append((doc_offset, file_offset, length))
+        offsets, start = [], doc_offset
+        for data in encoded:
+            offsets.append((start, start + len(data)))
+            start += len(data)
+        return offsets
+
+    def _mapped(self, end):
+        """返回覆盖到end的内存映射（数据文件增长后重新映射）"""
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read_many(self, locations):
+        """
+        按偏移读取片段文本（只在这里把文本解码为字符串）
+        :param locations: [(doc_id, start, end)]
+        :return: 文本列表，文档已删除的位置为None
+        """
+        texts = []
+        with self._lock:
+            for doc_id, start, end in locations:
+                spans = self._spans.get(doc_id)
+                if not spans:
+                    texts.append(None)
+                    continue
+                # 一次追加的片段不会跨段，找起点所在的段即可
+                idx = bisect.bisect_right(spans, (start, float("inf"))) - 1
+                if idx < 0 or end > spans[idx][0] + spans[idx][2]:
+                    texts.append(None)
+                    continue
+                doc_offset, file_offset, _ = spans[idx]
+                position = file_offset + start - doc_offset
+                if end == start:
+                    texts.append("")
+                    continue
+                data = self._mapped(position + end - start)[position:position + end - start]
+                texts.append(data.decode("utf-8"))
+        return texts
+
+    def delete(self, doc_id):
+        """删除文档的全部文本（只删偏移记录，数据文件空间在compact时回收）"""
+        with self._lock:
+            if doc_id in self._spans:
+                end = self._doc_length(doc_id)
+                with self.pool.transaction() as conn:
+                    conn.execute(DELETE_DOC_SQL, (doc_id,))
+                    conn.execute(UPSERT_META_SQL, (DOC_END_KEY + doc_id, str(end)))
+                del self._spans[doc_id]
+                self._doc_ends[doc_id] = end
+
+    def stats(self):
+        with self._lock:
+            live = sum(n for spans in self._spans.values() for _, _, n in spans)
+            total = self._file.tell()
+            return {"documents": len(self._spans), "live_bytes": live, "dead_bytes": total - live, "file_bytes": total}
+
+    @staticmethod
+    def _referenced(span, starts, ends):
+        """段内是否有被引用的片段（starts/ends为同一文档按起点排序的引用偏移）"""
+        doc_offset, _, length = span
+        idx = bisect.bisect_left(starts, doc_offset)
+        return idx < len(starts) and starts[idx] < doc_offset + length and ends[idx] <= doc_offset + length
+
+    def compact(self, references=None):
+        """
+        重写数据文件，只保留仍被引用的文本段，返回压缩后的字节数
+        片段的文档内偏移不变，向量库无需改动；新文件名与新偏移在同一事务中生效
+        :param references: {doc_id: [(start, end)]} 向量库中仍在引用的片段偏移；传入时不含任何被引用片段的段也一并丢弃
+                           （调用期间不能有写入：刚追加、尚未写入向量库的文本会被当作无引用丢弃）
+        """
+        with self._lock:
+            name = os.path.basename(self.data_path)
+            generation = int(name.split(".")[1]) + 1 if name.count(".") == 2 else 1
+            new_path = os.path.join(self.path, f"texts.{generation}.bin")
+            kept, dropped = {}, []
+            for doc_id, spans in self._spans.items():
+                if references is None:
+                    kept[doc_id] = spans
+                    continue
+                refs = sorted(references.get(doc_id, ()))
+                starts, ends = [s for s, _ in refs], [e for _, e in refs]
+                for span in spans:
+                    if self._referenced(span, starts, ends):
+                        kept.setdefault(doc_id, []).append(span)
+                    else:
+                        dropped.append((doc_id, span[0]))
+            updates, compacted, position = [], {}, 0
+            with open(new_path, "wb") as out:
+                for doc_id, spans in kept.items():
+                    compacted[doc_id] = []
+                    for doc_offset, file_offset, length in spans:
+                        out.write(self._mapped(file_offset + length)[file_offset:file_offset + length])
+                        compacted[doc_id].append((doc_offset, position, length))
+                        updates.append((position, doc_id, doc_offset))
+                        position += length
+                out.flush()
+                os.fsync(out.fileno())
+            doc_ends = {doc_id: self._doc_length(doc_id) for doc_id, _ in dropped}
+            with self.pool.transaction() as conn:
+                conn.executemany(DELETE_SPAN_SQL, dropped)
+                conn.executemany(UPSERT_META_SQL, [(DOC_END_KEY + doc_id, str(end)) for doc_id, end in doc_ends.items()])
+                conn.executemany(UPDATE_FILE_OFFSET_SQL, updates)
+                conn.execute(UPSERT_META_SQL, ("data_file", os.path.basename(new_path)))
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+            os.remove(self.data_path)
+            self.data_path = new_path
+            self._spans = compacted
+            self._doc_ends.update(doc_ends)
+            self._file = open(self.data_path, "a+b")
+            return position
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+            self.pool.close()
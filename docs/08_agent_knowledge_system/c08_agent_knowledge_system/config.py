@@ -7,20 +7,78 @@ load_dotenv()
 # ====================== 基础配置 ======================
 DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY")
 MAX_BASIC_MEMORY = 100  # 降级用JSON记忆最大条数
-MEMORY_FILE_PATH = "./basic_memory.json"
+MEMORY_FILE_PATH = "./basic_memory.jsonl"         # 降级用记忆日志（追加写）
+LEGACY_MEMORY_FILE_PATH = "./basic_memory.json"   # 旧版JSON记忆文件（自动迁移）
 
 # ====================== 结构化记忆配置 ======================
 VECTOR_DB_PATH = "./structured_memory/chroma_db"
+VECTOR_BACKEND = "auto"               # 向量库后端：auto（优先Chroma，失败退回NumPy）/chroma/numpy
 SQLITE_DB_PATH = "./structured_memory/metadata.db"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # 轻量级嵌入模型
 TOP_K_MEMORY = 5                      # 记忆检索条数
 MEMORY_EXPIRE_DAYS = 90               # 记忆过期天数
+MEMORY_SWEEP_INTERVAL = 3600          # 后台清理过期记忆的间隔（秒）
+MEMORY_SWEEP_BATCH_SIZE = 500         # 每批清理的过期记忆条数
+
+# ====================== 嵌入缓存配置 ======================
+EMBEDDING_CACHE_SIZE = 10000          # 内存LRU缓存的向量条数
+EMBEDDING_CACHE_DISK_ENABLED = False  # 是否启用磁盘缓存层（内存映射文件）
+EMBEDDING_CACHE_DIR = "./structured_memory/embedding_cache"
+
+# ====================== SQLite连接配置 ======================
+SQLITE_SYNCHRONOUS = "NORMAL"         # 同步级别（WAL模式下NORMAL即可）
+SQLITE_CACHE_SIZE_KB = 16384          # 每条连接的页缓存大小（KB）
+SQLITE_STATEMENT_CACHE = 128          # 每条连接缓存的预编译语句数
+SQLITE_BUSY_TIMEOUT_MS = 5000         # 锁等待超时（毫秒）
+WEIGHT_FLUSH_INTERVAL = 2.0           # 记忆权重批量落盘间隔（秒）
+WEIGHT_FLUSH_THRESHOLD = 256          # 待落盘权重条数达到该值时立即落盘
+
+# ====================== 启动配置 ======================
+WARMUP_ENABLED = True                 # 启动时后台预热（加载模型、打开向量库），不阻塞命令行
 
 # ====================== 外部知识库配置 ======================
 TOP_K_KNOWLEDGE = 5                   # 知识库检索条数
 MAX_CHUNK_TOKENS = 512                # 文档分段长度
+TOKEN_COUNT_CACHE_SIZE = 50000        # 句子token数LRU缓存条数（样板句子不重复分词，0为关闭）
+EMBEDDING_BATCH_SIZE = 128            # 每次模型前向计算的片段数
+KNOWLEDGE_UPSERT_BATCH_SIZE = 512     # 每次写入向量库的片段数
+KNOWLEDGE_VECTOR_DTYPE = "float32"    # 知识库向量存储精度：float32/float16/int8（仅NumPy后端，新建知识库时生效）
+CHUNK_STORE_ENABLED = False           # 片段文本只存一份到内存映射文件，向量库只记偏移，检索时仅为top-k读取文本
+CHUNK_STORE_PATH = "./structured_memory/chunk_store"  # 片段文本存储目录
+VECTOR_RESCORE_FACTOR = 4             # 压缩存储时按 top_k×该倍数 取候选，用原始float32向量重排（0为不保留原始向量）
+KNOWLEDGE_SEARCH_MODE = "hybrid"      # 知识库检索模式：dense（仅向量）/hybrid（向量+BM25融合）
+HYBRID_CANDIDATES = 20                # 混合检索每一路召回的候选数
+RRF_K = 60                            # 倒数排名融合的平滑常数
+KNOWLEDGE_CACHE_SIZE = 256            # 知识库检索结果缓存条数（0为关闭）
+KNOWLEDGE_CACHE_TTL = 300             # 检索结果缓存过期时间（秒）
+KNOWLEDGE_CACHE_SEMANTIC_THRESHOLD = 0  # 语义缓存：查询向量余弦相似度≥该值时复用结果（0为关闭，建议0.95以上）
 SUPPORTED_FORMATS = [".pdf", ".md", ".txt"]  # 支持的文档格式
+INGEST_MANIFEST_PATH = "./structured_memory/ingest_manifest.db"  # 入库清单（增量批量入库用）
+INGEST_WORKERS = 0                    # 批量入库的解析进程数（0为CPU核数，1为不启用进程池；子进程只加载分词器，不加载嵌入模型）
+INGEST_QUEUE_SIZE = 8                 # 解析结果队列长度（文件数），写入跟不上时暂停解析以限制内存
+INGEST_PARALLEL_MIN_FILES = 8         # 待入库文件数达到该值才启用进程池（进程启动需导入解析依赖、加载分词器，少量文件直接解析更快）
+STREAM_INGEST_MIN_BYTES = 8 * 1024 * 1024  # 批量入库时不小于该大小的PDF/TXT流式入库（内存有界，按页/块断点续传）
+TEXT_STREAM_BLOCK_BYTES = 1024 * 1024  # 流式读取TXT的缓冲区大小（字节），也是TXT断点续传的粒度
 OCR_ENABLED = False                   # 是否开启OCR（处理图片PDF）
+OCR_WORKERS = 0                       # OCR进程数（0为CPU核数，1为在解析进程中串行识别）
+OCR_LANG = "chi_sim+eng"              # tesseract识别语言
+OCR_MIN_IMAGE_SIDE = 48               # 图片短边小于该像素数（图标、装饰线等）不做OCR
+OCR_CACHE_PATH = "./structured_memory/ocr_cache.db"  # OCR结果缓存库（按图片内容哈希，重复图片只识别一次）
+
+# ====================== 近似索引配置 ======================
+VECTOR_INDEX = "ivf"                  # 向量索引：flat（精确检索）/ivf（NumPy后端倒排聚类；Chroma后端固定为HNSW）
+IVF_NLIST = 0                         # IVF聚类数（0为按向量数自动取4·√n，规模增长后自动重训）
+IVF_NPROBE = 16                       # 每次检索扫描的簇数（越大召回越高、越慢）
+IVF_MIN_VECTORS = 50000               # 向量数达到该值才训练IVF，之前仍为精确检索
+HNSW_M = 16                           # Chroma HNSW每个节点的邻居数（仅新建集合时生效）
+HNSW_CONSTRUCTION_EF = 100            # Chroma HNSW建图时的候选队列长度（仅新建集合时生效）
+HNSW_SEARCH_EF = 100                  # Chroma HNSW检索时的候选队列长度（越大召回越高、越慢）
+
+# ====================== 关键词检索配置 ======================
+KEYWORD_INDEX_PATH = "./structured_memory/keyword_index"  # BM25倒排索引目录（记忆/知识库各一个库）
+BM25_K1 = 1.2                         # BM25词频饱和参数
+BM25_B = 0.75                         # BM25文档长度归一化参数
+KEYWORD_INDEX_MAX_SEGMENTS = 32       # 倒排表落盘段数上限（超过后合并新写入的段）
 
 
 
@@ -1,98 +1,115 @@
 import os
-import pdfplumber
-import markdown
-from PIL import Image
-import pytesseract
+import re
+import codecs
 from typing import List, Dict
 from text_splitter import TextSplitter
-from config import OCR_ENABLED, SUPPORTED_FORMATS
+from model_registry import get_image_ocr
+from ocr import image_payload
+from config import OCR_ENABLED, SUPPORTED_FORMATS, TEXT_STREAM_BLOCK_BYTES
 
 # ====================== PDF解析器 ======================
 class PDFParser:
+    page_unit = "页"  # iter_pages 产出的单位（用于入库提示）
+
     def __init__(self, ocr_enabled: bool = OCR_ENABLED):
         self.ocr_enabled = ocr_enabled
         self.splitter = TextSplitter()
 
-    def _extract_image_text(self, image) -> str:
-        """提取图片中的文字（OCR）"""
-        if not self.ocr_enabled:
-            return ""
-        try:
-            return pytesseract.image_to_string(image, lang="chi_sim+eng")
-        except Exception as e:
-            print(f"OCR解析失败：{e}")
-            return ""
-
-    def parse(self, file_path: str) -> List[Dict[str, str]]:
-        """解析PDF文件"""
+    def iter_pages(self, file_path: str, start_page: int = 1):
+        """
+        逐页解析PDF：每次产出一页的 (页码, 总页数, 片段列表)，页面解析完立即释放缓存，内存占用与页数无关
+        :param start_page: 起始页码（断点续传时跳过已入库的页，跳过的页不提取文本）
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"PDF文件不存在：{file_path}")
         
-        chunks = []
-        try:
-            with pdfplumber.open(file_path) as pdf:
-                # 提取元数据
-                metadata = {
-                    "title": pdf.metadata.get("title", os.path.basename(file_path)),
-                    "author": pdf.metadata.get("author", "未知作者"),
-                    "total_pages": len(pdf.pages),
-                    "format": "PDF",
-                    "source": file_path,
-                    "doc_type": "external_knowledge"
-                }
-                # 逐页解析
-                for page_num, page in enumerate(pdf.pages, 1):
+        # 解析依赖按需导入，避免拖慢程序启动
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            total_pages = len(pdf.pages)
+            # 提取元数据
+            metadata = {
+                "title": pdf.metadata.get("title", os.path.basename(file_path)),
+                "author": pdf.metadata.get("author", "未知作者"),
+                "total_pages": total_pages,
+                "format": "PDF",
+                "source": file_path,
+                "doc_type": "external_knowledge"
+            }
+            # 开启OCR时按窗口攒页：窗口内所有页的图片一起去重、查缓存、送进程池并行识别，再按页序产出
+            ocr = get_image_ocr() if self.ocr_enabled else None
+            window_size = ocr.workers * 2 if ocr else 1
+            window = []
+            # 逐页解析
+            for page_num, page in enumerate(pdf.pages, 1):
+                if page_num < start_page:
+                    continue
+                try:
                     # 提取页面文本
                     page_text = page.extract_text() or ""
-                    # 提取页面图片（OCR）
-                    if self.ocr_enabled:
+                    # 取出页面图片数据（页面释放后图片流不再可用）
+                    payloads = []
+                    if ocr:
                         for img in page.images:
                             try:
-                                img_obj = Image.open(img["stream"])
-                                img_text = self._extract_image_text(img_obj)
-                                page_text += "\n" + img_text
+                                payloads.append(image_payload(img))
                             except Exception as e:
                                 print(f"解析图片失败：{e}")
-                    # 分割文本为片段
-                    page_chunks = self.splitter.split_text(page_text)
-                    # 封装片段
-                    for chunk_num, chunk in enumerate(page_chunks, 1):
-                        chunks.append({
-                            "content": chunk,
-                            "metadata": {
-                                **metadata,
-                                "page_num": page_num,
-                                "chunk_num": chunk_num
-                            }
-                        })
-            return chunks
+                finally:
+                    # pdfplumber会缓存已解析页面的版面对象，不释放则内存随页数增长
+                    page.close()
+                window.append((page_num, page_text, payloads))
+                if len(window) >= window_size:
+                    yield from self._finish_pages(window, ocr, metadata, total_pages)
+                    window = []
+            yield from self._finish_pages(window, ocr, metadata, total_pages)
+
+    def _finish_pages(self, window, ocr, metadata, total_pages):
+        """识别窗口内各页的图片文字并追加到页面文本后，按页序分割产出"""
+        if ocr:
+            image_texts = iter(ocr.recognize([p for _, _, payloads in window for p in payloads]))
+        for page_num, page_text, payloads in window:
+            for _ in payloads:
+                img_text = next(image_texts)
+                if img_text:
+                    page_text += "\n" + img_text
+            # 分割文本为片段并封装
+            page_chunks = [{
+                "content": chunk,
+                "metadata": {**metadata, "page_num": page_num, "chunk_num": chunk_num}
+            } for chunk_num, chunk in enumerate(self.splitter.split_text(page_text), 1)]
+            yield page_num, total_pages, page_chunks
+
+    def parse(self, file_path: str) -> List[Dict[str, str]]:
+        """解析PDF文件（一次返回全部片段；大文件入库走 iter_pages 流式处理）"""
+        try:
+            return [chunk for _, _, page_chunks in self.iter_pages(file_path) for chunk in page_chunks]
+        except FileNotFoundError:
+            raise
         except Exception as e:
             print(f"PDF解析失败：{e}")
             return []
 
-# ====================== MD/TXT解析器 ======================
+# ====================== TXT解析器 ======================
 class TextParser:
-    def __init__(self):
+    page_unit = "块"  # iter_pages 按缓冲区块产出，不是页
+
+    def __init__(self, block_bytes: int = TEXT_STREAM_BLOCK_BYTES):
         self.splitter = TextSplitter()
+        self.block_bytes = block_bytes
 
-    def parse(self, file_path: str) -> List[Dict[str, str]]:
-        """解析MD/TXT文件"""
+    def iter_pages(self, file_path: str, start_page: int = 1):
+        """
+        流式解析TXT：按缓冲区（block_bytes字节）增量读取，每次产出一块的 (块号, 总块数, 片段列表)
+        每块只分割到最后一个句子边界，之后的半句留到下一块，片段不会在缓冲区边界处被切断；
+        内存占用为几个缓冲区大小，与文件大小无关
+        :param start_page: 起始块号（断点续传时前面的块只读取、定位句子边界，不分割）
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在：{file_path}")
-        
+
         ext = os.path.splitext(file_path)[1].lower()
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # MD文件处理（保留标题结构）
-        if ext == ".md":
-            html = markdown.markdown(content)
-            # 简单处理：保留原始文本结构
-            pass
-        
-        # 分割文本
-        chunks = self.splitter.split_text(content)
-        # 封装元数据
+        total_blocks = max(1, -(-os.path.getsize(file_path) // self.block_bytes))
         metadata = {
             "title": os.path.basename(file_path),
             "author": "未知作者",
@@ -100,11 +117,171 @@ class TextParser:
             "source": file_path,
             "doc_type": "external_knowledge"
         }
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        carry, pending = "", ""
+        with open(file_path, "rb") as f:
+            for block_num in range(1, total_blocks + 1):
+                data = f.read(self.block_bytes)
+                # 最后一块读到文件末尾为止（读取期间文件变大也不丢内容）
+                final = block_num == total_blocks
+                if final:
+                    data += f.read()
+                text = pending + decoder.decode(data, final=final)
+                # 与文本模式读取一致：换行统一为\n；末尾的\r可能与下一块开头的\n组成一个换行，留到下一块
+                pending = ""
+                if not final and text.endswith("\r"):
+                    text, pending = text[:-1], "\r"
+                text = carry + text.replace("\r\n", "\n").replace("\r", "\n")
+                if final:
+                    cut = len(text)
+                else:
+                    cut = self.splitter.last_sentence_end(text)
+                    # 超长且没有任何边界（如无换行的二进制导出）时整块切开，避免余下部分无限增长
+                    if not cut and len(text) > 4 * self.block_bytes:
+                        cut = len(text)
+                text, carry = text[:cut], text[cut:]
+                if block_num < start_page:
+                    continue
+                block_chunks = [{
+                    "content": chunk,
+                    "metadata": {**metadata, "block_num": block_num, "chunk_num": chunk_num}
+                } for chunk_num, chunk in enumerate(self.splitter.split_text(text), 1)]
+                yield block_num, total_blocks, block_chunks
+
+    def parse(self, file_path: str) -> List[Dict[str, str]]:
+        """解析TXT文件（一次返回全部片段；大文件入库走 iter_pages 流式处理。MD文件由MarkdownParser按章节解析）"""
+        return [chunk for _, _, block_chunks in self.iter_pages(file_path) for chunk in block_chunks]
+
+# ====================== Markdown解析器 ======================
+ATX_HEADING_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+SETEXT_UNDERLINE_RE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+
+def iter_markdown_blocks(lines):
+    """
+    单遍扫描Markdown，按标题层级和代码块切分，产出 (标题路径, 块类型, 文本)
+    块类型为 text（标题下的正文）或 code（完整的围栏代码块，含围栏行）；
+    代码块内的 # 行不当作标题，支持ATX（# 标题）和Setext（下划线 ===/---）两种标题；文件开头的YAML front matter跳过
+    """
+    path = []        # [(级别, 标题)]
+    buffer = []      # 当前正文行
+    fence = None     # 当前所在代码块的围栏标记
+    front_matter = False
+
+    def heading_path():
+        return " > ".join(title for _, title in path)
+
+    def flush():
+        text = "\n".join(buffer).strip()
+        buffer.clear()
+        return text
+
+    def enter(level, title):
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, title))
+
+    for line_num, line in enumerate(lines):
+        line = line.rstrip("\n")
+        if line_num == 0 and line.strip() == "---":
+            front_matter = True
+            continue
+        if front_matter:
+            front_matter = line.strip() not in ("---", "...")
+            continue
+        if fence is not None:
+            buffer.append(line)
+            # 闭合围栏：同一字符且不短于开启围栏
+            if line.strip().startswith(fence) and not line.strip().strip(fence[0]):
+                fence = None
+                yield heading_path(), "code", flush()
+            continue
+        match = FENCE_RE.match(line)
+        if match:
+            text = flush()
+            if text:
+                yield heading_path(), "text", text
+            fence = match.group(1)
+            buffer.append(line)
+            continue
+        match = ATX_HEADING_RE.match(line)
+        if match:
+            text = flush()
+            if text:
+                yield heading_path(), "text", text
+            enter(len(match.group(1)), (match.group(2) or "").strip())
+            continue
+        match = SETEXT_UNDERLINE_RE.match(line)
+        if match and buffer and buffer[-1].strip():
+            # 下划线前的非空行是标题（"---"前为空行时是分隔线，按正文处理）
+            title = buffer.pop().strip()
+            text = flush()
+            if text:
+                yield heading_path(), "text", text
+            enter(1 if match.group(1)[0] == "=" else 2, title)
+            continue
+        buffer.append(line)
+    # 文件末尾未闭合的代码块也作为代码块输出
+    text = flush()
+    if text:
+        yield heading_path(), "code" if fence is not None else "text", text
+
+class MarkdownParser:
+    def __init__(self):
+        self.splitter = TextSplitter()
+
+    def _split_code(self, code, max_chunk_tokens=None):
+        """代码块整体作为一个片段，超过长度上限时按行合并切分（保留换行和缩进）"""
+        return self.splitter._merge_sentences(code.splitlines(keepends=True), max_chunk_tokens)
+
+    def _fits(self, text):
+        return sum(self.splitter._count_tokens([text])) <= self.splitter.max_chunk_tokens
+
+    def parse(self, file_path: str) -> List[Dict[str, str]]:
+        """
+        解析MD文件：按标题层级切成章节，章节正文送入分割器，代码块不按句号拆开；片段不跨章节
+        每个片段以标题路径（如"安装 > 依赖"）开头，标题中的词可被向量检索和关键词检索命中，元数据heading_path同样记录；
+        正文过短、分割器会丢弃的章节（如"## 端口\n默认8080。"）不丢弃，并入同一顶级章节的上一个片段，放不下时单独成段
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在：{file_path}")
         
-        return [{
-            "content": chunk,
-            "metadata": {**metadata, "chunk_num": idx+1}
-        } for idx, chunk in enumerate(chunks)]
+        metadata = {
+            "title": os.path.basename(file_path),
+            "author": "未知作者",
+            "format": "MD",
+            "source": file_path,
+            "doc_type": "external_knowledge"
+        }
+        chunks = []
+        prefix_budgets = {}  # 标题路径 -> 扣除标题前缀后的片段token上限
+        with open(file_path, "r", encoding="utf-8") as f:
+            for heading_path, kind, text in iter_markdown_blocks(f):
+                prefix = f"{heading_path}\n" if heading_path else ""
+                budget = prefix_budgets.get(prefix)
+                if budget is None:
+                    prefix_tokens = sum(self.splitter._count_tokens([prefix])) if prefix else 0
+                    budget = prefix_budgets[prefix] = max(self.splitter.max_chunk_tokens - prefix_tokens,
+                                                          self.splitter.max_chunk_tokens // 2)
+                if kind == "code":
+                    pieces = self._split_code(text, budget)
+                else:
+                    pieces = [piece for piece in self.splitter.split_text(text, budget) if len(piece.strip()) > 10]
+                if not pieces:
+                    # 短章节：并入同一顶级章节的上一个片段
+                    content = prefix + text.strip()
+                    previous = chunks[-1] if chunks else None
+                    if (previous is not None and previous["metadata"]["heading_path"].split(" > ")[0] == heading_path.split(" > ")[0]
+                            and self._fits(previous["content"] + "\n" + content)):
+                        previous["content"] += "\n" + content
+                        continue
+                    pieces = [text.strip()]
+                for piece in pieces:
+                    chunks.append({
+                        "content": prefix + piece,
+                        "metadata": {**metadata, "heading_path": heading_path, "chunk_num": len(chunks) + 1}
+                    })
+        return chunks
 
 # ====================== 解析器工厂 ======================
 class DocumentParserFactory:
@@ -117,5 +294,7 @@ class DocumentParserFactory:
         
         if ext == ".pdf":
             return PDFParser()
-        else:  # .md/.txt
+        elif ext == ".md":
+            return MarkdownParser()
+        else:  # .txt
             return TextParser()
\ No newline at end of file
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DISK_ENABLED
+
+# ====================== 磁盘缓存层 ======================
+class DiskEmbeddingStore:
+    def __init__(self, cache_dir):
+        """
+        磁盘嵌入缓存：float32向量顺序追加到内存映射文件，键按行号记录在索引文件
+        :param cache_dir: 缓存目录（每个模型一个目录）
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.txt")
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.dim = None
+        self.index = {}
+        self._mmap = None
+        self._mmap_rows = 0
+        self._load()
+
+    def _load(self):
+        """
+        加载索引，并把向量文件与索引文件截断到两者都完整的行数：
+        put_many先写向量再写索引，崩溃时可能留下没有索引的向量行（不截断的话之后追加的键会错位读到别的向量），
+        或写了一半的索引行/向量行
+        """
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        row_bytes = self.dim * 4
+        rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        keys, index_bytes = [], 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                for line in f:
+                    # 没有换行结尾的是写了一半的索引行
+                    if len(keys) >= rows or not line.endswith(b"\n"):
+                        break
+                    keys.append(line.decode("utf-8").strip())
+                    index_bytes += len(line)
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != len(keys) * row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(len(keys) * row_bytes)
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) != index_bytes:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(index_bytes)
+        for row, key in enumerate(keys):
+            self.index[key] = row
+
+    def _vectors(self):
+        """按需重新映射向量文件（文件增长后）"""
+        if self._mmap is None or self._mmap_rows < len(self.index):
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.index), self.dim))
+            self._mmap_rows = len(self.index)
+        return self._mmap
+
+    def get(self, key):
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return np.array(self._vectors()[row])
+
+    def put_many(self, items):
+        """批量追加 [(key, vector)]"""
+        items = [(k, v) for k, v in items if k not in self.index]
+        if not items:
+            return
+        if self.dim is None:
+            self.dim = int(items[0][1].shape[0])
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.stack([v for _, v in items]).astype(np.float32).tobytes())
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{k}\n" for k, _ in items))
+        for k, _ in items:
+            self.index[k] = len(self.index)
+
+    @property
+    def nbytes(self):
+        return os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+
+# ====================== 嵌入缓存 ======================
+class EmbeddingCache:
+    def __init__(self, model_name, max_items=EMBEDDING_CACHE_SIZE, disk_enabled=EMBEDDING_CACHE_DISK_ENABLED,
+                 cache_dir=EMBEDDING_CACHE_DIR):
+        """
+        内容寻址的嵌入缓存：键为（模型名, 规范化文本哈希），内存LRU + 可选磁盘层
+        :param model_name: 嵌入模型名称
+        :param max_items: 内存LRU最大条数
+        :param disk_enabled: 是否启用磁盘层
+        :param cache_dir: 磁盘层根目录
+        """
+        self.model_name = model_name
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk = None
+        if disk_enabled:
+            safe_name = re.sub(r"[^\w.-]", "_", model_name)
+            self.disk = DiskEmbeddingStore(os.path.join(cache_dir, safe_name))
+
+    @staticmethod
+    def normalize(text):
+        """规范化文本：全角半角统一、合并空白"""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+    def _key(self, text):
+        return hashlib.md5(f"{self.model_name}\0{self.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def _get(self, key):
+        """依次查内存层、磁盘层（调用方持有锁）"""
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self._put_memory(key, vector)
+            return vector
+        return None
+
+    def _put_memory(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def encode(self, model, texts, batch_size=32):
+        """
+        带缓存的批量编码：命中直接返回，未命中的文本合并为一次模型调用
+        :param model: SentenceTransformer实例
+        :param texts: 单条文本或文本列表
+        :return: 单条文本返回一维向量，列表返回二维矩阵（float32）
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        keys = [self._key(t) for t in texts]
+        vectors = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vectors[i] = self._get(key)
+                if vectors[i] is None:
+                    missing.setdefault(key, []).append(i)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [texts[missing[k][0]] for k in miss_keys]
+            encoded = np.asarray(model.encode(miss_texts, batch_size=batch_size), dtype=np.float32)
+            with self._lock:
+                for key, vector in zip(miss_keys, encoded):
+                    self._put_memory(key, vector)
+                    for i in missing[key]:
+                        vectors[i] = vector
+                if self.disk is not None:
+                    self.disk.put_many(list(zip(miss_keys, encoded)))
+
+        if single:
+            # 返回副本：调用方原地修改（如归一化）不能改动缓存中的向量
+            return vectors[0].copy()
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def stats(self):
+        """缓存统计：命中率、条数、占用字节"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "memory_items": len(self._lru),
+                "memory_bytes": sum(v.nbytes for v in self._lru.values()),
+                "disk_items": len(self.disk.index) if self.disk else 0,
+                "disk_bytes": self.disk.nbytes if self.disk else 0
+            }
@@ -0,0 +1,109 @@
+import os
+import time
+import hashlib
+from sqlite_pool import SQLiteConnectionManager
+
+# ====================== 入库清单SQL ======================
+# path与知识库片段元数据中的source一致，folder为规范化后的所在目录（用于找出已删除的文件）
+CREATE_MANIFEST_SQL = '''
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        path TEXT PRIMARY KEY,
+        folder TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        indexed_at REAL NOT NULL
+    )
+'''
+CREATE_FOLDER_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_manifest_folder ON ingest_manifest(folder)"
+UPSERT_ENTRY_SQL = '''
+    INSERT INTO ingest_manifest (path, folder, size, mtime_ns, content_hash, indexed_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        folder = excluded.folder,
+        size = excluded.size,
+        mtime_ns = excluded.mtime_ns,
+        content_hash = excluded.content_hash,
+        indexed_at = excluded.indexed_at
+'''
+DELETE_ENTRY_SQL = "DELETE FROM ingest_manifest WHERE path = ?"
+SELECT_FOLDER_SQL = "SELECT path, size, mtime_ns, content_hash FROM ingest_manifest WHERE folder = ?"
+# 流式入库检查点：文件入库到一半中断时，记录已写入的最后一页（内容哈希一致时从下一页继续）
+CREATE_CHECKPOINT_SQL = '''
+    CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+        path TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        last_page INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+'''
+UPSERT_CHECKPOINT_SQL = '''
+    INSERT INTO ingest_checkpoint (path, content_hash, last_page, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        content_hash = excluded.content_hash,
+        last_page = excluded.last_page,
+        updated_at = excluded.updated_at
+'''
+SELECT_CHECKPOINT_SQL = "SELECT content_hash, last_page FROM ingest_checkpoint WHERE path = ?"
+DELETE_CHECKPOINT_SQL = "DELETE FROM ingest_checkpoint WHERE path = ?"
+
+def file_content_hash(file_path, block_size=1 << 20):
+    """按块计算文件内容的SHA-256（不整体读入内存）"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# ====================== 入库清单 ======================
+class IngestManifest:
+    def __init__(self, db_path):
+        """
+        知识库入库清单：记录每个已入库文件的大小、修改时间和内容哈希，
+        批量入库时据此跳过未变化的文件，只重建变化的部分；另记录流式入库中途的检查点
+        :param db_path: 清单数据库路径
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.pool = SQLiteConnectionManager(db_path)
+        with self.pool.transaction() as conn:
+            conn.execute(CREATE_MANIFEST_SQL)
+            conn.execute(CREATE_FOLDER_INDEX_SQL)
+            conn.execute(CREATE_CHECKPOINT_SQL)
+
+    @staticmethod
+    def folder_of(file_path):
+        return os.path.normpath(os.path.dirname(os.path.abspath(file_path)))
+
+    def entries_in(self, folder_path):
+        """目录下（不含子目录）已入库的文件：{path: (size, mtime_ns, content_hash)}"""
+        folder = os.path.normpath(os.path.abspath(folder_path))
+        return {path: (size, mtime_ns, content_hash)
+                for path, size, mtime_ns, content_hash in self.pool.fetchall(SELECT_FOLDER_SQL, (folder,))}
+
+    def record(self, file_path, size, mtime_ns, content_hash, indexed_at):
+        """记录入库完成的文件（同时清除其检查点）"""
+        with self.pool.transaction() as conn:
+            conn.execute(UPSERT_ENTRY_SQL, (file_path, self.folder_of(file_path), size, mtime_ns, content_hash, indexed_at))
+            conn.execute(DELETE_CHECKPOINT_SQL, (file_path,))
+
+    def remove(self, file_path):
+        with self.pool.transaction() as conn:
+            conn.execute(DELETE_ENTRY_SQL, (file_path,))
+            conn.execute(DELETE_CHECKPOINT_SQL, (file_path,))
+
+    def checkpoint(self, file_path):
+        """流式入库检查点：(内容哈希, 已写入的最后一页)，没有则返回None"""
+        rows = self.pool.fetchall(SELECT_CHECKPOINT_SQL, (file_path,))
+        return rows[0] if rows else None
+
+    def save_checkpoint(self, file_path, content_hash, last_page):
+        with self.pool.transaction() as conn:
+            conn.execute(UPSERT_CHECKPOINT_SQL, (file_path, content_hash, last_page, time.time()))
+
+    def clear_checkpoint(self, file_path):
+        with self.pool.transaction() as conn:
+            conn.execute(DELETE_CHECKPOINT_SQL, (file_path,))
+
+    def close(self):
+        self.pool.close()
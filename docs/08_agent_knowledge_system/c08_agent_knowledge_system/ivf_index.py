@@ -0,0 +1,227 @@
+import os
+import numpy as np
+
+ASSIGN_BATCH = 4096  # 分配聚类时每批计算的向量数（控制临时距离矩阵大小）
+
+def auto_nlist(size):
+    """聚类数默认取 4·√n（每个倒排表约 √n/4 条向量）"""
+    return max(1, int(4 * np.sqrt(size)))
+
+def nearest_centroids(vectors, centroids, centroid_norms=None):
+    """分批计算每条向量最近的聚类中心（||c||² - 2x·c 最小即L2最近）"""
+    if centroid_norms is None:
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        block = np.asarray(vectors[start:start + ASSIGN_BATCH], dtype=np.float32)
+        scores = block @ centroids.T
+        scores *= -2
+        scores += centroid_norms
+        labels[start:start + len(block)] = scores.argmin(axis=1)
+    return labels
+
+def kmeans(sample, nlist, iterations=10, seed=0):
+    """
+    Lloyd k-means：随机样本初始化，空簇用随机样本重新播种
+    样本为单位向量（归一化嵌入）时使用球面k-means，每轮把中心归一化：
+    否则混杂多个主题的簇中心范数很小，离所有查询都"不远"，会被几乎每次检索探查，而这类簇往往最大
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(sample))
+    spherical = np.allclose(np.einsum("ij,ij->i", sample, sample), 1.0, atol=1e-3)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = nearest_centroids(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        centroids[filled] = np.add.reduceat(sample[order], starts[filled], axis=0) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        if spherical:
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+# ====================== IVF倒排聚类索引 ======================
+class IVFIndex:
+    def __init__(self, path):
+        """
+        IVF近似索引：k-means把向量划分为nlist个簇，检索时只扫描离查询最近的nprobe个簇
+        每个簇在内存中连续存放成员的行号和int8编码（逐向量缩放），扫描时是顺序读而不是随机取行，
+        调用方再用原始向量对少量候选重排
+        落盘内容：聚类中心（ivf_centroids.npy）+ 每行向量所属簇号（ivf_assign.npy，-1为未分配），
+        簇内编码在加载时按簇号重新打包，无需重新训练
+        :param path: 索引文件目录（与向量文件同目录）
+        """
+        self.centroids_path = os.path.join(path, "ivf_centroids.npy")
+        self.assign_path = os.path.join(path, "ivf_assign.npy")
+        self.centroids = None
+        self._centroid_norms = None
+        self._assign = None
+        self._position = np.zeros(0, dtype=np.int32)  # 行号 -> 在所属簇内的位置
+        self._reset_lists(0, 0)
+        if os.path.exists(self.centroids_path) and os.path.exists(self.assign_path):
+            self._set_centroids(np.load(self.centroids_path))
+            self._assign = np.lib.format.open_memmap(self.assign_path, mode="r+")
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def nlist(self):
+        return len(self.centroids) if self.trained else 0
+
+    def _set_centroids(self, centroids):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    def _reset_lists(self, nlist, dim):
+        self._counts = np.zeros(nlist, dtype=np.int64)
+        self._list_rows = [np.zeros(0, dtype=np.int32) for _ in range(nlist)]
+        self._list_codes = [np.zeros((0, dim), dtype=np.int8) for _ in range(nlist)]
+        self._list_scales = [np.zeros(0, dtype=np.float32) for _ in range(nlist)]
+
+    def load(self, size, read_codes):
+        """
+        按簇号数组重新打包各簇的编码，返回尚未分配簇的行号（写入后未落盘分配结果时由调用方补齐）
+        :param read_codes: 回调，输入升序行号数组，返回(int8编码, 缩放系数)
+        """
+        assign = np.asarray(self._assign[:size])
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        unassigned = int((assign < 0).sum())
+        packed_rows = order[unassigned:]
+        packed_codes = np.empty((len(packed_rows), self.centroids.shape[1]), dtype=np.int8)
+        packed_scales = np.empty(len(packed_rows), dtype=np.float32)
+        for start in range(0, len(packed_rows), 65536):
+            part = packed_rows[start:start + 65536]
+            by_row = np.argsort(part)
+            codes, scales = read_codes(part[by_row])
+            packed_codes[start + by_row] = codes
+            packed_scales[start + by_row] = scales
+        # 各簇先作为打包数组的切片，追加写入时再各自扩容
+        counts = np.bincount(assign[assign >= 0], minlength=self.nlist)
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        self._counts = counts.astype(np.int64)
+        self._list_rows = [packed_rows[bounds[p]:bounds[p + 1]] for p in range(self.nlist)]
+        self._list_codes = [packed_codes[bounds[p]:bounds[p + 1]] for p in range(self.nlist)]
+        self._list_scales = [packed_scales[bounds[p]:bounds[p + 1]] for p in range(self.nlist)]
+        self._position[packed_rows] = np.arange(len(packed_rows)) - np.repeat(bounds[:-1], counts)
+        return order[:unassigned]
+
+    def ensure_capacity(self, capacity):
+        """簇号数组与向量文件同步扩容"""
+        if len(self._position) < capacity:
+            self._position = np.concatenate([self._position, np.zeros(capacity - len(self._position), dtype=np.int32)])
+        current = self._assign.shape[0] if self._assign is not None else 0
+        if capacity <= current:
+            return
+        tmp_path = self.assign_path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.int32, shape=(capacity,))
+        grown[:] = -1
+        if current:
+            grown[:current] = self._assign
+        grown.flush()
+        del grown
+        self._assign = None
+        os.replace(tmp_path, self.assign_path)
+        self._assign = np.lib.format.open_memmap(self.assign_path, mode="r+")
+
+    def train(self, sample, nlist, capacity, iterations=10):
+        """训练聚类中心并清空全部分配（调用方随后需对所有向量重新add）"""
+        centroids = kmeans(np.asarray(sample, dtype=np.float32), nlist, iterations)
+        self._assign = None
+        if os.path.exists(self.assign_path):
+            os.remove(self.assign_path)
+        self.ensure_capacity(capacity)
+        np.save(self.centroids_path + ".tmp.npy", centroids)
+        os.replace(self.centroids_path + ".tmp.npy", self.centroids_path)
+        self._set_centroids(centroids)
+        self._reset_lists(self.nlist, centroids.shape[1])
+
+    def _append(self, label, rows, codes, scales):
+        """向一个簇末尾追加成员，容量不足时按1.5倍扩容"""
+        count = self._counts[label]
+        required = count + len(rows)
+        if required > len(self._list_rows[label]):
+            capacity = max(required, int(len(self._list_rows[label]) * 1.5), 16)
+            for lists in (self._list_rows, self._list_codes, self._list_scales):
+                grown = np.empty((capacity,) + lists[label].shape[1:], dtype=lists[label].dtype)
+                grown[:count] = lists[label][:count]
+                lists[label] = grown
+        self._list_rows[label][count:required] = rows
+        self._list_codes[label][count:required] = codes
+        self._list_scales[label][count:required] = scales
+        self._position[rows] = np.arange(count, required)
+        self._counts[label] = required
+
+    def _remove(self, row):
+        """从所属簇中移除一行（用簇内最后一个成员填补空位）"""
+        label = int(self._assign[row])
+        index = self._position[row]
+        last = self._counts[label] - 1
+        if index != last:
+            moved = self._list_rows[label][last]
+            self._list_rows[label][index] = moved
+            self._list_codes[label][index] = self._list_codes[label][last]
+            self._list_scales[label][index] = self._list_scales[label][last]
+            self._position[moved] = index
+        self._counts[label] = last
+        self._assign[row] = -1
+
+    def add(self, rows, vectors, codes, scales):
+        """
+        分配向量到最近的簇并写入编码；已分配过的行（覆盖写入）先从原簇移除
+        :param vectors: float32向量（用于分配簇）
+        :param codes/scales: 对应的int8编码与缩放系数（用于簇内扫描）
+        """
+        rows = np.asarray(rows, dtype=np.int32)
+        # 同一批内重复的行只保留最后一次写入
+        _, last = np.unique(rows[::-1], return_index=True)
+        keep = np.sort(len(rows) - 1 - last)
+        rows, vectors, codes, scales = rows[keep], vectors[keep], codes[keep], scales[keep]
+        labels = nearest_centroids(vectors, self.centroids, self._centroid_norms)
+        for row in rows[self._assign[rows] >= 0].tolist():
+            self._remove(row)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        for group in np.split(order, bounds):
+            if len(group):
+                self._append(int(labels[group[0]]), rows[group], codes[group], scales[group])
+        self._assign[rows] = labels
+
+    def remove(self, rows):
+        """删除行（墓碑删除时同步移出倒排表）"""
+        for row in rows:
+            if self._assign[row] >= 0:
+                self._remove(row)
+
+    def flush(self):
+        if self._assign is not None:
+            self._assign.flush()
+
+    def probe(self, query, nprobe):
+        """
+        扫描离查询最近的nprobe个簇，返回(行号数组, 近似内积数组)
+        近似内积由int8编码在float32下累加后乘以缩放系数得到
+        """
+        scores = self._centroid_norms - 2 * (self.centroids @ query)
+        nprobe = min(nprobe, self.nlist)
+        if nprobe < self.nlist:
+            probes = np.argpartition(scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.nlist)
+        rows, dots = [], []
+        for p in probes.tolist():
+            count = self._counts[p]
+            if not count:
+                continue
+            rows.append(self._list_rows[p][:count])
+            dot = np.einsum("ij,j->i", self._list_codes[p][:count], query, dtype=np.float32)
+            dot *= self._list_scales[p][:count]
+            dots.append(dot)
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(dots)
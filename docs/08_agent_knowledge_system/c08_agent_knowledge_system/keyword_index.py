@@ -0,0 +1,425 @@
+import os
+import re
+import math
+import threading
+from array import array
+import numpy as np
+from sqlite_pool import SQLiteConnectionManager
+from config import BM25_K1, BM25_B, KEYWORD_INDEX_MAX_SEGMENTS
+
+# ====================== 分词 ======================
+CJK_RANGES = "㐀-䶿一-鿿豈-﫿"
+TOKEN_RE = re.compile(f"[{CJK_RANGES}]+|[^\\W_{CJK_RANGES}]+")
+CJK_RE = re.compile(f"[{CJK_RANGES}]")
+
+def tokenize(text):
+    """
+    中英文混合分词：中文连续片段切为字二元组（单字片段保留单字），其余按单词切分并转小写
+    例："智能体支持PDF" → ["智能", "能体", "体支", "支持", "pdf"]
+    """
+    tokens = []
+    for piece in TOKEN_RE.findall(text.lower()):
+        if CJK_RE.match(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(map(str.__add__, piece[:-1], piece[1:]))
+        else:
+            tokens.append(piece)
+    return tokens
+
+def sorted_unique(values):
+    """排序去重（小整数数组上比np.unique快）"""
+    values = np.sort(values)
+    if len(values) > 1:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+# ====================== 索引表SQL ======================
+# docs：文档行号、外部ID、分组（记忆为user_id，知识库为来源文件）、词数、删除标记
+# postings：按段存放倒排表，行号（uint32）与词频（uint16）分别压成二进制块
+CREATE_DOCS_SQL = '''
+    CREATE TABLE IF NOT EXISTS docs (
+        row INTEGER PRIMARY KEY,
+        id TEXT NOT NULL,
+        grp TEXT,
+        length INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0
+    )
+'''
+CREATE_POSTINGS_SQL = '''
+    CREATE TABLE IF NOT EXISTS postings (
+        term TEXT NOT NULL,
+        segment INTEGER NOT NULL,
+        rows BLOB NOT NULL,
+        tfs BLOB NOT NULL,
+        PRIMARY KEY (term, segment)
+    ) WITHOUT ROWID
+'''
+INSERT_DOC_SQL = "INSERT INTO docs (row, id, grp, length) VALUES (?, ?, ?, ?)"
+DELETE_DOC_SQL = "UPDATE docs SET deleted = 1 WHERE row = ?"
+INSERT_POSTINGS_SQL = "INSERT INTO postings (term, segment, rows, tfs) VALUES (?, ?, ?, ?)"
+
+# ====================== BM25倒排索引 ======================
+DENSE_LOOKUP_MIN = 4096  # 候选数超过该值时用稠密词频表代替二分查找
+
+class KeywordIndex:
+    def __init__(self, path=None, k1=BM25_K1, b=BM25_B, max_segments=KEYWORD_INDEX_MAX_SEGMENTS):
+        """
+        BM25关键词倒排索引：增量写入、墓碑删除，倒排表常驻内存（每条倒排6字节），查询为向量化打分
+        :param path: 索引数据库路径（为None时仅在内存中维护，用于降级模式）
+        :param k1: BM25词频饱和参数
+        :param b: BM25文档长度归一化参数
+        :param max_segments: 落盘段数超过该值时合并新写入的段
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._postings = {}              # 词 -> (行号array('I'), 词频array('H'))
+        self._max_tf = {}                # 词 -> 最大词频（用于计算得分上界）
+        self._min_length = None          # 最短非空文档词数（用于计算得分上界）
+        self._ids = []
+        self._row_of = {}
+        self._lengths = array("I")
+        self._groups = array("I")
+        self._alive = bytearray()
+        self._group_codes = {}
+        self._group_names = []
+        self._alive_count = 0
+        self._indexed_count = 0          # 倒排表中仍有记录的文档数（含未压缩的已删除文档）
+        self._total_length = 0
+        self._segments = []
+        self._tf_lookup = None
+        self.pool = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.pool = SQLiteConnectionManager(path)
+            with self.pool.transaction() as conn:
+                conn.execute(CREATE_DOCS_SQL)
+                conn.execute(CREATE_POSTINGS_SQL)
+            self._load()
+
+    def _load(self):
+        """从索引库恢复内存倒排表"""
+        for row, record_id, group, length, deleted in self.pool.fetchall(
+                "SELECT row, id, grp, length, deleted FROM docs ORDER BY row"):
+            self._append_row(record_id, group, length, row=row, alive=not deleted)
+        for term, rows, tfs in self.pool.fetchall("SELECT term, rows, tfs FROM postings ORDER BY segment"):
+            term_rows, term_tfs = self._postings.setdefault(term, (array("I"), array("H")))
+            term_rows.frombytes(rows)
+            term_tfs.frombytes(tfs)
+        self._max_tf = {term: int(np.frombuffer(tfs, dtype=np.uint16).max()) for term, (_, tfs) in self._postings.items()}
+        self._segments = [r[0] for r in self.pool.fetchall("SELECT DISTINCT segment FROM postings ORDER BY segment")]
+
+    def _group_code(self, group):
+        code = self._group_codes.get(group)
+        if code is None:
+            code = len(self._group_names)
+            self._group_codes[group] = code
+            self._group_names.append(group)
+        return code
+
+    def _append_row(self, record_id, group, length, row=None, alive=True):
+        """在内存中登记一个文档行（row为None时分配新行号）"""
+        if row is None:
+            row = len(self._ids)
+        while len(self._ids) < row:
+            self._ids.append(None)
+            self._lengths.append(0)
+            self._groups.append(0)
+            self._alive.append(0)
+        self._ids.append(record_id)
+        self._lengths.append(length)
+        self._groups.append(self._group_code(group))
+        self._alive.append(1 if alive else 0)
+        self._indexed_count += 1
+        if length and (self._min_length is None or length < self._min_length):
+            self._min_length = length
+        if alive:
+            self._row_of[record_id] = row
+            self._alive_count += 1
+            self._total_length += length
+        return row
+
+    def _kill_rows(self, record_ids):
+        """内存中打墓碑，返回被删除的行号"""
+        rows = []
+        for record_id in record_ids:
+            row = self._row_of.pop(record_id, None)
+            if row is None:
+                continue
+            self._alive[row] = 0
+            self._alive_count -= 1
+            self._total_length -= self._lengths[row]
+            rows.append(row)
+        return rows
+
+    # ---------------- 写入 ----------------
+    def add(self, ids, texts, group=None):
+        """
+        增量写入一批文档（已存在的ID先删除再写入）
+        :param ids: 外部ID列表（记忆哈希/知识片段ID）
+        :param texts: 文本列表
+        :param group: 分组（检索时可按分组过滤）
+        """
+        with self._lock:
+            replaced = self._kill_rows(ids)
+            # 整批分词后统一编号，用numpy按(文档, 词)计数、按词分组，避免逐条倒排的Python循环
+            batch_terms = {}
+            term_ids = []
+            docs = []
+            for record_id, text in zip(ids, texts):
+                tokens = tokenize(text)
+                row = self._append_row(record_id, group, len(tokens))
+                docs.append((row, record_id, group, len(tokens)))
+                term_ids.extend([batch_terms.setdefault(t, len(batch_terms)) for t in tokens])
+            batch = self._group_postings(docs, term_ids, list(batch_terms))
+            for term, (rows, tfs, max_tf) in batch.items():
+                term_rows, term_tfs = self._postings.setdefault(term, (array("I"), array("H")))
+                term_rows.frombytes(rows)
+                term_tfs.frombytes(tfs)
+                self._max_tf[term] = max(self._max_tf.get(term, 0), max_tf)
+            if self.pool:
+                segment = self._segments[-1] + 1 if self._segments else 0
+                with self.pool.transaction() as conn:
+                    conn.executemany(DELETE_DOC_SQL, [(r,) for r in replaced])
+                    conn.executemany(INSERT_DOC_SQL, docs)
+                    conn.executemany(INSERT_POSTINGS_SQL, [
+                        (term, segment, rows, tfs) for term, (rows, tfs, _) in batch.items()
+                    ])
+                self._segments.append(segment)
+                if len(self._segments) > self.max_segments:
+                    self._merge_tail()
+
+    @staticmethod
+    def _group_postings(docs, term_ids, terms):
+        """将一批(文档行号, 词编号)序列汇总为 词 -> (行号字节串, 词频字节串, 最大词频)"""
+        if not term_ids:
+            return {}
+        doc_rows = np.repeat(np.array([d[0] for d in docs], dtype=np.int64), [d[3] for d in docs])
+        n_rows = doc_rows.max() + 1
+        keys, tfs = np.unique(np.asarray(term_ids, dtype=np.int64) * n_rows + doc_rows, return_counts=True)
+        term_of, row_of = np.divmod(keys, n_rows)
+        rows = row_of.astype(np.uint32)
+        tfs = np.minimum(tfs, 65535).astype(np.uint16)
+        # keys按词编号有序，切分点即词编号变化处
+        bounds = np.flatnonzero(np.diff(term_of)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(keys)]])
+        max_tfs = np.maximum.reduceat(tfs, starts)
+        return {
+            terms[term_of[start]]: (rows[start:end].tobytes(), tfs[start:end].tobytes(), int(max_tf))
+            for start, end, max_tf in zip(starts, ends, max_tfs)
+        }
+
+    def delete(self, ids):
+        """按外部ID删除（墓碑标记，墓碑多于存活文档时自动压缩）"""
+        with self._lock:
+            rows = self._kill_rows(ids)
+            if self.pool and rows:
+                with self.pool.transaction() as conn:
+                    conn.executemany(DELETE_DOC_SQL, [(r,) for r in rows])
+            if self._indexed_count - self._alive_count > max(self._alive_count, 1000):
+                self.compact()
+            return len(rows)
+
+    def _merge_tail(self):
+        """合并除首段外的所有段，段数保持有界，合并开销只与新写入量有关"""
+        base = self._segments[0]
+        merged = {}
+        for term, rows, tfs in self.pool.fetchall(
+                "SELECT term, rows, tfs FROM postings WHERE segment > ? ORDER BY segment", (base,)):
+            term_rows, term_tfs = merged.setdefault(term, (array("I"), array("H")))
+            term_rows.frombytes(rows)
+            term_tfs.frombytes(tfs)
+        segment = self._segments[-1] + 1
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM postings WHERE segment > ?", (base,))
+            conn.executemany(INSERT_POSTINGS_SQL, [
+                (term, segment, rows.tobytes(), tfs.tobytes()) for term, (rows, tfs) in merged.items()
+            ])
+        self._segments = [base, segment]
+
+    def compact(self):
+        """全量压缩：丢弃已删除文档的倒排，重写为单段"""
+        with self._lock:
+            alive = np.frombuffer(self._alive, dtype=bool)
+            for term in list(self._postings):
+                rows, tfs = self._postings[term]
+                row_arr = np.frombuffer(rows, dtype=np.uint32)
+                keep = alive[row_arr]
+                if keep.all():
+                    continue
+                if not keep.any():
+                    del self._postings[term]
+                    del self._max_tf[term]
+                    continue
+                new_rows = array("I", row_arr[keep].tobytes())
+                new_tfs = array("H", np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes())
+                del row_arr
+                self._postings[term] = (new_rows, new_tfs)
+            del alive
+            self._indexed_count = self._alive_count
+            if self.pool:
+                with self.pool.transaction() as conn:
+                    conn.execute("DELETE FROM docs WHERE deleted = 1")
+                    conn.execute("DELETE FROM postings")
+                    conn.executemany(INSERT_POSTINGS_SQL, [
+                        (term, 0, rows.tobytes(), tfs.tobytes()) for term, (rows, tfs) in self._postings.items()
+                    ])
+                self._segments = [0] if self._postings else []
+
+    # ---------------- 检索 ----------------
+    def _filter_rows(self, rows, alive, groups, group_code):
+        """只保留存活（且属于指定分组）的行号"""
+        mask = alive[rows]
+        if group_code is not None:
+            mask &= groups[rows] == group_code
+        return rows[mask]
+
+    def _tf_lookup_table(self):
+        """按行号索引的词频表（全零，用完需复位），容量随文档数增长"""
+        if self._tf_lookup is None or len(self._tf_lookup) < len(self._ids):
+            self._tf_lookup = np.zeros(max(len(self._ids), 1024) * 2, dtype=np.uint16)
+        return self._tf_lookup
+
+    def _term_scores(self, tf, idf, doc_lengths, avg_length):
+        """BM25单词得分"""
+        tf = tf.astype(np.float32)
+        return idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_lengths / avg_length))
+
+    def search(self, query, top_k=5, group=None):
+        """
+        BM25检索（MaxScore剪枝，结果与全量打分一致）：
+        先以文档频率最低的词生成候选并完整打分，得到第k名得分作为阈值；
+        得分上界之和低于阈值的高频词不可能单独把候选之外的文档推入top-k，只对候选做二分查找补分，
+        其余词的倒排表并入候选。稀有词查询只触及很短的倒排表
+        :param query: 查询文本
+        :param top_k: 返回条数
+        :param group: 只返回该分组的文档（文档频率等统计仍按全库计算）
+        :return: [(外部ID, BM25得分)]，按得分降序
+        """
+        with self._lock:
+            if not self._alive_count:
+                return []
+            group_code = None
+            if group is not None:
+                group_code = self._group_codes.get(group)
+                if group_code is None:
+                    return []
+            # 与Lucene一致：文档频率与文档总数包含尚未压缩的已删除文档，避免每次查询扫描整条倒排表
+            n_docs = self._indexed_count
+            avg_length = self._total_length / self._alive_count
+            terms = []
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings is None or not len(postings[0]):
+                    continue
+                df = len(postings[0])
+                terms.append((df, term, math.log(1 + (n_docs - df + 0.5) / (df + 0.5))))
+            if not terms:
+                return []
+            terms.sort()
+            idfs = [idf for _, _, idf in terms]
+            postings = [
+                (np.frombuffer(self._postings[t][0], dtype=np.uint32), np.frombuffer(self._postings[t][1], dtype=np.uint16))
+                for _, t, _ in terms
+            ]
+            # 单词得分上界：词频取该词最大词频、文档长度取全库最短文档
+            min_norm = self.k1 * (1 - self.b + self.b * (self._min_length or 0) / avg_length)
+            upper_bounds = [
+                idf * (self.k1 + 1) * self._max_tf[t] / (self._max_tf[t] + min_norm) for _, t, idf in terms
+            ]
+            alive = np.frombuffer(self._alive, dtype=bool)
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            groups = np.frombuffer(self._groups, dtype=np.uint32)
+
+            def score_candidates(candidates):
+                scores = np.zeros(len(candidates), dtype=np.float32)
+                doc_lengths = lengths[candidates]
+                for idf, (rows, tfs) in zip(idfs, postings):
+                    # 候选与倒排都按行号升序，在较长的一方上二分查找较短的一方
+                    if len(rows) < len(candidates):
+                        pos = np.minimum(np.searchsorted(candidates, rows), len(candidates) - 1)
+                        hit = candidates[pos] == rows
+                        pos = pos[hit]
+                        scores[pos] += self._term_scores(tfs[hit], idf, doc_lengths[pos], avg_length)
+                    elif len(candidates) > DENSE_LOOKUP_MIN:
+                        # 候选很多时二分查找代价高，改为把倒排散列到按行号索引的词频表再直接取值
+                        lookup = self._tf_lookup_table()
+                        lookup[rows] = tfs
+                        tf = lookup[candidates]
+                        lookup[rows] = 0
+                        scores += self._term_scores(tf, idf, doc_lengths, avg_length)
+                    else:
+                        pos = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+                        tf = np.where(rows[pos] == candidates, tfs[pos], 0)
+                        scores += self._term_scores(tf, idf, doc_lengths, avg_length)
+                return scores
+
+            # 由稀有词的倒排生成候选并完整打分，以第k名得分为阈值，
+            # 直到未展开词的上界之和低于阈值（候选之外的文档不可能进入top-k）或所有词都需展开
+            n_essential = 1
+            use_accumulator = False
+            while True:
+                if n_essential == 1:
+                    candidates = self._filter_rows(postings[0][0], alive, groups, group_code)
+                else:
+                    candidates = self._filter_rows(
+                        sorted_unique(np.concatenate([rows for rows, _ in postings[:n_essential]])), alive, groups, group_code
+                    )
+                scores = score_candidates(candidates)
+                threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k] if len(scores) >= top_k else 0.0
+                needed = n_essential
+                if len(scores) < top_k:
+                    # 候选不足k条时阈值无从估计，逐个加入下一个词
+                    needed = min(n_essential + 1, len(terms))
+                while needed < len(terms) and sum(upper_bounds[needed:]) >= threshold:
+                    needed += 1
+                if needed == n_essential:
+                    break
+                n_essential = needed
+                # 所有词都需展开且倒排较长时，改用稠密累加器
+                if n_essential == len(terms) and sum(len(rows) for rows, _ in postings) > 65536:
+                    use_accumulator = True
+                    break
+            if use_accumulator:
+                # 所有词都需要展开：稠密累加器按倒排直接累加，不排序、不做二分查找
+                accumulator = np.zeros(len(self._ids), dtype=np.float32)
+                touched = []
+                for idf, (rows, tfs) in zip(idfs, postings):
+                    mask = alive[rows]
+                    if group_code is not None:
+                        mask &= groups[rows] == group_code
+                    rows = rows[mask]
+                    accumulator[rows] += self._term_scores(tfs[mask], idf, lengths[rows], avg_length)
+                    touched.append(rows)
+                candidates = np.concatenate(touched)
+                scores = accumulator[candidates]
+                # 同一文档最多出现len(terms)次，取前k*len(terms)项再去重即可覆盖top-k
+                k = min(top_k * len(terms), len(candidates))
+                if k < len(candidates):
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    candidates, scores = candidates[top], scores[top]
+                candidates = sorted_unique(candidates)
+                scores = accumulator[candidates]
+            del alive, lengths, groups, postings
+            if not len(candidates):
+                return []
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self._ids[candidates[i]], float(scores[i])) for i in top]
+
+    def count(self):
+        """存活文档数"""
+        return self._alive_count
+
+    def __contains__(self, record_id):
+        return record_id in self._row_of
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
@@ -1,16 +1,61 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from document_parser import DocumentParserFactory
 from structured_memory import VectorMemoryDB
-from config import VECTOR_DB_PATH, EMBEDDING_MODEL, SUPPORTED_FORMATS
+from ingest_manifest import IngestManifest, file_content_hash
+from parallel_ingest import ParallelIngestor
+from config import (
+    VECTOR_DB_PATH, EMBEDDING_MODEL, SUPPORTED_FORMATS, TOP_K_KNOWLEDGE,
+    KNOWLEDGE_SEARCH_MODE, HYBRID_CANDIDATES, RRF_K, INGEST_MANIFEST_PATH,
+    KNOWLEDGE_UPSERT_BATCH_SIZE, STREAM_INGEST_MIN_BYTES
+)
+
+STREAM_FORMATS = (".pdf", ".txt")  # 解析器支持流式产出（iter_pages）的格式
+
+# ====================== 排名融合 ======================
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """
+    倒数排名融合（RRF）：score(d) = Σ 1 / (k + rank_i(d))，只依赖名次，不需要对齐各路得分的量纲
+    :param ranked_lists: 多路检索结果，每路为按相关度降序排列的ID列表
+    :param k: 平滑常数，越大越弱化头部名次的优势
+    :return: [(ID, 融合得分)]，按得分降序
+    """
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, item_id in enumerate(ranked, 1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
 
 class KnowledgeManager:
-    def __init__(self):
-        """外部知识库管理器"""
-        self.vector_db = VectorMemoryDB(VECTOR_DB_PATH, EMBEDDING_MODEL)
+    def __init__(self, vector_db=None):
+        """
+        外部知识库管理器
+        :param vector_db: 复用已有的VectorMemoryDB（不传则新建，模型和客户端仍为进程内共享）
+        """
+        self.vector_db = vector_db or VectorMemoryDB(VECTOR_DB_PATH, EMBEDDING_MODEL)
         self.supported_formats = SUPPORTED_FORMATS
+        # 入库清单：批量入库时跳过未变化的文件
+        self.manifest = IngestManifest(INGEST_MANIFEST_PATH)
+        # 批量入库：多进程解析+单一写入阶段
+        self.ingestor = ParallelIngestor(self.vector_db, self.manifest)
+        # 混合检索的两路（向量/关键词）并发执行；模型推理与NumPy计算会释放GIL
+        self._search_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="knowledge-search")
+        self.last_search_stats = {}
+
+    def add_document(self, file_path: str, progress=None):
+        """
+        添加单个文档到知识库
+        :param progress: 流式入库（PDF/TXT）的进度回调 progress(文件路径, 已处理页/块数, 总页/块数, 已写入片段数)
+        """
+        return self._ingest_file(file_path, progress=progress)
 
-    def add_document(self, file_path: str):
-        """添加单个文档到知识库"""
+    def _ingest_file(self, file_path, content_hash=None, progress=None, purge=True):
+        """
+        解析并入库单个文件，成功后记入入库清单（记录的是解析前的文件状态，解析期间被修改的文件下次会重建）
+        支持逐页/逐块解析的格式（PDF/TXT）走流式入库，其余格式整体解析后分批入库
+        :param purge: 从头入库前删除该来源已有的片段（批量入库时已统一清理，传False）
+        """
         if not os.path.exists(file_path):
             print(f"文件不存在：{file_path}")
             return False
@@ -21,40 +66,166 @@ class KnowledgeManager:
             return False
         
         try:
+            stat = os.stat(file_path)
+            content_hash = content_hash or file_content_hash(file_path)
             # 获取解析器
             parser = DocumentParserFactory.get_parser(file_path)
+            if hasattr(parser, "iter_pages"):
+                if not self._stream_ingest(file_path, parser, content_hash, progress, purge=purge):
+                    return False
+                self.manifest.record(file_path, stat.st_size, stat.st_mtime_ns, content_hash, time.time())
+                return True
             # 解析文档
             document_chunks = parser.parse(file_path)
             if not document_chunks:
                 print(f"文档解析无内容：{file_path}")
                 return False
             # 入库
-            return self.vector_db.add_knowledge_document(file_path, document_chunks)
+            if purge:
+                self.vector_db.delete_knowledge_document(file_path, missing_ok=True)
+            if not self.vector_db.add_knowledge_document(file_path, document_chunks):
+                return False
+            self.manifest.record(file_path, stat.st_size, stat.st_mtime_ns, content_hash, time.time())
+            return True
         except Exception as e:
             print(f"添加文档失败：{e}")
             return False
 
+    def _stream_ingest(self, file_path, parser, content_hash, progress=None, batch_size=KNOWLEDGE_UPSERT_BATCH_SIZE,
+                       purge=True):
+        """
+        流式入库：逐页（PDF）/逐块（TXT，下文的“页”即块）解析→分割→凑满一批片段后编码写入，每批写入后把已写入的最后一页记为检查点
+        缓冲区只保存尚未写入的整页片段（不超过 batch_size + 一页），内存占用与文档大小无关；
+        中断后再次入库内容未变的同一文件时，从检查点的下一页继续（片段ID确定，重复写入的页会覆盖而不会重复）
+        :param progress: 进度回调 progress(文件路径, 已处理页数, 总页数, 已写入片段数)，每页调用一次
+        :param purge: 从头入库前删除该来源已有的片段
+        """
+        unit = getattr(parser, "page_unit", "页")
+        start_page = 1
+        checkpoint = self.manifest.checkpoint(file_path)
+        if checkpoint is not None:
+            stored_hash, last_page = checkpoint
+            if stored_hash == content_hash:
+                start_page = last_page + 1
+                print(f"从检查点继续入库：{os.path.basename(file_path)}，第 {start_page} {unit}起")
+            else:
+                # 中断后文件内容已变化：清理残留片段，从头入库
+                self.manifest.clear_checkpoint(file_path)
+        if start_page == 1:
+            # 旧版本或修改前写入的片段ID与本次不同，不会被覆盖，需先删除
+            if purge or checkpoint is not None:
+                self.vector_db.delete_knowledge_document(file_path, missing_ok=True)
+            self.vector_db.discard_knowledge_text(file_path)
+
+        start = time.perf_counter()
+        buffer, stored, page_num = [], 0, start_page - 1
+        for page_num, total_pages, page_chunks in parser.iter_pages(file_path, start_page):
+            buffer.extend(page_chunks)
+            if len(buffer) >= batch_size:
+                stored += self._commit_pages(file_path, buffer, content_hash, page_num)
+                buffer = []
+            if progress is not None:
+                progress(file_path, page_num, total_pages, stored)
+        if buffer:
+            stored += self._commit_pages(file_path, buffer, content_hash, page_num)
+
+        if not stored and start_page == 1:
+            print(f"文档解析无内容：{file_path}")
+            return False
+        elapsed = time.perf_counter() - start
+        print(f"入库完成：{os.path.basename(file_path)}，第 {start_page}-{page_num} {unit}，{stored} 个片段，"
+              f"耗时 {elapsed:.2f}s（{stored / max(elapsed, 1e-9):.1f} 片段/秒）")
+        return True
+
+    def _commit_pages(self, file_path, chunks, content_hash, last_page):
+        """写入若干整页的片段并更新检查点，返回写入的片段数"""
+        self.vector_db.store_knowledge_chunks(
+            [file_path] * len(chunks),
+            [chunk["content"] for chunk in chunks],
+            [chunk["metadata"] for chunk in chunks]
+        )
+        self.manifest.save_checkpoint(file_path, content_hash, last_page)
+        return len(chunks)
+
     def add_batch_documents(self, folder_path: str):
-        """批量添加文件夹中的文档"""
+        """
+        增量批量入库：对照入库清单，文件大小和修改时间都未变的直接跳过（不读内容），
+        有变化的再比对内容哈希；只入库新增和内容已修改的文件，并删除已修改或已移除文件的旧片段
+        新增和修改的文件交给并行入库流水线（多进程解析，跨文件批量编码写入），吞吐见 ingestor.last_ingest_stats
+        """
         if not os.path.isdir(folder_path):
             print(f"文件夹不存在：{folder_path}")
             return False
         
-        success_count = 0
-        for filename in os.listdir(folder_path):
+        start = time.perf_counter()
+        # 清单中的路径按绝对路径比对（同一目录可能以不同写法传入），删除旧片段时仍用入库时的原路径
+        known = {os.path.abspath(path): (path, entry) for path, entry in self.manifest.entries_in(folder_path).items()}
+        added, modified, touched = [], [], []
+        unchanged = 0
+        for filename in sorted(os.listdir(folder_path)):
             file_path = os.path.join(folder_path, filename)
-            if os.path.isfile(file_path):
-                ext = os.path.splitext(filename)[1].lower()
-                if ext in self.supported_formats:
-                    if self.add_document(file_path):
-                        success_count += 1
-        
-        print(f"批量入库完成，成功添加：{success_count} 个文档")
+            if not os.path.isfile(file_path) or os.path.splitext(filename)[1].lower() not in self.supported_formats:
+                continue
+            stored = known.pop(os.path.abspath(file_path), None)
+            if stored is None:
+                added.append((file_path, None))
+                continue
+            stored_path, (size, mtime_ns, stored_hash) = stored
+            stat = os.stat(file_path)
+            if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+                unchanged += 1
+                continue
+            content_hash = file_content_hash(file_path)
+            if content_hash == stored_hash:
+                touched.append((stored_path, stat, content_hash))
+            else:
+                modified.append((file_path, stored_path, content_hash))
+        removed = [stored_path for stored_path, _ in known.values()]
+        print(f"入库计划：新增 {len(added)}，修改 {len(modified)}，移除 {len(removed)}，未变化 {unchanged + len(touched)}")
+
+        # 仅修改时间变化（内容相同）：只更新清单
+        for stored_path, stat, content_hash in touched:
+            self.manifest.record(stored_path, stat.st_size, stat.st_mtime_ns, content_hash, time.time())
+        for stored_path in removed:
+            self.vector_db.delete_knowledge_document(stored_path)
+            self.manifest.remove(stored_path)
+        for file_path, stored_path, content_hash in modified:
+            # 片段ID由路径+位置+内容生成，修改后的文件先删除旧片段再整体重建
+            self.vector_db.delete_knowledge_document(stored_path)
+            self.manifest.remove(stored_path)
+        if added:
+            # 不在清单中的文件也可能已有片段（建立清单之前入库的旧知识库，或直接调用向量库写入的），
+            # 其片段ID可能与本次不同而不会被覆盖，入库前先删除
+            existing = {os.path.abspath(source): source for source in self.vector_db.knowledge_sources()}
+            for file_path, _ in added:
+                source = existing.get(os.path.abspath(file_path))
+                if source is not None:
+                    self.vector_db.delete_knowledge_document(source)
+        files = [(file_path, content_hash) for file_path, _, content_hash in modified] + added
+        # 大文件和有检查点的文件逐个流式入库（内存有界、可断点续传），其余交给并行流水线
+        streamed = {file_path: content_hash for file_path, content_hash in files if self._should_stream(file_path)}
+        parallel = [item for item in files if item[0] not in streamed]
+        succeeded = set(self.ingestor.ingest(parallel)) if parallel else set()
+        succeeded.update(file_path for file_path, content_hash in streamed.items()
+                         if self._ingest_file(file_path, content_hash, purge=False))
+        reindexed = sum(file_path in succeeded for file_path, _, _ in modified)
+        success_count = len(succeeded) - reindexed
+        failed = len(files) - len(succeeded)
+        print(f"批量入库完成：新增 {success_count}，重建 {reindexed}，移除 {len(removed)}，跳过 {unchanged + len(touched)}，"
+              f"失败 {failed}，耗时 {time.perf_counter() - start:.2f}s")
         return True
 
+    def _should_stream(self, file_path):
+        """是否走流式入库：解析器支持逐页/逐块产出，且文件较大或上次入库中断留有检查点"""
+        if os.path.splitext(file_path)[1].lower() not in STREAM_FORMATS:
+            return False
+        return os.path.getsize(file_path) >= STREAM_INGEST_MIN_BYTES or self.manifest.checkpoint(file_path) is not None
+
     def delete_document(self, file_path: str):
         """删除指定文档"""
-        return self.vector_db.delete_knowledge_document(file_path)
+        deleted = self.vector_db.delete_knowledge_document(file_path)
+        self.manifest.remove(file_path)
+        return deleted
 
     def list_documents(self):
         """列出知识库中所有文档"""
@@ -69,6 +240,85 @@ class KnowledgeManager:
             print(f"获取文档列表失败：{e}")
             return []
 
-    def search_knowledge(self, query: str, top_k: int = 5):
-        """检索外部知识库"""
-        return self.vector_db.retrieve_knowledge(query, top_k)
\ No newline at end of file
+    def search_knowledge(self, query: str, top_k: int = TOP_K_KNOWLEDGE, mode: str = KNOWLEDGE_SEARCH_MODE, query_embedding=None):
+        """
+        检索外部知识库
+        :param mode: dense（仅向量检索）/ hybrid（向量+BM25并发检索后RRF融合）
+        :param query_embedding: 已编码的查询向量（传入时向量检索不再重复编码）
+        """
+        if mode != "hybrid" or not self.vector_db.use_vector_db:
+            return self.vector_db.retrieve_knowledge(query, top_k, query_embedding)
+        try:
+            # 结果缓存（精确键/语义近似），文档增删时按来源失效
+            cache = self.vector_db.knowledge_cache
+            if cache.semantic and query_embedding is None:
+                query_embedding = self.vector_db.encode(query)
+            knowledge_text = cache.get("hybrid", query, top_k, query_embedding)
+            if knowledge_text is not None:
+                self.last_search_stats = {"cache_hit": True}
+                return knowledge_text
+            records = self.hybrid_search(query, top_k, query_embedding=query_embedding)
+            knowledge_text = self.vector_db.format_knowledge(records)
+            if not self.last_search_stats.get("degraded"):
+                # 某一路失败时的结果不完整，不写入缓存
+                cache.put("hybrid", query, top_k, knowledge_text, self.vector_db.record_sources(records), query_embedding)
+            return knowledge_text
+        except Exception as e:
+            print(f"知识库检索失败：{e}")
+            return "【外部知识库检索失败】"
+
+    def _timed_channel(self, search_fn, *args, **kwargs):
+        """执行一路检索并计时；失败时返回空结果，不影响另一路"""
+        start = time.perf_counter()
+        try:
+            records, error = search_fn(*args, **kwargs), None
+        except Exception as e:
+            records, error = [], str(e)
+        return records, (time.perf_counter() - start) * 1000, error
+
+    def hybrid_search(self, query: str, top_k: int = TOP_K_KNOWLEDGE, candidates: int = HYBRID_CANDIDATES, query_embedding=None):
+        """
+        混合检索：向量检索与BM25关键词检索并发执行，按倒数排名融合取top_k
+        两路并发时延迟约为较慢一路，而非两路之和；各路耗时与候选数记录在 last_search_stats
+        :param candidates: 每一路召回的候选数
+        :param query_embedding: 已编码的查询向量（传入时向量检索不再重复编码）
+        :return: [{"id", "content", "metadata", "rrf_score"}]，按融合得分降序
+        """
+        start = time.perf_counter()
+        dense_future = self._search_executor.submit(
+            self._timed_channel, self.vector_db.dense_search_knowledge, query, candidates, query_embedding
+        )
+        keyword_future = self._search_executor.submit(
+            self._timed_channel, self.vector_db.keyword_search_knowledge, query, candidates, load_contents=False
+        )
+        dense_records, dense_ms, dense_error = dense_future.result()
+        keyword_records, keyword_ms, keyword_error = keyword_future.result()
+        for channel, error in [("向量", dense_error), ("关键词", keyword_error)]:
+            if error:
+                print(f"{channel}检索失败，仅使用另一路结果：{error}")
+
+        records = {r["id"]: r for r in keyword_records}
+        records.update({r["id"]: r for r in dense_records})
+        fused = reciprocal_rank_fusion([
+            [r["id"] for r in dense_records],
+            [r["id"] for r in keyword_records]
+        ])[:top_k]
+        results = [{
+            "id": chunk_id,
+            "content": records[chunk_id]["content"],
+            "metadata": records[chunk_id]["metadata"],
+            "rrf_score": round(score, 6)
+        } for chunk_id, score in fused]
+        # 两路候选只带偏移，片段文本只为融合后的top_k读取
+        self.vector_db.load_knowledge_contents(results)
+
+        self.last_search_stats = {
+            "dense_ms": round(dense_ms, 2),
+            "dense_candidates": len(dense_records),
+            "keyword_ms": round(keyword_ms, 2),
+            "keyword_candidates": len(keyword_records),
+            "fused_candidates": len(records),
+            "degraded": bool(dense_error or keyword_error),
+            "total_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+        return results
\ No newline at end of file
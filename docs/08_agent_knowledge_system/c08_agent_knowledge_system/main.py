@@ -1,5 +1,6 @@
 from agent_rag import RAGEnabledAgent
-from knowledge_manager import KnowledgeManager
+from warmup import AgentWarmup
+from config import WARMUP_ENABLED
 import os
 
 def init_demo_docs():
@@ -27,9 +28,12 @@ if __name__ == "__main__":
     # 1. 初始化测试文档
     demo_dir = init_demo_docs()
     
-    # 2. 初始化智能体和知识库
-    agent = RAGEnabledAgent(user_id="test_rag_001")
-    km = agent.knowledge_manager
+    # 2. 初始化智能体和知识库（开启预热时在后台加载，不阻塞命令行）
+    warmup = AgentWarmup(lambda: RAGEnabledAgent(user_id="test_rag_001"))
+    if WARMUP_ENABLED:
+        warmup.start()
+    else:
+        warmup.get()
     
     # 3. 欢迎信息
     print("===== 智能体工程（结构化记忆+外部知识库） =====")
@@ -52,8 +56,11 @@ if __name__ == "__main__":
             print("程序退出！")
             break
         
+        agent = warmup.get()
+        km = agent.knowledge_manager
+        
         # 查看文档列表
-        elif user_input.lower() == "list":
+        if user_input.lower() == "list":
             km.list_documents()
         
         # 批量添加demo文档
@@ -0,0 +1,74 @@
+import time
+import threading
+from config import MEMORY_SWEEP_INTERVAL, MEMORY_SWEEP_BATCH_SIZE
+
+# ====================== 过期记忆后台清理 ======================
+class ExpiredMemorySweeper:
+    def __init__(self, vector_db, metadata_db, interval=MEMORY_SWEEP_INTERVAL, batch_size=MEMORY_SWEEP_BATCH_SIZE):
+        """
+        过期记忆清理线程：定期跨用户分批删除过期记忆（向量+元数据）
+        :param vector_db: VectorMemoryDB实例
+        :param metadata_db: MemoryMetadataDB实例
+        :param interval: 清理间隔（秒）
+        :param batch_size: 每批删除条数
+        """
+        self.vector_db = vector_db
+        self.metadata_db = metadata_db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_removed = 0
+        self.last_duration = 0.0
+        self.total_removed = 0
+        self.passes = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """执行一轮清理，返回本轮删除条数"""
+        if not self.vector_db.use_vector_db:
+            return 0
+        start = time.perf_counter()
+        now = int(time.time())
+        removed = 0
+        while not self._stop_event.is_set():
+            expired_hashes = self.metadata_db.get_expired_batch(now, self.batch_size)
+            if not expired_hashes:
+                break
+            # 先删向量再删元数据：中途失败时元数据仍在，下一轮可重试
+            self.vector_db.memory_collection.delete(ids=expired_hashes)
+            self.vector_db.memory_keywords.delete(expired_hashes)
+            self.metadata_db.delete_by_hashes(expired_hashes)
+            removed += len(expired_hashes)
+            if len(expired_hashes) < self.batch_size:
+                break
+        self.last_removed = removed
+        self.last_duration = time.perf_counter() - start
+        self.total_removed += removed
+        self.passes += 1
+        # 没有过期记忆时不输出（后台线程每轮都会执行，避免打断交互界面），统计见 last_removed/total_removed
+        if removed:
+            print(f"过期记忆清理：删除 {removed} 条，耗时 {self.last_duration * 1000:.1f} ms")
+        return removed
+
+    def _run(self):
+        """后台循环：启动后立即清理一轮，之后按间隔执行"""
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"过期记忆清理失败：{e}")
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """启动后台清理线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台清理线程"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
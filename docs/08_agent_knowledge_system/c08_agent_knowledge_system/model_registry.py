@@ -0,0 +1,116 @@
+import os
+import threading
+from embedding_cache import EmbeddingCache
+from config import VECTOR_BACKEND
+
+# ====================== 进程级共享资源注册表 ======================
+# 嵌入模型、向量库客户端、嵌入缓存、关键词索引、片段文本存储、图片OCR在进程内各只创建一次，所有使用方共享引用
+# sentence_transformers / chromadb 导入耗时较长，推迟到首次获取时再导入
+_lock = threading.RLock()
+_embedding_models = {}
+_vector_clients = {}
+_embedding_caches = {}
+_keyword_indexes = {}
+_chunk_stores = {}
+_image_ocr = None
+_image_ocr_options = {}
+
+def get_embedding_model(model_name):
+    """获取嵌入模型（首次调用时加载）"""
+    model = _embedding_models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _embedding_models.get(model_name)
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name)
+                _embedding_models[model_name] = model
+    return model
+
+def _open_vector_client(db_path, backend):
+    """按后端配置打开向量库：auto优先Chroma，不可用时退回NumPy后端"""
+    if backend in ("auto", "chroma"):
+        try:
+            import chromadb
+            return chromadb.PersistentClient(path=db_path)
+        except Exception as e:
+            if backend == "chroma":
+                raise
+            print(f"Chroma不可用，改用NumPy向量库：{e}")
+    from numpy_vector_store import NumpyVectorClient
+    return NumpyVectorClient(db_path)
+
+def get_vector_client(db_path, backend=VECTOR_BACKEND):
+    """获取向量库客户端（同一路径只打开一次）"""
+    key = os.path.abspath(db_path)
+    client = _vector_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _vector_clients.get(key)
+            if client is None:
+                client = _open_vector_client(db_path, backend)
+                _vector_clients[key] = client
+    return client
+
+def get_embedding_cache(model_name):
+    """获取指定模型的嵌入缓存（同一模型的所有使用方共享命中）"""
+    cache = _embedding_caches.get(model_name)
+    if cache is None:
+        with _lock:
+            cache = _embedding_caches.get(model_name)
+            if cache is None:
+                cache = EmbeddingCache(model_name)
+                _embedding_caches[model_name] = cache
+    return cache
+
+def get_keyword_index(index_path):
+    """获取BM25倒排索引（同一路径只加载一次）"""
+    key = os.path.abspath(index_path)
+    index = _keyword_indexes.get(key)
+    if index is None:
+        with _lock:
+            index = _keyword_indexes.get(key)
+            if index is None:
+                from keyword_index import KeywordIndex
+                index = KeywordIndex(index_path)
+                _keyword_indexes[key] = index
+    return index
+
+def get_chunk_store(store_path):
+    """获取片段文本存储（同一路径只打开一次）"""
+    key = os.path.abspath(store_path)
+    store = _chunk_stores.get(key)
+    if store is None:
+        with _lock:
+            store = _chunk_stores.get(key)
+            if store is None:
+                from chunk_store import ChunkStore
+                store = ChunkStore(store_path)
+                _chunk_stores[key] = store
+    return store
+
+def configure_image_ocr(**options):
+    """设置图片OCR的创建参数（ImageOCR的构造参数），需在首次获取前调用"""
+    _image_ocr_options.update(options)
+
+def get_image_ocr():
+    """获取图片OCR（OCR进程池与结果缓存在进程内共享）"""
+    global _image_ocr
+    if _image_ocr is None:
+        with _lock:
+            if _image_ocr is None:
+                from ocr import ImageOCR
+                _image_ocr = ImageOCR(**_image_ocr_options)
+    return _image_ocr
+
+def loaded_resources():
+    """已加载的资源清单（用于排查重复加载）"""
+    return {
+        "embedding_models": list(_embedding_models),
+        "vector_clients": list(_vector_clients),
+        "embedding_caches": list(_embedding_caches),
+        "keyword_indexes": list(_keyword_indexes),
+        "chunk_stores": list(_chunk_stores),
+        "image_ocr": _image_ocr is not None,
+        "image_ocr_options": dict(_image_ocr_options)
+    }
@@ -0,0 +1,536 @@
+import os
+import json
+import threading
+import numpy as np
+from sqlite_pool import SQLiteConnectionManager
+from ivf_index import IVFIndex, auto_nlist
+from config import IVF_NLIST, IVF_NPROBE, IVF_MIN_VECTORS
+
+# ====================== 过滤条件 ======================
+def match_where(metadata, where):
+    """按Chroma的where语法匹配元数据（支持$and/$or及$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin）"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, c) for c in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, target in condition.items():
+                if op == "$eq" and value != target:
+                    return False
+                if op == "$ne" and value == target:
+                    return False
+                if op == "$in" and value not in target:
+                    return False
+                if op == "$nin" and value in target:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > target:
+                        return False
+                    if op == "$gte" and not value >= target:
+                        return False
+                    if op == "$lt" and not value < target:
+                        return False
+                    if op == "$lte" and not value <= target:
+                        return False
+    return True
+
+# ====================== 向量压缩 ======================
+VECTOR_DTYPES = ("float32", "float16", "int8")
+STORAGE_METADATA_KEYS = ("vector_dtype", "vector_rescore_factor")
+VECTOR_INDEXES = ("flat", "ivf")
+IVF_SAMPLE_PER_LIST = 40       # 训练样本数 = 聚类数×该倍数（不超过向量总数）
+IVF_RETRAIN_GROWTH = 4         # 自动聚类数时，向量数增长到上次训练的该倍数后重新训练
+IVF_RESCORE_FACTOR = 4         # IVF簇内按int8编码粗排，取 n_results×该倍数 的候选用原始向量重排
+
+def quantize_int8(vectors):
+    """逐向量对称量化为int8：code = round(x / scale)，scale = max|x| / 127"""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+# ====================== 记录表SQL ======================
+CREATE_RECORDS_SQL = '''
+    CREATE TABLE IF NOT EXISTS records (
+        row INTEGER PRIMARY KEY,
+        id TEXT UNIQUE NOT NULL,
+        document TEXT,
+        metadata TEXT,
+        deleted INTEGER NOT NULL DEFAULT 0
+    )
+'''
+CREATE_COLLECTION_META_SQL = '''
+    CREATE TABLE IF NOT EXISTS collection_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+'''
+UPSERT_RECORD_SQL = '''
+    INSERT INTO records (row, id, document, metadata, deleted) VALUES (?, ?, ?, ?, 0)
+    ON CONFLICT(id) DO UPDATE SET
+        document = COALESCE(excluded.document, document),
+        metadata = COALESCE(excluded.metadata, metadata),
+        deleted = 0
+'''
+DELETE_RECORD_SQL = "UPDATE records SET deleted = 1 WHERE row = ?"
+SET_META_SQL = "INSERT OR REPLACE INTO collection_meta (key, value) VALUES (?, ?)"
+
+# ====================== NumPy向量集合 ======================
+class NumpyVectorCollection:
+    def __init__(self, name, path, metadata=None):
+        """
+        纯NumPy向量集合：接口与Chroma Collection保持一致（upsert/query/get/update/delete/count/modify）
+        向量存放在内存映射的.npy文件中，ID/文档/元数据存放在并行的SQLite记录表中，
+        删除只打墓碑标记，查询为精确检索（矩阵乘 + argpartition取top-k）
+        存储精度由新建时的集合元数据决定（与Chroma的"hnsw:space"等配置方式一致）：
+          vector_dtype：float32（默认）/ float16 / int8（逐向量缩放），检索在压缩向量上进行
+          vector_rescore_factor：压缩存储时取 n_results×该倍数 的候选，用float32原始向量重排；
+                                 为0时不保留原始向量（磁盘占用最小，距离为近似值）
+        近似索引同样由集合元数据配置（可随modify修改）：
+          vector_index：flat（默认，精确检索）/ ivf（倒排聚类，只扫描最近的ivf_nprobe个簇）
+          ivf_nlist：聚类数（0为按向量数自动取4·√n，并在规模增长后自动重训）
+          ivf_nprobe：每次检索扫描的簇数（越大召回越高、越慢），也可直接修改实例的nprobe属性
+          ivf_min_vectors：向量数达到该值后才训练索引，之前仍为精确检索
+        :param name: 集合名称
+        :param path: 集合存储目录
+        :param metadata: 集合元数据（仅在新建时写入）
+        """
+        self.name = name
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.embeddings_path = os.path.join(path, "embeddings.npy")
+        self.codes_path = os.path.join(path, "codes.npy")
+        self.scales_path = os.path.join(path, "scales.npy")
+        self.pool = SQLiteConnectionManager(os.path.join(path, "records.db"))
+        with self.pool.transaction() as conn:
+            conn.execute(CREATE_RECORDS_SQL)
+            conn.execute(CREATE_COLLECTION_META_SQL)
+        self._lock = threading.RLock()
+        self._ivf = None
+        if metadata and self.pool.fetchall("SELECT 1 FROM collection_meta WHERE key = 'collection_metadata'") == []:
+            with self.pool.transaction() as conn:
+                conn.execute(SET_META_SQL, ("collection_metadata", json.dumps(metadata, ensure_ascii=False)))
+        self._load()
+
+    def _load(self):
+        """从记录表和向量文件恢复内存索引"""
+        self._meta = {k: json.loads(v) for k, v in self.pool.fetchall("SELECT key, value FROM collection_meta")}
+        self.dim = self._meta.get("dim")
+        config = self.metadata or {}
+        self.vector_dtype = config.get("vector_dtype", "float32")
+        if self.vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"不支持的向量存储精度：{self.vector_dtype}，支持：{VECTOR_DTYPES}")
+        self.rescore_factor = int(config.get("vector_rescore_factor", 0)) if self.vector_dtype != "float32" else 0
+        self._ids = []
+        self._metadatas = []
+        self._row_of = {}
+        rows = self.pool.fetchall("SELECT row, id, metadata, deleted FROM records ORDER BY row")
+        self._size = rows[-1][0] + 1 if rows else 0
+        self._ids = [None] * self._size
+        self._metadatas = [None] * self._size
+        alive_rows = []
+        for row, record_id, metadata, deleted in rows:
+            self._ids[row] = record_id
+            self._row_of[record_id] = row
+            self._metadatas[row] = json.loads(metadata) if metadata else None
+            if not deleted:
+                alive_rows.append(row)
+
+        # _vectors：检索用向量（float32时即原始向量）；_full：float32原始向量（压缩存储且不重排时为None）
+        self._vectors = self._full = self._scales = None
+        capacity = 0
+        if self.vector_dtype == "float32" or self.rescore_factor:
+            if os.path.exists(self.embeddings_path):
+                self._full = np.lib.format.open_memmap(self.embeddings_path, mode="r+")
+                capacity = self._full.shape[0]
+        if self.vector_dtype == "float32":
+            self._vectors = self._full
+        elif os.path.exists(self.codes_path):
+            self._vectors = np.lib.format.open_memmap(self.codes_path, mode="r+")
+            capacity = self._vectors.shape[0]
+            if self.vector_dtype == "int8":
+                self._scales = np.lib.format.open_memmap(self.scales_path, mode="r+")
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[alive_rows] = True
+        # 平方范数常驻内存（每条4字节），优先按原始向量计算
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        for start in range(0, self._size, 65536):
+            end = min(start + 65536, self._size)
+            block = self._full[start:end] if self._full is not None else self._dequantize(start, end)
+            self._sq_norms[start:end] = np.einsum("ij,ij->i", block, block)
+        self._configure_index()
+
+    def _configure_index(self):
+        """按集合元数据启用/调整近似索引；已训练的索引从磁盘加载，并补齐未落盘分配的行"""
+        config = self.metadata or {}
+        index_type = config.get("vector_index", "flat")
+        if index_type not in VECTOR_INDEXES:
+            raise ValueError(f"不支持的向量索引类型：{index_type}，支持：{VECTOR_INDEXES}")
+        self.nprobe = int(config.get("ivf_nprobe", IVF_NPROBE))
+        self.ivf_nlist = int(config.get("ivf_nlist", IVF_NLIST))
+        self.ivf_min_vectors = int(config.get("ivf_min_vectors", IVF_MIN_VECTORS))
+        if index_type == "flat":
+            self._ivf = None
+            return
+        if self._ivf is None:
+            self._ivf = IVFIndex(self.path)
+            if self._ivf.trained:
+                self._ivf.ensure_capacity(self._alive.shape[0])
+                pending = self._ivf.load(self._size, lambda rows: quantize_int8(self._rows_float32(rows)))
+                pending = pending[self._alive[pending]]
+                if len(pending):
+                    self._index_rows(pending, self._rows_float32(pending))
+                    self._ivf.flush()
+        if self._vectors is not None:
+            self._maybe_train_index()
+
+    def _maybe_train_index(self):
+        """
+        向量数达到阈值时训练索引；自动聚类数时随规模增长定期重训，保持每簇大小约为√n/4
+        训练在触发它的那次upsert中同步执行（持有集合锁，期间其他读写等待），跨过阈值的那次写入会多花一次k-means的时间；
+        批量导入前后可直接调用 rebuild_index() 把训练放在可控的时机
+        """
+        alive = self.count()
+        trained_size = self._meta.get("ivf_trained_size", 0)
+        if not self._ivf.trained:
+            if alive >= self.ivf_min_vectors:
+                self.rebuild_index()
+        elif not self.ivf_nlist and alive >= trained_size * IVF_RETRAIN_GROWTH:
+            self.rebuild_index()
+
+    def rebuild_index(self):
+        """重新训练IVF聚类中心并分配全部存活向量（同时清除倒排表中已删除的行）"""
+        with self._lock:
+            if self._ivf is None:
+                return
+            alive_rows = np.flatnonzero(self._alive[:self._size])
+            if not len(alive_rows):
+                return
+            nlist = self.ivf_nlist or auto_nlist(len(alive_rows))
+            rng = np.random.default_rng(0)
+            sample_size = min(len(alive_rows), nlist * IVF_SAMPLE_PER_LIST)
+            sample_rows = np.sort(rng.choice(alive_rows, sample_size, replace=False))
+            print(f"训练IVF索引：{len(alive_rows)} 条向量，{nlist} 个簇，样本 {sample_size} 条")
+            self._ivf.train(self._rows_float32(sample_rows), nlist, self._alive.shape[0])
+            for start in range(0, len(alive_rows), 65536):
+                rows = alive_rows[start:start + 65536]
+                self._index_rows(rows, self._rows_float32(rows))
+            self._ivf.flush()
+            self._set_meta("ivf_trained_size", int(len(alive_rows)))
+
+    def _index_rows(self, rows, vectors):
+        """把向量加入IVF索引（簇内统一存int8编码，与集合本身的存储精度无关）"""
+        self._ivf.add(rows, vectors, *quantize_int8(vectors))
+
+    def _dequantize(self, start, end):
+        """将一段压缩向量还原为float32"""
+        block = self._vectors[start:end].astype(np.float32)
+        if self._scales is not None:
+            block *= self._scales[start:end, None]
+        return block
+
+    def _rows_float32(self, rows):
+        """读取指定行的float32向量（优先原始向量，否则反量化）"""
+        if self._full is not None:
+            return np.asarray(self._full[rows])
+        block = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows, None]
+        return block
+
+    def _dot(self, size, query):
+        """全部向量与查询向量的内积：int8/float16直接在压缩数组上累加为float32，不生成整块float32副本"""
+        if self.vector_dtype == "float32":
+            return self._vectors[:size] @ query
+        dots = np.einsum("ij,j->i", self._vectors[:size], query, dtype=np.float32)
+        if self._scales is not None:
+            dots *= self._scales[:size]
+        return dots
+
+    def _set_meta(self, key, value):
+        self._meta[key] = value
+        with self.pool.transaction() as conn:
+            conn.execute(SET_META_SQL, (key, json.dumps(value, ensure_ascii=False)))
+
+    def _grow_file(self, path, dtype, shape):
+        """扩容单个向量文件：写新文件后原子替换，返回新的内存映射（调用前需释放旧映射）"""
+        tmp_path = path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+        if self._size:
+            current = np.lib.format.open_memmap(path, mode="r")
+            grown[:self._size] = current[:self._size]
+            del current
+        grown.flush()
+        del grown
+        os.replace(tmp_path, path)
+        return np.lib.format.open_memmap(path, mode="r+")
+
+    def _ensure_capacity(self, required):
+        """容量不足时按倍数扩容向量文件"""
+        capacity = self._vectors.shape[0] if self._vectors is not None else 0
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity * 2, 1024)
+        self._vectors = self._full = self._scales = None
+        if self.vector_dtype == "float32" or self.rescore_factor:
+            self._full = self._grow_file(self.embeddings_path, np.float32, (new_capacity, self.dim))
+        if self.vector_dtype == "float32":
+            self._vectors = self._full
+        else:
+            self._vectors = self._grow_file(self.codes_path, self.vector_dtype, (new_capacity, self.dim))
+            if self.vector_dtype == "int8":
+                self._scales = self._grow_file(self.scales_path, np.float32, (new_capacity,))
+        if self._ivf is not None and self._ivf.trained:
+            self._ivf.ensure_capacity(new_capacity)
+        self._alive = np.concatenate([self._alive, np.zeros(new_capacity - capacity, dtype=bool)])
+        self._sq_norms = np.concatenate([self._sq_norms, np.zeros(new_capacity - capacity, dtype=np.float32)])
+
+    def _fetch_documents(self, rows):
+        """按行号批量读取文档原文"""
+        documents = {}
+        rows = [int(r) for r in rows]
+        for start in range(0, len(rows), 500):
+            part = rows[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for row, document in self.pool.fetchall(f"SELECT row, document FROM records WHERE row IN ({placeholders})", part):
+                documents[row] = document
+        return [documents.get(r) for r in rows]
+
+    def _resolve_rows(self, ids=None, where=None):
+        """按ID和/或where条件解析出存活的行号"""
+        if ids is not None:
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+        else:
+            rows = range(self._size)
+        return [r for r in rows if self._alive[r] and match_where(self._metadatas[r], where)]
+
+    # ---------------- 写入 ----------------
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        """插入或覆盖向量（已存在的ID原位覆盖）"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                self._set_meta("dim", self.dim)
+            new_ids = {i for i in ids if i not in self._row_of}
+            self._ensure_capacity(self._size + len(new_ids))
+            records = []
+            rows = []
+            for idx, record_id in enumerate(ids):
+                row = self._row_of.get(record_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._row_of[record_id] = row
+                    self._ids.append(record_id)
+                    self._metadatas.append(None)
+                rows.append(row)
+                self._alive[row] = True
+                metadata = metadatas[idx] if metadatas is not None else None
+                if metadata is not None:
+                    self._metadatas[row] = metadata
+                document = documents[idx] if documents is not None else None
+                records.append((row, record_id, document, json.dumps(metadata, ensure_ascii=False) if metadata is not None else None))
+            self._write_vectors(np.asarray(rows), embeddings)
+            if self._ivf is not None and self._ivf.trained:
+                self._index_rows(rows, embeddings)
+                self._ivf.flush()
+            # 先落盘向量再提交记录：崩溃后记录表中的每一行都有对应向量
+            for mapped in (self._vectors, self._full, self._scales):
+                if mapped is not None:
+                    mapped.flush()
+            with self.pool.transaction() as conn:
+                conn.executemany(UPSERT_RECORD_SQL, records)
+            if self._ivf is not None:
+                self._maybe_train_index()
+
+    def _write_vectors(self, rows, embeddings):
+        """按存储精度写入向量（压缩存储时同时写入原始向量供重排）"""
+        if self._full is not None:
+            self._full[rows] = embeddings
+        if self.vector_dtype == "int8":
+            codes, scales = quantize_int8(embeddings)
+            self._vectors[rows] = codes
+            self._scales[rows] = scales
+        elif self.vector_dtype == "float16":
+            self._vectors[rows] = embeddings.astype(np.float16)
+        self._sq_norms[rows] = np.einsum("ij,ij->i", embeddings, embeddings)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        """更新已存在的记录（不存在的ID忽略）"""
+        with self._lock:
+            positions = [idx for idx, i in enumerate(ids) if i in self._row_of and self._alive[self._row_of[i]]]
+            if not positions:
+                return
+            if embeddings is None:
+                with self.pool.transaction() as conn:
+                    for idx in positions:
+                        row = self._row_of[ids[idx]]
+                        if metadatas is not None:
+                            self._metadatas[row] = metadatas[idx]
+                            conn.execute("UPDATE records SET metadata = ? WHERE row = ?", (json.dumps(metadatas[idx], ensure_ascii=False), row))
+                        if documents is not None:
+                            conn.execute("UPDATE records SET document = ? WHERE row = ?", (documents[idx], row))
+                return
+            self.upsert(
+                [ids[idx] for idx in positions],
+                [embeddings[idx] for idx in positions],
+                [documents[idx] for idx in positions] if documents is not None else None,
+                [metadatas[idx] for idx in positions] if metadatas is not None else None
+            )
+
+    def delete(self, ids=None, where=None):
+        """按ID或where条件删除（打墓碑标记）；两者都不传时报错而不是清空集合（与Chroma一致）"""
+        if ids is None and where is None:
+            raise ValueError("delete需要指定ids或where")
+        with self._lock:
+            rows = self._resolve_rows(ids, where)
+            for row in rows:
+                self._alive[row] = False
+            if self._ivf is not None and self._ivf.trained:
+                self._ivf.remove(rows)
+                self._ivf.flush()
+            with self.pool.transaction() as conn:
+                conn.executemany(DELETE_RECORD_SQL, [(row,) for row in rows])
+
+    # ---------------- 读取 ----------------
+    def count(self):
+        return int(self._alive[:self._size].sum())
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """按ID或where条件读取记录（limit/offset分页）"""
+        with self._lock:
+            rows = self._resolve_rows(ids, where)
+            if offset:
+                rows = rows[offset:]
+            if limit:
+                rows = rows[:limit]
+            return {
+                "ids": [self._ids[r] for r in rows],
+                "documents": self._fetch_documents(rows) if "documents" in include else None,
+                "metadatas": [self._metadatas[r] for r in rows] if "metadatas" in include else None
+            }
+
+    def _top_k(self, distances, n_results, where, rows=None):
+        """
+        取距离最小的n条（返回distances中的位置）；有过滤条件时逐步扩大候选窗口，直到凑够n条或遍历全部
+        :param rows: distances对应的行号（None表示distances按行号排列）
+        """
+        size = distances.shape[0]
+        window = n_results if not where else n_results * 8
+        while True:
+            window = min(window, size)
+            if window < size:
+                candidates = np.argpartition(distances, window - 1)[:window]
+            else:
+                candidates = np.arange(size)
+            candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+            picked = [int(p) for p in candidates if np.isfinite(distances[p])
+                      and match_where(self._metadatas[p if rows is None else rows[p]], where)]
+            if len(picked) >= n_results or window == size:
+                return picked[:n_results]
+            window *= 4
+
+    def _search(self, query, n_results, where):
+        """单个查询向量的检索，返回(行号列表, 距离数组)"""
+        if self._ivf is not None and self._ivf.trained:
+            found = self._search_ivf(query, n_results, where)
+            if found is not None:
+                return found
+        # ||x-q||² = ||x||² - 2x·q + ||q||²，原地计算避免额外的百万级临时数组
+        distances = self._dot(self._size, query)
+        distances *= -2
+        distances += self._sq_norms[:self._size]
+        distances += float(query @ query)
+        distances[~self._alive[:self._size]] = np.inf
+        if not self.rescore_factor:
+            rows = self._top_k(distances, n_results, where)
+            return rows, distances[rows]
+        # 压缩向量上取放大的候选集，再用原始向量计算精确距离重排
+        return self._rescore(query, self._top_k(distances, n_results * self.rescore_factor, where), n_results)
+
+    def _search_ivf(self, query, n_results, where):
+        """
+        IVF近似检索：在最近的nprobe个簇内用int8编码粗排，再对候选精确重排
+        探查簇内满足过滤条件的结果不足n条时返回None（由调用方退回精确检索）
+        """
+        rows, dots = self._ivf.probe(query, self.nprobe)
+        distances = self._sq_norms[rows] - 2 * dots + float(query @ query)
+        distances[~self._alive[rows]] = np.inf
+        factor = max(self.rescore_factor, IVF_RESCORE_FACTOR)
+        positions = self._top_k(distances, n_results * factor, where, rows)
+        if len(positions) < n_results:
+            return None
+        return self._rescore(query, rows[positions].tolist(), n_results)
+
+    def _rescore(self, query, rows, n_results):
+        """用原始向量（无原始向量时为反量化向量）计算候选的精确距离，取最近的n条"""
+        if not rows:
+            return [], np.zeros(0)
+        exact = self._rows_float32(np.asarray(rows)) - query
+        distances = np.einsum("ij,ij->i", exact, exact)
+        order = np.argsort(distances, kind="stable")[:n_results]
+        return [rows[i] for i in order], distances[order]
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        """检索最近的n条（精确或IVF近似）：返回平方L2距离（与Chroma默认度量一致）"""
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            for query in np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1):
+                if not self._size or not n_results:
+                    rows, distances = [], np.zeros(0)
+                else:
+                    rows, distances = self._search(query, n_results, where)
+                results["ids"].append([self._ids[r] for r in rows])
+                results["documents"].append(self._fetch_documents(rows))
+                results["metadatas"].append([self._metadatas[r] for r in rows])
+                results["distances"].append([max(float(d), 0.0) for d in distances])
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    # ---------------- 集合元数据 ----------------
+    @property
+    def metadata(self):
+        return self._meta.get("collection_metadata")
+
+    def modify(self, name=None, metadata=None):
+        """更新集合元数据（存储精度相关配置只在新建时生效，不随修改变化；索引配置立即生效）"""
+        if metadata is not None:
+            with self._lock:
+                storage = {k: v for k, v in (self.metadata or {}).items() if k in STORAGE_METADATA_KEYS}
+                self._set_meta("collection_metadata", {**metadata, **storage})
+                self._configure_index()
+
+# ====================== NumPy向量库客户端 ======================
+class NumpyVectorClient:
+    def __init__(self, path):
+        """NumPy向量库客户端：每个集合一个子目录"""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def get_or_create_collection(self, name, metadata=None):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = NumpyVectorCollection(name, os.path.join(self.path, name), metadata)
+            return self._collections[name]
+
+    def get_collection(self, name):
+        return self.get_or_create_collection(name)
@@ -0,0 +1,171 @@
+import io
+import os
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlite_pool import SQLiteConnectionManager
+from config import OCR_WORKERS, OCR_LANG, OCR_MIN_IMAGE_SIDE, OCR_CACHE_PATH
+
+# ====================== OCR结果缓存SQL ======================
+# 键为图片解码后数据的SHA-256 + 识别语言：扫描件里反复出现的logo、页眉、印章只OCR一次，重新入库时也不再OCR；
+# 识别结果取决于语言，修改OCR_LANG后按新语言重新识别
+CREATE_OCR_CACHE_SQL = '''
+    CREATE TABLE IF NOT EXISTS ocr_results (
+        image_hash TEXT NOT NULL,
+        lang TEXT NOT NULL,
+        text TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (image_hash, lang)
+    )
+'''
+DROP_LEGACY_CACHE_SQL = "DROP TABLE IF EXISTS ocr_cache"  # 早期不含语言的缓存表
+SELECT_OCR_SQL = "SELECT image_hash, text FROM ocr_results WHERE lang = ? AND image_hash IN ({})"
+INSERT_OCR_SQL = "INSERT OR REPLACE INTO ocr_results (image_hash, lang, text, created_at) VALUES (?, ?, ?, ?)"
+SELECT_BATCH = 500  # 每条查询携带的哈希数（SQLite参数个数有上限）
+
+COLOR_MODES = {"DeviceGray": "L", "CalGray": "L", "DeviceRGB": "RGB", "CalRGB": "RGB", "DeviceCMYK": "CMYK"}
+ICC_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+ENCODED_FILTERS = {"DCTDecode", "DCT", "JPXDecode"}  # 流数据本身就是JPEG/JPEG2000文件
+
+def _name(value):
+    return getattr(value, "name", value)
+
+def _color_mode(image):
+    """由PDF色彩空间和位深推断PIL图片模式，不支持的（索引色等）返回None"""
+    if image.get("bits") == 1:
+        return "1"
+    colorspace = image.get("colorspace") or []
+    space = colorspace[0] if isinstance(colorspace, list) and colorspace else colorspace
+    if isinstance(space, list) and space and _name(space[0]) == "ICCBased":
+        profile = space[1].resolve() if hasattr(space[1], "resolve") else space[1]
+        return ICC_MODES.get(profile.get("N"))
+    return COLOR_MODES.get(_name(space))
+
+def image_payload(image, min_side=OCR_MIN_IMAGE_SIDE):
+    """
+    从pdfplumber的页面图片中取出OCR所需数据（需在页面释放前调用）
+    :return: (内容哈希, (数据, PIL模式, 像素尺寸))；模式为None表示数据是JPEG/JPEG2000文件；
+             图片短边小于min_side（图标、装饰线等）或格式不支持时返回None
+    """
+    width, height = (int(v) for v in image.get("srcsize", (0, 0)))
+    if min(width, height) < min_side:
+        return None
+    stream = image["stream"]
+    data = stream.get_data()
+    filters = [_name(f) for f, _ in stream.get_filters()]
+    if filters and filters[-1] in ENCODED_FILTERS:
+        mode = None
+    else:
+        mode = _color_mode(image)
+        if mode is None:
+            return None
+    digest = hashlib.sha256(data).hexdigest()
+    return digest, (data, mode, (width, height))
+
+def ocr_payload(payload, lang=OCR_LANG):
+    """OCR单张图片（在OCR子进程中执行）"""
+    from PIL import Image
+    import pytesseract
+    data, mode, size = payload
+    image = Image.open(io.BytesIO(data)) if mode is None else Image.frombytes(mode, size, data)
+    return pytesseract.image_to_string(image, lang=lang)
+
+def _timed_ocr(payload, lang):
+    """OCR并计时；失败时返回错误信息而不抛出，单张图片失败不影响同批其他图片"""
+    start = time.perf_counter()
+    try:
+        return ocr_payload(payload, lang), None, time.perf_counter() - start
+    except Exception as e:
+        return "", str(e), time.perf_counter() - start
+
+# ====================== OCR结果缓存 ======================
+class OCRCache:
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.pool = SQLiteConnectionManager(db_path)
+        with self.pool.transaction() as conn:
+            conn.execute(DROP_LEGACY_CACHE_SQL)
+            conn.execute(CREATE_OCR_CACHE_SQL)
+
+    def get_many(self, image_hashes, lang):
+        """{图片哈希: 文本}，只含该语言下已缓存的"""
+        image_hashes = list(image_hashes)
+        found = {}
+        for start in range(0, len(image_hashes), SELECT_BATCH):
+            batch = image_hashes[start:start + SELECT_BATCH]
+            found.update(self.pool.fetchall(SELECT_OCR_SQL.format(",".join("?" * len(batch))), [lang, *batch]))
+        return found
+
+    def put_many(self, items, lang):
+        now = time.time()
+        with self.pool.transaction() as conn:
+            conn.executemany(INSERT_OCR_SQL, [(image_hash, lang, text, now) for image_hash, text in items])
+
+    def close(self):
+        self.pool.close()
+
+# ====================== 图片OCR ======================
+class ImageOCR:
+    def __init__(self, workers=OCR_WORKERS, cache_path=OCR_CACHE_PATH, lang=OCR_LANG):
+        """
+        图片OCR：按内容哈希去重并查持久缓存，只把没见过的图片送进进程池并行识别
+        :param workers: OCR进程数（0为CPU核数，1为在当前进程中串行识别）
+        :param cache_path: OCR结果缓存库路径
+        """
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.lang = lang
+        self.cache = OCRCache(cache_path)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"images": 0, "skipped": 0, "cache_hits": 0, "duplicates": 0, "recognized": 0, "failed": 0, "ocr_s": 0.0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn启动：子进程只导入OCR依赖，不继承父进程的模型和数据库连接
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def recognize(self, payloads):
+        """
+        批量识别，返回与payloads等长的文本列表（payload为None即被跳过的图片，返回空串）
+        同一批内相同的图片只识别一次；识别成功的结果写入缓存，失败的不缓存（下次重试）
+        """
+        self.stats["images"] += len(payloads)
+        self.stats["skipped"] += sum(p is None for p in payloads)
+        unique = {}
+        for payload in payloads:
+            if payload is not None:
+                unique.setdefault(payload[0], payload[1])
+        self.stats["duplicates"] += sum(p is not None for p in payloads) - len(unique)
+        texts = self.cache.get_many(unique, self.lang)
+        self.stats["cache_hits"] += len(texts)
+        todo = [(image_hash, payload) for image_hash, payload in unique.items() if image_hash not in texts]
+        if todo:
+            if self.workers > 1 and len(todo) > 1:
+                results = self._get_executor().map(_timed_ocr, [p for _, p in todo], [self.lang] * len(todo))
+            else:
+                results = (_timed_ocr(payload, self.lang) for _, payload in todo)
+            recognized = []
+            for (image_hash, _), (text, error, seconds) in zip(todo, results):
+                self.stats["ocr_s"] += seconds
+                if error:
+                    self.stats["failed"] += 1
+                    print(f"OCR解析失败：{error}")
+                    continue
+                texts[image_hash] = text
+                recognized.append((image_hash, text))
+            self.stats["recognized"] += len(recognized)
+            if recognized:
+                self.cache.put_many(recognized, self.lang)
+        return [texts.get(p[0], "") if p is not None else "" for p in payloads]
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        self.cache.close()
@@ -0,0 +1,195 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from document_parser import DocumentParserFactory
+from ingest_manifest import file_content_hash
+from config import INGEST_WORKERS, INGEST_QUEUE_SIZE, INGEST_PARALLEL_MIN_FILES, KNOWLEDGE_UPSERT_BATCH_SIZE
+
+_DONE = object()  # 解析阶段结束标记
+
+def init_parse_worker():
+    """
+    解析子进程初始化：子进程内的OCR串行识别。解析进程本身已按核数并行，
+    每个解析进程再各开一个按核数的OCR进程池会产生 核数² 个进程
+    """
+    from model_registry import configure_image_ocr
+    configure_image_ocr(workers=1)
+
+def resolve_workers(workers):
+    """解析进程数：0为CPU核数"""
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+def parse_file(file_path, content_hash=None):
+    """
+    解析并分割单个文件（在解析子进程中执行，异常不外抛，保证单个文件失败不影响其他文件）
+    文件状态在解析前读取：解析期间被修改的文件，下次批量入库时会因状态不一致而重建
+    :return: (文件路径, 片段列表, (大小, 修改时间ns, 内容哈希), 错误信息, 解析耗时秒)
+    """
+    start = time.perf_counter()
+    try:
+        stat = os.stat(file_path)
+        content_hash = content_hash or file_content_hash(file_path)
+        chunks = DocumentParserFactory.get_parser(file_path).parse(file_path)
+        return file_path, chunks, (stat.st_size, stat.st_mtime_ns, content_hash), None, time.perf_counter() - start
+    except Exception as e:
+        return file_path, [], None, str(e), time.perf_counter() - start
+
+# ====================== 并行入库流水线 ======================
+class ParallelIngestor:
+    def __init__(self, vector_db, manifest, workers=INGEST_WORKERS, queue_size=INGEST_QUEUE_SIZE,
+                 batch_size=KNOWLEDGE_UPSERT_BATCH_SIZE):
+        """
+        多进程并行入库：解析+分割在进程池中并行（CPU密集，不受GIL限制），
+        解析结果经有界队列交给单个写入阶段，跨文件凑满batch_size个片段后统一编码、一次upsert
+        队列满时暂停提交新文件，内存中待写入的解析结果不超过 queue_size + 进程数 个文件
+        进程池首次使用时创建并一直复用（子进程启动要导入解析依赖、加载分词器；只读取tokenizer.json，不加载嵌入模型），文件数较少时直接在后台线程中解析
+        :param vector_db: VectorMemoryDB
+        :param manifest: IngestManifest，文件全部片段写入后才记入清单
+        :param workers: 解析进程数（0为CPU核数，1为不启用进程池、在后台线程中解析）
+        :param queue_size: 解析结果队列长度（文件数）
+        :param batch_size: 每次编码+写入的片段数
+        """
+        self.vector_db = vector_db
+        self.manifest = manifest
+        self.workers = resolve_workers(workers)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.last_ingest_stats = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn启动：子进程不继承父进程已加载的模型、数据库连接和线程
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=init_parse_worker)
+            return self._executor
+
+    def close(self):
+        """关闭解析进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def ingest(self, files):
+        """
+        并行入库一批文件，单个文件解析或写入失败只影响该文件
+        :param files: [(文件路径, 已知内容哈希或None)]
+        :return: 成功入库的文件路径列表
+        """
+        start = time.perf_counter()
+        self._stats = {"files": len(files), "chunks": 0, "parse_s": 0.0, "embed_s": 0.0, "upsert_s": 0.0}
+        self._remaining = {}  # 文件路径 -> [未写入片段数, 文件状态]
+        self._pending = []    # 待写入片段：(文件路径, 片段)
+        self._succeeded = []
+        results = queue.Queue(maxsize=self.queue_size)
+        producer = threading.Thread(target=self._produce, args=(files, results), name="ingest-parse", daemon=True)
+        producer.start()
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            self._consume(item)
+        self._flush(final=True)
+        producer.join()
+
+        elapsed = time.perf_counter() - start
+        stats = self._stats
+        stats.update({
+            "succeeded": len(self._succeeded),
+            "failed": len(files) - len(self._succeeded),
+            "workers": self.workers if self.workers > 1 and len(files) >= INGEST_PARALLEL_MIN_FILES else 1,
+            "elapsed_s": round(elapsed, 2),
+            "files_per_s": round(len(files) / max(elapsed, 1e-9), 2),
+            "chunks_per_s": round(stats["chunks"] / max(elapsed, 1e-9), 1)
+        })
+        for key in ("parse_s", "embed_s", "upsert_s"):
+            stats[key] = round(stats[key], 2)
+        self.last_ingest_stats = stats
+        print(f"并行入库：{stats['succeeded']}/{len(files)} 个文件，{stats['chunks']} 个片段，{stats['workers']} 个解析进程，"
+              f"耗时 {elapsed:.2f}s（{stats['files_per_s']} 文件/秒，{stats['chunks_per_s']} 片段/秒；"
+              f"解析累计 {stats['parse_s']}s，编码 {stats['embed_s']}s，写入 {stats['upsert_s']}s）")
+        return self._succeeded
+
+    def _produce(self, files, results):
+        """解析阶段：进程池中同时处理的文件数不超过进程数，按完成顺序放入有界队列"""
+        try:
+            if self.workers <= 1 or len(files) < INGEST_PARALLEL_MIN_FILES:
+                for file_path, content_hash in files:
+                    results.put(parse_file(file_path, content_hash))
+                return
+            executor = self._get_executor()
+            todo = iter(files)
+            running = set()
+            while True:
+                for file_path, content_hash in todo:
+                    running.add(executor.submit(parse_file, file_path, content_hash))
+                    if len(running) >= self.workers:
+                        break
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.put(future.result())
+        except Exception as e:
+            print(f"并行解析中断：{e}")
+        finally:
+            results.put(_DONE)
+
+    def _consume(self, item):
+        """写入阶段：收下一个文件的解析结果，待写入片段凑满一批即编码写入"""
+        file_path, chunks, file_state, error, parse_s = item
+        self._stats["parse_s"] += parse_s
+        if error or not chunks:
+            print(f"添加文档失败：{file_path}，{error or '文档解析无内容'}")
+            return
+        self._remaining[file_path] = [len(chunks), file_state]
+        self.vector_db.discard_knowledge_text(file_path)
+        self._pending.extend((file_path, chunk) for chunk in chunks)
+        self._flush()
+
+    def _flush(self, final=False):
+        while self._pending and (final or len(self._pending) >= self.batch_size):
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            # 同一文件更早的批次写入失败时，丢弃它剩余的片段
+            batch = [(path, chunk) for path, chunk in batch if path in self._remaining]
+            if batch:
+                self._store(batch)
+
+    def _store(self, batch):
+        file_paths = [path for path, _ in batch]
+        documents = [chunk["content"] for _, chunk in batch]
+        metadatas = [chunk["metadata"] for _, chunk in batch]
+        try:
+            start = time.perf_counter()
+            embeddings = self.vector_db.encode(documents)
+            self._stats["embed_s"] += time.perf_counter() - start
+            start = time.perf_counter()
+            self.vector_db.store_knowledge_chunks(file_paths, documents, metadatas, embeddings)
+            self._stats["upsert_s"] += time.perf_counter() - start
+        except Exception as e:
+            if len(set(file_paths)) > 1:
+                # 跨文件的批次失败时按文件拆开重试，只让出错的文件失败
+                for file_path in dict.fromkeys(file_paths):
+                    self._store([(path, chunk) for path, chunk in batch if path == file_path])
+                return
+            # 文件整体作废：删除已写入的部分片段，不记入清单，下次入库时重试
+            print(f"添加文档失败：{file_paths[0]}，{e}")
+            self._remaining.pop(file_paths[0], None)
+            self.vector_db.delete_knowledge_document(file_paths[0])
+            return
+        self._stats["chunks"] += len(batch)
+        for file_path in file_paths:
+            entry = self._remaining[file_path]
+            entry[0] -= 1
+            if not entry[0]:
+                del self._remaining[file_path]
+                size, mtime_ns, content_hash = entry[1]
+                self.manifest.record(file_path, size, mtime_ns, content_hash, time.time())
+                self._succeeded.append(file_path)
@@ -0,0 +1,142 @@
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from config import KNOWLEDGE_CACHE_SIZE, KNOWLEDGE_CACHE_TTL, KNOWLEDGE_CACHE_SEMANTIC_THRESHOLD
+
+# ====================== 检索结果缓存 ======================
+class QueryResultCache:
+    def __init__(self, max_items=KNOWLEDGE_CACHE_SIZE, ttl=KNOWLEDGE_CACHE_TTL,
+                 semantic_threshold=KNOWLEDGE_CACHE_SEMANTIC_THRESHOLD):
+        """
+        知识库检索结果缓存：键为（检索模式, 规范化查询, top_k），TTL过期 + LRU淘汰
+        每条结果记录命中片段的来源文件，文档增删时只失效引用了该来源的结果；
+        新增文档可能让其他问题出现更好的答案，这部分由TTL兜底
+        :param max_items: 最大缓存条数（0为关闭）
+        :param ttl: 过期时间（秒）
+        :param semantic_threshold: 语义模式的余弦相似度阈值（0为关闭）；开启后精确键未命中时，
+                                   复用查询向量足够接近的已缓存结果
+        """
+        self.max_items = max_items
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self._entries = OrderedDict()  # key -> (过期时间, 结果, 来源集合, 归一化查询向量)
+        self._by_source = {}           # 来源 -> 引用该来源的key集合
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_items > 0
+
+    @property
+    def semantic(self):
+        return self.enabled and self.semantic_threshold > 0
+
+    @staticmethod
+    def normalize(query):
+        """规范化查询：全角半角统一、忽略大小写、合并空白"""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip().lower()
+
+    def _key(self, mode, query, top_k):
+        return (mode, self.normalize(query), top_k)
+
+    def _drop(self, key):
+        """移除一条缓存及其来源索引（调用方持有锁）"""
+        _, _, sources, _ = self._entries.pop(key)
+        for source in sources:
+            keys = self._by_source.get(source)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_source[source]
+
+    def get(self, mode, query, top_k, query_embedding=None):
+        """查缓存：先按精确键，语义模式下再按查询向量相似度（需传入query_embedding）；未命中返回None"""
+        if not self.enabled:
+            return None
+        key = self._key(mode, query, top_k)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._drop(key)
+                entry = None
+            if entry is None and self.semantic and query_embedding is not None:
+                key = self._nearest(mode, top_k, query_embedding, now)
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None:
+                    self.semantic_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _nearest(self, mode, top_k, query_embedding, now):
+        """在同模式、同top_k的未过期条目中找余弦相似度最高且超过阈值的key（调用方持有锁）"""
+        keys, vectors = [], []
+        for key, (expires, _, _, vector) in self._entries.items():
+            if key[0] == mode and key[2] == top_k and vector is not None and expires > now:
+                keys.append(key)
+                vectors.append(vector)
+        if not keys:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarities = np.stack(vectors) @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        best = int(similarities.argmax())
+        return keys[best] if similarities[best] >= self.semantic_threshold else None
+
+    def put(self, mode, query, top_k, result, sources, query_embedding=None):
+        """写入一条检索结果；sources为结果中片段的来源文件"""
+        if not self.enabled:
+            return
+        key = self._key(mode, query, top_k)
+        vector = None
+        if self.semantic and query_embedding is not None:
+            vector = np.asarray(query_embedding, dtype=np.float32)
+            vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        sources = frozenset(sources)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, result, sources, vector)
+            for source in sources:
+                self._by_source.setdefault(source, set()).add(key)
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_sources(self, sources):
+        """失效引用了指定来源文件的全部缓存结果，返回失效条数"""
+        with self._lock:
+            keys = set()
+            for source in sources:
+                keys |= self._by_source.get(source, set())
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_source.clear()
+
+    def stats(self):
+        """缓存统计：命中率（含语义命中）、条数、失效次数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "items": len(self._entries),
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_STATEMENT_CACHE, SQLITE_BUSY_TIMEOUT_MS
+
+# ====================== SQLite连接管理器 ======================
+class SQLiteConnectionManager:
+    def __init__(self, db_path, synchronous=SQLITE_SYNCHRONOUS, cache_size_kb=SQLITE_CACHE_SIZE_KB,
+                 statement_cache=SQLITE_STATEMENT_CACHE, busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS):
+        """
+        SQLite连接管理器：每个线程持有一条长连接，复用预编译语句
+        :param db_path: 数据库文件路径
+        :param synchronous: 同步级别（WAL模式下NORMAL即可保证一致性）
+        :param cache_size_kb: 页缓存大小（KB）
+        :param statement_cache: 每条连接缓存的预编译语句数
+        :param busy_timeout_ms: 锁等待超时（毫秒）
+        """
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache = statement_cache
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+
+    def _connect(self):
+        """创建新连接并设置PRAGMA"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def get_connection(self):
+        """获取当前线程的长连接（不存在则创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            return conn
+        conn = self._connect()
+        with self._lock:
+            self._connections.append(conn)
+            self._local.conn = conn
+            self._local.generation = self._generation
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """事务上下文：正常退出提交，异常回滚"""
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def fetchall(self, sql, params=()):
+        """执行只读查询并返回全部结果"""
+        return self.get_connection().execute(sql, params).fetchall()
+
+    def close(self):
+        """关闭所有线程持有的连接"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    print(f"关闭SQLite连接失败：{e}")
+            self._connections = []
+            self._generation += 1
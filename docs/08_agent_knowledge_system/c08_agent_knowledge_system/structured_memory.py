@@ -1,164 +1,394 @@
-import json
+import atexit
 import hashlib
-import sqlite3
 import os
-from datetime import datetime, timedelta
-import chromadb
-from sentence_transformers import SentenceTransformer
+import time
+from itertools import islice
+from sqlite_pool import SQLiteConnectionManager
+from weight_buffer import WeightUpdateBuffer
+from basic_memory_store import BasicMemoryJournal
+from keyword_index import KeywordIndex
+from query_cache import QueryResultCache
+from model_registry import get_embedding_model, get_vector_client, get_embedding_cache, get_keyword_index, get_chunk_store
 from config import *
 
+# ====================== 元数据表结构迁移 ======================
+# 版本号记录在 PRAGMA user_version 中，按顺序执行尚未应用的迁移
+# v1：初始表结构（时间为格式化字符串，仅content_hash有唯一索引）
+# v2：时间改为整数时间戳（秒），增加按用户筛选的组合索引
+# v3：增加过期时间索引，供后台清理线程跨用户批量扫描
+METADATA_MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS memory_metadata (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content_hash TEXT UNIQUE NOT NULL,
+            type TEXT NOT NULL,
+            create_time TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            weight REAL DEFAULT 1.0,
+            expire_time TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (2, [
+        '''
+        CREATE TABLE memory_metadata_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content_hash TEXT UNIQUE NOT NULL,
+            type TEXT NOT NULL,
+            create_time INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            weight REAL DEFAULT 1.0,
+            expire_time INTEGER NOT NULL
+        )
+        ''',
+        # 旧数据按本地时间写入，'utc'修饰符将其换算为UTC时间戳
+        '''
+        INSERT INTO memory_metadata_v2 
+        (id, content_hash, type, create_time, user_id, weight, expire_time)
+        SELECT id, content_hash, type,
+               COALESCE(CAST(strftime('%s', create_time, 'utc') AS INTEGER), 0),
+               user_id, weight,
+               COALESCE(CAST(strftime('%s', expire_time, 'utc') AS INTEGER), 0)
+        FROM memory_metadata
+        ''',
+        "DROP TABLE memory_metadata",
+        "ALTER TABLE memory_metadata_v2 RENAME TO memory_metadata",
+        "CREATE INDEX IF NOT EXISTS idx_metadata_user_expire ON memory_metadata (user_id, expire_time)",
+        "CREATE INDEX IF NOT EXISTS idx_metadata_user_type_create ON memory_metadata (user_id, type, create_time)",
+    ]),
+    (3, [
+        "CREATE INDEX IF NOT EXISTS idx_metadata_expire ON memory_metadata (expire_time)",
+    ]),
+]
+
+# 语句文本保持固定，长连接上的预编译语句缓存才能命中
+INSERT_METADATA_SQL = '''
+    INSERT OR REPLACE INTO memory_metadata 
+    (content_hash, type, create_time, user_id, weight, expire_time)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+FILTER_METADATA_SQL = '''
+    SELECT content_hash FROM memory_metadata 
+    WHERE user_id = ? AND expire_time > ?
+'''
+UPDATE_WEIGHT_SQL = '''
+    UPDATE memory_metadata 
+    SET weight = weight + ? 
+    WHERE content_hash = ? AND weight + ? <= 2.0
+'''
+# 批量增量合并后一次写入：正增量封顶2.0（已超过2.0的保持不变），负增量照常扣减
+APPLY_WEIGHT_DELTA_SQL = '''
+    UPDATE memory_metadata 
+    SET weight = MIN(weight + ?, MAX(weight, 2.0)) 
+    WHERE content_hash = ?
+'''
+SELECT_EXPIRED_SQL = '''
+    SELECT content_hash FROM memory_metadata 
+    WHERE user_id = ? AND expire_time <= ?
+'''
+ITER_METADATA_SQL = '''
+    SELECT id, content_hash, type, create_time, user_id, expire_time FROM memory_metadata 
+    WHERE id > ? ORDER BY id LIMIT ?
+'''
+SELECT_EXPIRED_BATCH_SQL = '''
+    SELECT content_hash FROM memory_metadata 
+    WHERE expire_time <= ? LIMIT ?
+'''
+DELETE_BY_HASH_SQL = '''
+    DELETE FROM memory_metadata WHERE content_hash = ?
+'''
+DELETE_EXPIRED_SQL = '''
+    DELETE FROM memory_metadata 
+    WHERE user_id = ? AND expire_time <= ?
+'''
+
+# 记忆向量筛选元数据的版本号，旧数据需回填后才能被过滤查询命中
+MEMORY_FILTER_METADATA_VERSION = 1
+
+# ====================== 记忆向量元数据 ======================
+def build_memory_metadata(user_id, memory_type, create_time, expire_time):
+    """记忆向量携带的筛选元数据（与SQLite中的记录保持一致）"""
+    return {
+        "user_id": user_id,
+        "type": memory_type,
+        "create_time": int(create_time),
+        "expire_time": int(expire_time)
+    }
+
+def build_memory_filter(user_id, memory_type=None, days=None, now=None):
+    """构建向量库原生过滤条件：用户+未过期，可选类型和时间范围"""
+    now = now or int(time.time())
+    conditions = [
+        {"user_id": user_id},
+        {"expire_time": {"$gt": now}}
+    ]
+    if memory_type:
+        conditions.append({"type": memory_type})
+    if days:
+        conditions.append({"create_time": {"$gte": now - int(days * 86400)}})
+    return {"$and": conditions}
+
+# ====================== 近似索引配置 ======================
+def build_index_metadata():
+    """向量集合的近似索引配置：NumPy后端读取vector_index/ivf_*，Chroma读取hnsw:*（M/construction_ef仅新建时生效）"""
+    return {
+        "vector_index": VECTOR_INDEX,
+        "ivf_nlist": IVF_NLIST,
+        "ivf_nprobe": IVF_NPROBE,
+        "ivf_min_vectors": IVF_MIN_VECTORS,
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": HNSW_SEARCH_EF
+    }
+
+def apply_index_config(collection):
+    """已存在的集合按当前配置更新检索参数（旧集合新建时未带索引配置，或配置已修改）"""
+    index_metadata = build_index_metadata()
+    if hasattr(collection, "rebuild_index"):
+        collection_metadata = collection.metadata or {}
+        if any(collection_metadata.get(k) != v for k, v in index_metadata.items()):
+            collection.modify(metadata={**collection_metadata, **index_metadata})
+        return
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": HNSW_SEARCH_EF}})
+    except TypeError:
+        # 旧版Chroma没有configuration参数，检索ef通过集合元数据设置
+        collection.modify(metadata={**(collection.metadata or {}), "hnsw:search_ef": HNSW_SEARCH_EF})
+
 # ====================== 元数据数据库类 ======================
 class MemoryMetadataDB:
     def __init__(self, db_path):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool = SQLiteConnectionManager(db_path)
         self._init_db()
+        self.weight_buffer = WeightUpdateBuffer(self._apply_weight_deltas)
+        atexit.register(self.close)
 
     def _init_db(self):
-        """初始化元数据数据库表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS memory_metadata (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content_hash TEXT UNIQUE NOT NULL,
-                type TEXT NOT NULL,
-                create_time TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                weight REAL DEFAULT 1.0,
-                expire_time TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        """初始化元数据数据库表，并原地升级旧版本数据库"""
+        with self.pool.transaction() as conn:
+            # 加写锁后再读版本号，避免多进程重复迁移
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target_version, statements in METADATA_MIGRATIONS:
+                if version >= target_version:
+                    continue
+                for sql in statements:
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+                version = target_version
+
+    @property
+    def schema_version(self):
+        """当前表结构版本"""
+        return self.pool.fetchall("PRAGMA user_version")[0][0]
 
-    def add_metadata(self, content_hash, memory_type, user_id, weight=1.0, expire_days=90):
+    def add_metadata(self, content_hash, memory_type, user_id, weight=1.0, expire_days=90, create_time=None):
         """添加记忆元数据"""
-        create_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        expire_time = (datetime.now() + timedelta(days=expire_days)).strftime("%Y-%m-%d %H:%M:%S")
+        create_time = create_time or int(time.time())
+        expire_time = create_time + int(expire_days * 86400)
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO memory_metadata 
-                (content_hash, type, create_time, user_id, weight, expire_time)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (content_hash, memory_type, create_time, user_id, weight, expire_time))
-            conn.commit()
+            with self.pool.transaction() as conn:
+                conn.execute(INSERT_METADATA_SQL, (content_hash, memory_type, create_time, user_id, weight, expire_time))
             return True
         except Exception as e:
             print(f"添加元数据失败：{e}")
             return False
-        finally:
-            conn.close()
 
     def filter_by_metadata(self, user_id, memory_type=None, days=None):
         """基于元数据筛选记忆哈希"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        query = '''
-            SELECT content_hash FROM memory_metadata 
-            WHERE user_id = ? AND expire_time > ?
-        '''
-        params = [user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+        query = FILTER_METADATA_SQL
+        now = int(time.time())
+        params = [user_id, now]
         
         if memory_type:
             query += " AND type = ?"
             params.append(memory_type)
         
         if days:
-            start_time = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+            start_time = now - int(days * 86400)
             query += " AND create_time >= ?"
             params.append(start_time)
         
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        conn.close()
+        results = self.pool.fetchall(query, params)
         return [r[0] for r in results]
 
     def update_weight(self, content_hash, delta=0.1):
         """更新记忆权重"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE memory_metadata 
-            SET weight = weight + ? 
-            WHERE content_hash = ? AND weight + ? <= 2.0
-        ''', (delta, content_hash, delta))
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute(UPDATE_WEIGHT_SQL, (delta, content_hash, delta))
+
+    def queue_weight_update(self, content_hash, delta=0.1):
+        """异步更新记忆权重：仅累加到内存，由后台批量落盘"""
+        self.weight_buffer.add(content_hash, delta)
+
+    def flush_weight_updates(self):
+        """立即落盘所有待写权重"""
+        return self.weight_buffer.flush()
+
+    def _apply_weight_deltas(self, deltas):
+        """在一个事务内批量写入合并后的权重增量"""
+        with self.pool.transaction() as conn:
+            conn.executemany(APPLY_WEIGHT_DELTA_SQL, [(delta, content_hash) for content_hash, delta in deltas.items()])
+
+    def iter_metadata(self, batch_size=1000):
+        """按主键分页遍历全部元数据，每次产出一批记录字典"""
+        last_id = 0
+        while True:
+            rows = self.pool.fetchall(ITER_METADATA_SQL, (last_id, batch_size))
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [{
+                "content_hash": r[1],
+                "type": r[2],
+                "create_time": r[3],
+                "user_id": r[4],
+                "expire_time": r[5]
+            } for r in rows]
+
+    def get_expired_hashes(self, user_id, now):
+        """查询指定时间点（整数时间戳）已过期的记忆哈希"""
+        return [r[0] for r in self.pool.fetchall(SELECT_EXPIRED_SQL, (user_id, now))]
+
+    def delete_expired(self, user_id, now):
+        """删除指定时间点（整数时间戳）已过期的记忆元数据"""
+        with self.pool.transaction() as conn:
+            return conn.execute(DELETE_EXPIRED_SQL, (user_id, now)).rowcount
+
+    def get_expired_batch(self, now, limit):
+        """跨用户查询一批已过期的记忆哈希"""
+        return [r[0] for r in self.pool.fetchall(SELECT_EXPIRED_BATCH_SQL, (now, limit))]
+
+    def delete_by_hashes(self, content_hashes):
+        """按哈希批量删除元数据"""
+        with self.pool.transaction() as conn:
+            conn.executemany(DELETE_BY_HASH_SQL, [(h,) for h in content_hashes])
+
+    def close(self):
+        """落盘待写权重并关闭数据库连接"""
+        self.weight_buffer.close()
+        self.pool.close()
 
 # ====================== 向量数据库类 ======================
 class VectorMemoryDB:
-    def __init__(self, db_path, embedding_model_name):
+    def __init__(self, db_path, embedding_model_name, backend=VECTOR_BACKEND):
+        """
+        向量数据库（记忆+知识库）
+        :param backend: 向量库后端（auto/chroma/numpy），NumPy后端与Chroma集合接口一致
+        """
         self.use_vector_db = True
+        self.knowledge_cache = QueryResultCache()
+        self.chunk_store = None
         try:
-            self.client = chromadb.PersistentClient(path=db_path)
-            self.memory_collection = self.client.get_or_create_collection(name="agent_long_term_memory")
-            self.knowledge_collection = self.client.get_or_create_collection(name="external_knowledge_base")
-            self.embedding_model = SentenceTransformer(embedding_model_name)
+            self.client = get_vector_client(db_path, backend)
+            self.memory_collection = self.client.get_or_create_collection(
+                name="agent_long_term_memory",
+                metadata=build_index_metadata()
+            )
+            self.knowledge_collection = self.client.get_or_create_collection(
+                name="external_knowledge_base",
+                metadata={
+                    **build_index_metadata(),
+                    "vector_dtype": KNOWLEDGE_VECTOR_DTYPE,
+                    "vector_rescore_factor": VECTOR_RESCORE_FACTOR
+                }
+            )
+            apply_index_config(self.memory_collection)
+            apply_index_config(self.knowledge_collection)
+            stored_dtype = getattr(self.knowledge_collection, "vector_dtype", "float32")
+            if stored_dtype != KNOWLEDGE_VECTOR_DTYPE:
+                print(f"知识库向量存储精度为{stored_dtype}（配置为{KNOWLEDGE_VECTOR_DTYPE}，仅对NumPy后端新建的知识库生效）")
+            self.embedding_model = get_embedding_model(embedding_model_name)
+            self.embedding_cache = get_embedding_cache(embedding_model_name)
+            self.memory_keywords = get_keyword_index(os.path.join(KEYWORD_INDEX_PATH, "memory.db"))
+            self.knowledge_keywords = get_keyword_index(os.path.join(KEYWORD_INDEX_PATH, "knowledge.db"))
+            # 片段文本存储：开启时新入库片段的文本存于此；关闭后已有的存储仍会打开，用于读取此前按偏移入库的片段
+            if CHUNK_STORE_ENABLED or os.path.isdir(CHUNK_STORE_PATH):
+                self.chunk_store = get_chunk_store(CHUNK_STORE_PATH)
         except Exception as e:
             print(f"向量库初始化失败，降级为JSON记忆：{e}")
             self.use_vector_db = False
-            self.basic_memory_path = MEMORY_FILE_PATH
-            self.max_basic_memory = MAX_BASIC_MEMORY
+            self.basic_memory = BasicMemoryJournal(MEMORY_FILE_PATH, MAX_BASIC_MEMORY, legacy_path=LEGACY_MEMORY_FILE_PATH)
+            # 降级记忆条数有上限，关键词索引只在内存中维护，启动时由日志重建
+            self.memory_keywords = KeywordIndex()
+            self._basic_memories = {}
+            self._basic_seq = 0
+            for item in self.basic_memory.items():
+                self._index_basic_memory(item)
+
+    def encode(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        """编码文本（优先查嵌入缓存，未命中部分按batch_size分批前向计算）"""
+        return self.embedding_cache.encode(self.embedding_model, texts, batch_size=batch_size)
 
     def _get_content_hash(self, content):
         """生成内容哈希"""
         return hashlib.md5(content.encode("utf-8")).hexdigest()
 
+    def _get_chunk_id(self, file_path, content, metadata):
+        """
+        生成知识片段ID：文件路径 + 片段位置 + 内容的哈希（断点续传重新入库时ID不变）
+        PDF按页、TXT按块分割，片段序号在每页/块内从1开始，位置需带上页号/块号，
+        否则不同页/块中的相同片段（如重复的日志行）ID相同；
+        旧版本（ID不含页号/块号）写入的PDF/TXT片段不会被新ID覆盖，重新入库时按来源整体删除后重建
+        """
+        position = [metadata[key] for key in ("page_num", "block_num") if key in metadata]
+        position.append(metadata.get("chunk_num", 0))
+        return self._get_content_hash(f"{file_path}_{'_'.join(map(str, position))}_{content}")
+
     # ---------------- 结构化记忆相关 ----------------
     def add_memory(self, content, metadata_db, user_id, memory_type):
         """添加结构化记忆"""
         if self.use_vector_db:
             content_hash = self._get_content_hash(content)
-            embedding = self.embedding_model.encode(content).tolist()
+            embedding = self.encode(content).tolist()
+            create_time = int(time.time())
+            expire_time = create_time + int(MEMORY_EXPIRE_DAYS * 86400)
             self.memory_collection.upsert(
                 ids=[content_hash],
                 embeddings=[embedding],
-                documents=[content]
+                documents=[content],
+                metadatas=[build_memory_metadata(user_id, memory_type, create_time, expire_time)]
             )
-            metadata_db.add_metadata(content_hash, memory_type, user_id)
+            metadata_db.add_metadata(content_hash, memory_type, user_id, expire_days=MEMORY_EXPIRE_DAYS, create_time=create_time)
+            self.memory_keywords.add([content_hash], [content], group=user_id)
             return content_hash
         else:
             self._save_basic_memory(content)
             return None
 
     def _save_basic_memory(self, content):
-        """降级：JSON文件存储"""
-        if os.path.exists(self.basic_memory_path):
-            with open(self.basic_memory_path, "r", encoding="utf-8") as f:
-                memories = json.load(f)
-        else:
-            memories = []
-        memories.append({
-            "content": content,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        if len(memories) > self.max_basic_memory:
-            memories = memories[-self.max_basic_memory:]
-        with open(self.basic_memory_path, "w", encoding="utf-8") as f:
-            json.dump(memories, f, ensure_ascii=False, indent=2)
+        """降级：追加写入JSONL日志"""
+        self._index_basic_memory(self.basic_memory.append(content))
+
+    def _index_basic_memory(self, item):
+        """降级：将记忆写入内存关键词索引，超出条数上限时移除最旧的一条"""
+        memory_id = str(self._basic_seq)
+        self._basic_seq += 1
+        self._basic_memories[memory_id] = item
+        self.memory_keywords.add([memory_id], [item["content"]])
+        if len(self._basic_memories) > MAX_BASIC_MEMORY:
+            oldest = next(iter(self._basic_memories))
+            del self._basic_memories[oldest]
+            self.memory_keywords.delete([oldest])
 
-    def retrieve_memory(self, query, metadata_db, user_id, memory_type=None, days=None, top_k=5):
-        """检索结构化记忆"""
+    def retrieve_memory(self, query, metadata_db, user_id, memory_type=None, days=None, top_k=5, query_embedding=None):
+        """
+        检索结构化记忆
+        :param query_embedding: 已编码的查询向量（传入时不再重复编码，与知识库检索共用）
+        """
         if not self.use_vector_db:
             return self._retrieve_basic_memory(query)
         
-        # 删除过期记忆
-        self.delete_expired_memory(metadata_db, user_id)
-        
-        # 筛选候选哈希
-        candidate_hashes = metadata_db.filter_by_metadata(user_id, memory_type, days)
-        if not candidate_hashes:
-            return []
-        
-        # 语义检索
-        query_embedding = self.embedding_model.encode(query).tolist()
+        # 语义检索（元数据筛选在向量库内完成，过期记忆由过滤条件排除，物理删除交给后台清理线程）
+        if query_embedding is None:
+            query_embedding = self.encode(query)
         results = self.memory_collection.query(
-            query_embeddings=[query_embedding],
-            include=["documents", "distances", "ids"],
-            where={"id": {"$in": candidate_hashes}},
+            query_embeddings=[query_embedding.tolist()],
+            include=["documents", "distances"],
+            where=build_memory_filter(user_id, memory_type, days),
             n_results=top_k
         )
         
@@ -168,7 +398,7 @@ class VectorMemoryDB:
             memory_id = results["ids"][0][idx]
             distance = results["distances"][0][idx]
             similarity = 1 - distance
-            metadata_db.update_weight(memory_id, delta=0.05)
+            metadata_db.queue_weight_update(memory_id, delta=0.05)
             retrieved_memories.append({
                 "content": doc,
                 "similarity": round(similarity, 4),
@@ -178,120 +408,334 @@ class VectorMemoryDB:
         retrieved_memories.sort(key=lambda x: x["similarity"], reverse=True)
         return retrieved_memories
 
+    def sync_memory_metadata(self, metadata_db, batch_size=1000):
+        """一次性回填：为旧版本写入的记忆向量补齐筛选元数据"""
+        if not self.use_vector_db:
+            return 0
+        collection_metadata = self.memory_collection.metadata or {}
+        if collection_metadata.get("filter_metadata_version") == MEMORY_FILTER_METADATA_VERSION:
+            return 0
+        
+        synced = 0
+        for records in metadata_db.iter_metadata(batch_size):
+            self.memory_collection.update(
+                ids=[r["content_hash"] for r in records],
+                metadatas=[build_memory_metadata(r["user_id"], r["type"], r["create_time"], r["expire_time"]) for r in records]
+            )
+            synced += len(records)
+        self.memory_collection.modify(metadata={
+            **collection_metadata,
+            "filter_metadata_version": MEMORY_FILTER_METADATA_VERSION
+        })
+        if synced:
+            print(f"记忆向量元数据回填完成：{synced} 条")
+        return synced
+
     def _retrieve_basic_memory(self, query):
-        """降级：检索JSON记忆"""
-        if not os.path.exists(self.basic_memory_path):
-            return []
-        with open(self.basic_memory_path, "r", encoding="utf-8") as f:
-            memories = json.load(f)
-        # 简单关键词匹配
-        matched = []
-        for mem in memories:
-            if query in mem["content"]:
-                matched.append({
-                    "content": mem["content"],
-                    "similarity": 1.0,
-                    "memory_id": None
-                })
-        return matched[:TOP_K_MEMORY]
+        """降级：BM25关键词检索内存中的记忆（无需读盘）"""
+        return [{
+            "content": self._basic_memories[memory_id]["content"],
+            "similarity": round(score, 4),
+            "memory_id": None
+        } for memory_id, score in self.memory_keywords.search(query, TOP_K_MEMORY)]
+
+    def keyword_search_memory(self, query, user_id, memory_type=None, days=None, top_k=5):
+        """
+        关键词检索结构化记忆（BM25，按用户过滤），可单独使用或作为混合检索的一路
+        与语义检索使用同一过滤条件（build_memory_filter）：排除已过期但尚未被清理的记忆，支持类型和时间范围
+        """
+        if not self.use_vector_db:
+            return self._retrieve_basic_memory(query)[:top_k]
+        where = build_memory_filter(user_id, memory_type, days)
+        # 倒排索引不含过期时间等元数据，候选不足时扩大召回数重试
+        candidates = top_k * 4
+        while True:
+            hits = self.memory_keywords.search(query, candidates, group=user_id)
+            if not hits:
+                return []
+            results = self.memory_collection.get(ids=[h[0] for h in hits], where=where, include=["documents"])
+            documents = dict(zip(results["ids"], results["documents"]))
+            if len(documents) >= top_k or len(hits) < candidates:
+                break
+            candidates *= 4
+        return [{
+            "content": documents[memory_id],
+            "score": round(score, 4),
+            "memory_id": memory_id
+        } for memory_id, score in hits if memory_id in documents][:top_k]
+
+    def sync_keyword_indexes(self, batch_size=1000):
+        """一次性回填：关键词索引为空而向量库已有数据时（旧版本写入），分页读取文本建立索引"""
+        if not self.use_vector_db:
+            return 0
+        synced = 0
+        for collection, index, group_key in [
+            (self.memory_collection, self.memory_keywords, "user_id"),
+            (self.knowledge_collection, self.knowledge_keywords, "source")
+        ]:
+            if index.count() or not collection.count():
+                continue
+            offset = 0
+            while True:
+                results = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+                if not results["ids"]:
+                    break
+                # 按分组写入，保证检索时可按用户/来源过滤
+                documents = results["documents"]
+                if collection is self.knowledge_collection:
+                    # 按偏移入库的片段从片段存储读取文本
+                    documents = [r["content"] for r in self.load_knowledge_contents([
+                        {"content": document, "metadata": metadata}
+                        for document, metadata in zip(documents, results["metadatas"])
+                    ])]
+                groups = {}
+                for record_id, document, metadata in zip(results["ids"], documents, results["metadatas"]):
+                    group = (metadata or {}).get(group_key)
+                    groups.setdefault(group, ([], []))
+                    groups[group][0].append(record_id)
+                    groups[group][1].append(document or "")
+                for group, (ids, documents) in groups.items():
+                    index.add(ids, documents, group=group)
+                synced += len(results["ids"])
+                offset += batch_size
+        if synced:
+            print(f"关键词索引回填完成：{synced} 条")
+        return synced
 
     def delete_expired_memory(self, metadata_db, user_id):
         """删除过期记忆"""
         if not self.use_vector_db:
             return 0
         
-        conn = sqlite3.connect(metadata_db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT content_hash FROM memory_metadata 
-            WHERE user_id = ? AND expire_time <= ?
-        ''', (user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        expired_hashes = [r[0] for r in cursor.fetchall()]
-        conn.close()
+        now = int(time.time())
+        expired_hashes = metadata_db.get_expired_hashes(user_id, now)
         
         if expired_hashes:
             self.memory_collection.delete(ids=expired_hashes)
+            self.memory_keywords.delete(expired_hashes)
         
-        conn = sqlite3.connect(metadata_db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            DELETE FROM memory_metadata 
-            WHERE user_id = ? AND expire_time <= ?
-        ''', (user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-        conn.close()
+        metadata_db.delete_expired(user_id, now)
         return len(expired_hashes)
 
     # ---------------- 外部知识库相关 ----------------
-    def add_knowledge_document(self, file_path, document_chunks, ocr_enabled=False):
-        """添加文档到外部知识库"""
+    def add_knowledge_document(self, file_path, document_chunks, ocr_enabled=False,
+                               upsert_batch_size=KNOWLEDGE_UPSERT_BATCH_SIZE):
+        """
+        添加文档到外部知识库：按批取片段→批量编码→分片入库，内存占用与文档大小无关
+        :param document_chunks: 片段列表或生成器，元素为 {"content", "metadata"}
+        :param upsert_batch_size: 每次入库的片段数
+        """
         try:
-            ids = []
-            embeddings = []
-            documents = []
-            metadatas = []
+            start = time.perf_counter()
+            total = 0
+            self.discard_knowledge_text(file_path)
+            chunk_iter = iter(document_chunks)
+            while True:
+                batch = list(islice(chunk_iter, upsert_batch_size))
+                if not batch:
+                    break
+                self.store_knowledge_chunks(
+                    [file_path] * len(batch),
+                    [chunk["content"] for chunk in batch],
+                    [chunk["metadata"] for chunk in batch]
+                )
+                total += len(batch)
             
-            for chunk in document_chunks:
-                content = chunk["content"]
-                metadata = chunk["metadata"]
-                # 生成唯一ID
-                content_hash = self._get_content_hash(f"{file_path}_{metadata.get('chunk_num', 0)}_{content}")
-                # 生成向量
-                embedding = self.embedding_model.encode(content).tolist()
-                # 收集数据
-                ids.append(content_hash)
-                embeddings.append(embedding)
-                documents.append(content)
-                metadatas.append(metadata)
-            
-            # 批量入库
-            self.knowledge_collection.upsert(
-                ids=ids,
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=metadatas
-            )
+            if not total:
+                print(f"文档无可入库片段：{file_path}")
+                return False
+            elapsed = time.perf_counter() - start
+            print(f"入库完成：{os.path.basename(file_path)}，{total} 个片段，耗时 {elapsed:.2f}s（{total / max(elapsed, 1e-9):.1f} 片段/秒）")
             return True
         except Exception as e:
             print(f"知识库入库失败：{e}")
             return False
 
-    def delete_knowledge_document(self, file_path):
-        """删除外部知识库中的文档"""
+    def store_knowledge_chunks(self, file_paths, documents, metadatas, embeddings=None):
+        """
+        写入一批知识片段（可跨多个文件）：一次向量库upsert，关键词索引按文件分组写入
+        :param file_paths: 每个片段所属的文件路径（参与生成片段ID）
+        :param embeddings: 已编码的向量（不传则按EMBEDDING_BATCH_SIZE分批编码）
+        :return: 片段ID列表
+        """
+        # 生成唯一ID
+        ids = [
+            self._get_chunk_id(file_path, content, metadata)
+            for file_path, content, metadata in zip(file_paths, documents, metadatas)
+        ]
+        if embeddings is None:
+            embeddings = self.encode(documents)
+        positions = {}
+        for idx, file_path in enumerate(file_paths):
+            positions.setdefault(file_path, []).append(idx)
+        stored_documents = documents
+        if CHUNK_STORE_ENABLED and self.chunk_store is not None:
+            # 文本写入片段存储，向量库只保存 (text_doc, text_start, text_end) 偏移
+            metadatas = [dict(metadata) for metadata in metadatas]
+            for file_path, idxs in positions.items():
+                offsets = self.chunk_store.append(file_path, [documents[i] for i in idxs])
+                for i, (start, end) in zip(idxs, offsets):
+                    metadatas[i].update(text_doc=file_path, text_start=start, text_end=end)
+            stored_documents = None
+        self.knowledge_collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=stored_documents,
+            metadatas=metadatas
+        )
+        for file_path, idxs in positions.items():
+            self.knowledge_keywords.add([ids[i] for i in idxs], [documents[i] for i in idxs], group=file_path)
+        self.knowledge_cache.invalidate_sources(set(file_paths) | {m.get("source") for m in metadatas})
+        return ids
+
+    def discard_knowledge_text(self, file_path):
+        """
+        整篇重新入库前丢弃文档在片段存储中的旧文本：同ID的片段会被覆盖为新偏移，
+        不丢弃的话旧副本一直记在文档名下，既算作有效数据也无法被compact回收
+        """
+        if self.chunk_store is not None:
+            self.chunk_store.delete(file_path)
+
+    def compact_chunk_store(self, batch_size=1000):
+        """
+        回收片段存储中不再被向量库引用的文本（已删除的文档、断点续传重写的页留下的旧副本等），返回压缩后的字节数
+        需在没有入库进行时调用
+        """
+        if self.chunk_store is None:
+            return 0
+        references, offset = {}, 0
+        while True:
+            results = self.knowledge_collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+            if not results["ids"]:
+                break
+            for metadata in results["metadatas"]:
+                if metadata and "text_doc" in metadata:
+                    references.setdefault(metadata["text_doc"], []).append((metadata["text_start"], metadata["text_end"]))
+            offset += len(results["ids"])
+        return self.chunk_store.compact(references)
+
+    def delete_knowledge_document(self, file_path, missing_ok=False):
+        """
+        删除外部知识库中的文档
+        :param missing_ok: 文档不存在时不提示（入库前清理旧片段时使用）
+        """
         try:
             results = self.knowledge_collection.get(where={"source": file_path})
             if not results["ids"]:
-                print(f"文档不存在于知识库：{file_path}")
+                if not missing_ok:
+                    print(f"文档不存在于知识库：{file_path}")
                 return False
             self.knowledge_collection.delete(ids=results["ids"])
+            self.knowledge_keywords.delete(results["ids"])
+            if self.chunk_store is not None:
+                self.chunk_store.delete(file_path)
+            self.knowledge_cache.invalidate_sources({file_path})
             return True
         except Exception as e:
             print(f"删除文档失败：{e}")
             return False
 
-    def retrieve_knowledge(self, query, top_k=5):
+    def knowledge_sources(self, batch_size=1000):
+        """知识库中已有片段的来源文件集合（分页读取元数据）"""
+        sources, offset = set(), 0
+        while True:
+            results = self.knowledge_collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+            if not results["ids"]:
+                break
+            sources.update((metadata or {}).get("source") for metadata in results["metadatas"])
+            offset += batch_size
+        sources.discard(None)
+        return sources
+
+    def retrieve_knowledge(self, query, top_k=5, query_embedding=None):
         """检索外部知识库"""
         if not self.use_vector_db:
             return "【外部知识库暂不可用】"
         
         try:
-            query_embedding = self.embedding_model.encode(query).tolist()
-            results = self.knowledge_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            # 格式化输出
-            knowledge_text = "【外部知识库参考】\n"
-            for idx, doc in enumerate(results["documents"][0]):
-                metadata = results["metadatas"][0][idx]
-                source = metadata.get("source", "未知来源")
-                page = metadata.get("page_num", "")
-                page_info = f" 第{page}页" if page else ""
-                knowledge_text += f"{idx+1}. 来源：{os.path.basename(source)}{page_info}\n内容：{doc}\n\n"
-            
+            if self.knowledge_cache.semantic and query_embedding is None:
+                query_embedding = self.encode(query)
+            knowledge_text = self.knowledge_cache.get("dense", query, top_k, query_embedding)
+            if knowledge_text is None:
+                records = self.dense_search_knowledge(query, top_k, query_embedding)
+                knowledge_text = self.format_knowledge(self.load_knowledge_contents(records))
+                self.knowledge_cache.put("dense", query, top_k, knowledge_text, self.record_sources(records), query_embedding)
             return knowledge_text
         except Exception as e:
             print(f"知识库检索失败：{e}")
-            return "【外部知识库检索失败】"
\ No newline at end of file
+            return "【外部知识库检索失败】"
+
+    def dense_search_knowledge(self, query, top_k=5, query_embedding=None):
+        """
+        向量语义检索外部知识库，可单独使用或作为混合检索的一路
+        :param query_embedding: 已编码的查询向量（传入时不再重复编码）
+        :return: [{"id", "content", "metadata", "distance"}]，按距离升序
+                 （按偏移入库的片段content为None，由 load_knowledge_contents 按需读取）
+        """
+        if query_embedding is None:
+            query_embedding = self.encode(query)
+        results = self.knowledge_collection.query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [{
+            "id": chunk_id,
+            "content": doc,
+            "metadata": metadata,
+            "distance": distance
+        } for chunk_id, doc, metadata, distance in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+        )]
+
+    def load_knowledge_contents(self, records):
+        """为按偏移入库的片段（content为None）从片段存储读取文本，只对最终进入Prompt的片段调用"""
+        pending = [r for r in records if r["content"] is None and "text_doc" in (r["metadata"] or {})]
+        if pending and self.chunk_store is not None:
+            texts = self.chunk_store.read_many([
+                (r["metadata"]["text_doc"], r["metadata"]["text_start"], r["metadata"]["text_end"]) for r in pending
+            ])
+            for record, text in zip(pending, texts):
+                record["content"] = text
+        return records
+
+    @staticmethod
+    def record_sources(records):
+        """检索结果中片段的来源文件集合（用于缓存失效）"""
+        return {(r["metadata"] or {}).get("source") for r in records} - {None}
+
+    @staticmethod
+    def format_knowledge(records):
+        """将检索到的知识片段格式化为Prompt参考文本"""
+        knowledge_text = "【外部知识库参考】\n"
+        for idx, record in enumerate(records):
+            metadata = record["metadata"] or {}
+            source = metadata.get("source", "未知来源")
+            page = metadata.get("page_num", "")
+            page_info = f" 第{page}页" if page else ""
+            section = metadata.get("heading_path")
+            section_info = f"（{section}）" if section else ""
+            knowledge_text += f"{idx+1}. 来源：{os.path.basename(source)}{page_info}{section_info}\n内容：{record['content']}\n\n"
+        return knowledge_text
+
+    def keyword_search_knowledge(self, query, top_k=5, source=None, load_contents=True):
+        """
+        关键词检索外部知识库（BM25），可单独使用或作为混合检索的一路
+        :param source: 只检索指定来源文件
+        :param load_contents: 为按偏移入库的片段读取文本（混合检索只为融合后的top_k读取，传False）
+        :return: [{"id", "content", "metadata", "score"}]，按得分降序
+        """
+        if not self.use_vector_db:
+            return []
+        hits = self.knowledge_keywords.search(query, top_k, group=source)
+        if not hits:
+            return []
+        results = self.knowledge_collection.get(ids=[h[0] for h in hits], include=["documents", "metadatas"])
+        records = {rid: (doc, meta) for rid, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])}
+        found = [{
+            "id": chunk_id,
+            "content": records[chunk_id][0],
+            "metadata": records[chunk_id][1],
+            "score": round(score, 4)
+        } for chunk_id, score in hits if chunk_id in records]
+        return self.load_knowledge_contents(found) if load_contents else found
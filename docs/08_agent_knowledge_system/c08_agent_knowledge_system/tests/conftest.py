@@ -0,0 +1,79 @@
+import os
+import sys
+import hashlib
+import numpy as np
+import pytest
+
+# 工程模块为平铺结构（与 main.py 同目录导入），测试从上级目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ====================== 测试用嵌入模型 ======================
+class CharTokenizer:
+    """按字切分的分词器（接口与HuggingFace分词器的 encode / 批量调用一致，含首尾两个特殊token）"""
+    def encode(self, text, add_special_tokens=True):
+        return list(range(len(text) + (2 if add_special_tokens else 0)))
+
+    def __call__(self, texts, add_special_tokens=True, **kwargs):
+        return {"input_ids": [self.encode(t, add_special_tokens) for t in texts]}
+
+class HashingEmbeddingModel:
+    """字二元组哈希到固定维度的嵌入模型，测试中代替句向量模型（不下载、不加载权重）"""
+    dim = 64
+
+    def __init__(self):
+        self.tokenizer = CharTokenizer()
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for i in range(max(len(text) - 1, 1)):
+            vector[int(hashlib.md5(text[i:i + 2].encode("utf-8")).hexdigest(), 16) % self.dim] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.stack([self._encode_one(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """在临时目录中运行（配置中的存储路径均为相对路径），并注册测试用嵌入模型"""
+    import model_registry
+    from config import EMBEDDING_MODEL
+    monkeypatch.chdir(tmp_path)
+    for name in {EMBEDDING_MODEL, "all-MiniLM-L6-v2"}:
+        monkeypatch.setitem(model_registry._embedding_models, name, HashingEmbeddingModel())
+    return tmp_path
+
+@pytest.fixture
+def vector_db(workdir):
+    from structured_memory import VectorMemoryDB
+    from config import VECTOR_DB_PATH, EMBEDDING_MODEL
+    return VectorMemoryDB(VECTOR_DB_PATH, EMBEDDING_MODEL, backend="numpy")
+
+@pytest.fixture
+def local_tokenizer(workdir):
+    """
+    在工作目录下生成与默认模型同名的本地模型目录（只含tokenizer.json）：
+    子进程（spawn，看不到测试中注册的模型）由此只加载分词器，与生产环境的加载路径一致
+    """
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    vocab = {"[UNK]": 0, "[CLS]": 1, "[SEP]": 2}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 1), ("[SEP]", 2)])
+    model_dir = workdir / "all-MiniLM-L6-v2"
+    model_dir.mkdir()
+    tokenizer.save(str(model_dir / "tokenizer.json"))
+    return model_dir
+
+@pytest.fixture
+def knowledge_manager(vector_db):
+    from knowledge_manager import KnowledgeManager
+    manager = KnowledgeManager(vector_db)
+    yield manager
+    manager.ingestor.close()
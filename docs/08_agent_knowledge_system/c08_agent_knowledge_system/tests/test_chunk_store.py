@@ -0,0 +1,57 @@
+import pytest
+from chunk_store import ChunkStore
+
+@pytest.fixture
+def chunk_vector_db(workdir, monkeypatch):
+    import structured_memory
+    from config import VECTOR_DB_PATH, EMBEDDING_MODEL
+    monkeypatch.setattr(structured_memory, "CHUNK_STORE_ENABLED", True)
+    return structured_memory.VectorMemoryDB(VECTOR_DB_PATH, EMBEDDING_MODEL, backend="numpy")
+
+def chunks(*texts):
+    return [{"content": text, "metadata": {"source": "b.md", "chunk_num": i}} for i, text in enumerate(texts, 1)]
+
+def test_reingest_keeps_one_copy(chunk_vector_db):
+    document = chunks("智能体支持PDF/MD/TXT格式。", "向量库使用ChromaDB存储。")
+    for _ in range(4):
+        assert chunk_vector_db.add_knowledge_document("b.md", document)
+    size = sum(len(c["content"].encode("utf-8")) for c in document)
+    stats = chunk_vector_db.chunk_store.stats()
+    assert stats["live_bytes"] == size
+    assert chunk_vector_db.compact_chunk_store() == size
+    records = chunk_vector_db.dense_search_knowledge("向量库", top_k=2)
+    contents = {r["content"] for r in chunk_vector_db.load_knowledge_contents(records)}
+    assert contents == {c["content"] for c in document}
+
+def test_compact_drops_unreferenced_spans(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append("a", ["第一页旧文本。"])                 # 断点续传前写入、随后被重写的页
+    (start, end), = store.append("a", ["第一页新文本。"])
+    store.append("b", ["已被向量库删除引用的文本。"])
+    store.compact({"a": [(start, end)]})
+    assert store.read_many([("a", start, end)]) == ["第一页新文本。"]
+    assert store.stats()["dead_bytes"] == 0
+    assert store.stats()["live_bytes"] == len("第一页新文本。".encode("utf-8"))
+    store.close()
+    store = ChunkStore(str(tmp_path))
+    assert store.read_many([("a", start, end)]) == ["第一页新文本。"]
+
+def test_offsets_not_reused_after_delete(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    (old,) = store.append("a", ["旧版本文本。"])
+    store.delete("a")
+    store.close()
+    store = ChunkStore(str(tmp_path))
+    (new,) = store.append("a", ["新版本的文本。"])
+    assert new[0] >= old[1]
+    # 向量库中残留的旧偏移读不到新文本
+    assert store.read_many([("a", *old), ("a", *new)]) == [None, "新版本的文本。"]
+
+def test_keyword_search_returns_text_with_chunk_store(chunk_vector_db):
+    document = chunks("智能体支持PDF/MD/TXT格式。", "向量库使用ChromaDB存储。")
+    assert chunk_vector_db.add_knowledge_document("b.md", document)
+    hits = chunk_vector_db.keyword_search_knowledge("ChromaDB", top_k=1)
+    assert [h["content"] for h in hits] == ["向量库使用ChromaDB存储。"]
+    # 混合检索的一路只取偏移，文本留到融合后读取
+    hits = chunk_vector_db.keyword_search_knowledge("ChromaDB", top_k=1, load_contents=False)
+    assert hits[0]["content"] is None
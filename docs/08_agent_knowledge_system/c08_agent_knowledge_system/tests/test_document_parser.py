@@ -0,0 +1,63 @@
+from document_parser import MarkdownParser, TextParser
+from ingest_manifest import file_content_hash
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def test_short_markdown_section_is_kept(workdir):
+    chunks = MarkdownParser().parse(write(workdir / "a.md", "## 端口\n默认8080。\n"))
+    assert len(chunks) == 1
+    assert chunks[0]["content"] == "端口\n默认8080。"
+    assert chunks[0]["metadata"]["heading_path"] == "端口"
+
+def test_short_section_merges_into_previous_chunk_of_same_top_section(workdir):
+    text = "# 部署\n## 环境\n部署前需要安装Python3.8以上版本和全部依赖包。\n## 端口\n默认8080。\n# 其他\n## 版本\nv1。\n"
+    chunks = MarkdownParser().parse(write(workdir / "a.md", text))
+    assert [c["content"] for c in chunks] == [
+        "部署 > 环境\n部署前需要安装Python3.8以上版本和全部依赖包。\n部署 > 端口\n默认8080。",
+        "其他 > 版本\nv1。"
+    ]
+    assert [c["metadata"]["chunk_num"] for c in chunks] == [1, 2]
+
+def test_heading_words_are_searchable(vector_db, workdir):
+    text = "# 智能体测试文档\n### 关键参数\n- 向量库：ChromaDB\n- 嵌入模型：all-MiniLM-L6-v2\n"
+    path = write(workdir / "readme.md", text)
+    chunks = MarkdownParser().parse(path)
+    assert chunks[0]["content"].startswith("智能体测试文档 > 关键参数\n")
+    assert vector_db.add_knowledge_document(path, chunks)
+    hits = vector_db.keyword_search_knowledge("关键参数", top_k=1)
+    assert hits and "ChromaDB" in hits[0]["content"]
+
+def test_repeated_chunks_in_different_blocks_get_distinct_ids(vector_db, workdir):
+    path = write(workdir / "heartbeat.log", "heartbeat ok.\n" * 200)
+    blocks = list(TextParser(block_bytes=300).iter_pages(path))
+    assert len(blocks) > 1
+    documents = [c["content"] for _, _, chunks in blocks for c in chunks]
+    metadatas = [c["metadata"] for _, _, chunks in blocks for c in chunks]
+    ids = vector_db.store_knowledge_chunks([path] * len(documents), documents, metadatas)
+    assert len(set(ids)) == len(ids)
+    assert vector_db.knowledge_collection.count() == len(ids)
+    # 断点续传重新生成的ID不变
+    assert vector_db.store_knowledge_chunks([path] * len(documents), documents, metadatas) == ids
+
+def test_text_stream_ingest_reports_blocks(knowledge_manager, workdir, capsys):
+    path = write(workdir / "heartbeat.log", "heartbeat ok.\n" * 200)
+    assert knowledge_manager._stream_ingest(path, TextParser(block_bytes=300), file_content_hash(path))
+    out = capsys.readouterr().out
+    assert "块，" in out and "页" not in out
+
+def test_old_scheme_chunk_ids_are_replaced_on_reingest(knowledge_manager, vector_db, workdir):
+    path = write(workdir / "notes.txt", "第一句话足够长，用于测试。第二句话也足够长，用于测试。")
+    chunks = TextParser().parse(path)
+    # 旧版本的ID：整份文件连续编号，不含块号
+    old_ids = [vector_db._get_content_hash(f"{path}_{c['metadata']['chunk_num']}_{c['content']}") for c in chunks]
+    vector_db.knowledge_collection.upsert(
+        ids=old_ids,
+        embeddings=vector_db.encode([c["content"] for c in chunks]).tolist(),
+        documents=[c["content"] for c in chunks],
+        metadatas=[{"source": path, "chunk_num": c["metadata"]["chunk_num"]} for c in chunks]
+    )
+    assert knowledge_manager.add_document(path)
+    ids = vector_db.knowledge_collection.get(where={"source": path})["ids"]
+    assert len(ids) == len(chunks) and not set(ids) & set(old_ids)
@@ -0,0 +1,49 @@
+import numpy as np
+from embedding_cache import DiskEmbeddingStore, EmbeddingCache
+from conftest import HashingEmbeddingModel
+
+def vec(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+def test_reopen_after_crash_between_vector_and_index_write(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path))
+    store.put_many([("a", vec(1))])
+    # 模拟崩溃：向量已追加，索引未追加
+    with open(store.vectors_path, "ab") as f:
+        f.write(vec(9).tobytes())
+
+    store = DiskEmbeddingStore(str(tmp_path))
+    store.put_many([("b", vec(2))])
+    np.testing.assert_array_equal(store.get("a"), vec(1))
+    np.testing.assert_array_equal(store.get("b"), vec(2))
+
+    store = DiskEmbeddingStore(str(tmp_path))
+    np.testing.assert_array_equal(store.get("b"), vec(2))
+
+def test_reopen_drops_partial_rows(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path))
+    store.put_many([("a", vec(1)), ("b", vec(2))])
+    # 模拟崩溃：向量写了半行，索引写了半行
+    with open(store.vectors_path, "ab") as f:
+        f.write(vec(9).tobytes()[:6])
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write("c")
+
+    store = DiskEmbeddingStore(str(tmp_path))
+    assert set(store.index) == {"a", "b"}
+    store.put_many([("d", vec(4))])
+    store = DiskEmbeddingStore(str(tmp_path))
+    assert store.get("c") is None
+    np.testing.assert_array_equal(store.get("b"), vec(2))
+    np.testing.assert_array_equal(store.get("d"), vec(4))
+
+def test_single_text_result_does_not_alias_cache(tmp_path):
+    cache = EmbeddingCache("test-model", disk_enabled=False)
+    model = HashingEmbeddingModel()
+    first = cache.encode(model, "拿铁")
+    expected = first.copy()
+    first *= 0
+    np.testing.assert_array_equal(cache.encode(model, "拿铁"), expected)
+    cached = cache.encode(model, "拿铁")
+    cached /= 2
+    np.testing.assert_array_equal(cache.encode(model, "拿铁"), expected)
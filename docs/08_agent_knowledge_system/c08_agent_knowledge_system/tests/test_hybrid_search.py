@@ -0,0 +1,46 @@
+import pytest
+from knowledge_manager import reciprocal_rank_fusion
+
+DOCS = {
+    "deploy.txt": "部署前需要安装Python3.8以上版本。服务默认监听8080端口。",
+    "memory.txt": "结构化记忆按用户和类型筛选。过期记忆由后台线程清理。",
+    "search.txt": "混合检索同时使用向量检索和BM25关键词检索。两路结果按倒数排名融合。",
+}
+
+@pytest.fixture
+def knowledge_base(knowledge_manager, workdir):
+    for name, text in DOCS.items():
+        path = workdir / name
+        path.write_text(text, encoding="utf-8")
+        assert knowledge_manager.add_document(str(path))
+    return knowledge_manager
+
+def test_rrf_ranks_items_found_by_both_channels_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [item for item, _ in fused] == ["b", "a", "d", "c"]
+    assert dict(fused)["b"] == pytest.approx(1 / 62 + 1 / 61)
+
+def test_rrf_only_uses_ranks():
+    # 名次相同则得分相同，与各路原始得分的量纲无关
+    assert reciprocal_rank_fusion([["x"], []]) == reciprocal_rank_fusion([[], ["x"]])
+
+def test_hybrid_search_fuses_both_channels(knowledge_base):
+    results = knowledge_base.hybrid_search("BM25关键词检索", top_k=2)
+    assert results[0]["metadata"]["source"].endswith("search.txt")
+    assert all(r["content"] for r in results)
+    stats = knowledge_base.last_search_stats
+    assert stats["dense_candidates"] > 0 and stats["keyword_candidates"] > 0
+    assert not stats["degraded"]
+
+def test_hybrid_search_degrades_to_remaining_channel(knowledge_base, monkeypatch, capsys):
+    vector_db = knowledge_base.vector_db
+    def broken(*args, **kwargs):
+        raise RuntimeError("索引损坏")
+    monkeypatch.setattr(vector_db, "keyword_search_knowledge", broken)
+    dense_ids = [r["id"] for r in vector_db.dense_search_knowledge("端口", top_k=3)]
+    assert [r["id"] for r in knowledge_base.hybrid_search("端口", top_k=3)] == dense_ids
+    assert knowledge_base.last_search_stats["degraded"]
+    assert "关键词检索失败" in capsys.readouterr().out
+    # 降级结果不完整，不写入缓存
+    assert "端口" in knowledge_base.search_knowledge("端口", mode="hybrid")
+    assert vector_db.knowledge_cache.stats()["items"] == 0
@@ -0,0 +1,98 @@
+import os
+import pytest
+
+def seed_legacy_chunks(vector_db, source, contents):
+    """按建立入库清单之前的方式写入片段：清单中没有记录，片段ID与当前方案不同"""
+    ids = [f"legacy-{i}" for i in range(len(contents))]
+    vector_db.knowledge_collection.upsert(
+        ids=ids,
+        embeddings=vector_db.encode(contents).tolist(),
+        documents=contents,
+        metadatas=[{"source": source, "chunk_num": i + 1} for i in range(len(contents))]
+    )
+    vector_db.knowledge_keywords.add(ids, contents, group=source)
+    return ids
+
+def source_ids(vector_db, source):
+    return vector_db.knowledge_collection.get(where={"source": source})["ids"]
+
+@pytest.fixture
+def docs(workdir):
+    folder = workdir / "docs"
+    folder.mkdir()
+    (folder / "a.txt").write_text("服务默认监听8080端口。", encoding="utf-8")
+    (folder / "b.txt").write_text("过期记忆由后台线程清理。", encoding="utf-8")
+    return folder
+
+def test_first_batch_run_replaces_pre_manifest_chunks(knowledge_manager, docs):
+    vector_db = knowledge_manager.vector_db
+    source = os.path.join(str(docs), "a.txt")
+    legacy = seed_legacy_chunks(vector_db, source, ["服务默认监听8080端口。"])
+    assert knowledge_manager.add_batch_documents(str(docs))
+    ids = source_ids(vector_db, source)
+    assert ids and not set(ids) & set(legacy)
+    hits = vector_db.keyword_search_knowledge("8080", top_k=10)
+    assert [h["metadata"]["source"] for h in hits] == [source]
+    assert [r["id"] for r in knowledge_manager.hybrid_search("8080", top_k=10)].count(ids[0]) == 1
+    assert len(knowledge_manager.hybrid_search("8080端口", top_k=10)) == vector_db.knowledge_collection.count() == 2
+
+def test_legacy_chunks_under_a_different_path_spelling_are_replaced(knowledge_manager, docs, workdir):
+    vector_db = knowledge_manager.vector_db
+    legacy_source = os.path.join(".", os.path.relpath(str(docs / "a.txt"), str(workdir)))
+    seed_legacy_chunks(vector_db, legacy_source, ["服务默认监听8080端口。"])
+    assert knowledge_manager.add_batch_documents(str(docs))
+    assert source_ids(vector_db, legacy_source) == []
+    assert vector_db.knowledge_collection.count() == 2
+
+def test_add_document_replaces_pre_manifest_chunks(knowledge_manager, docs):
+    vector_db = knowledge_manager.vector_db
+    source = str(docs / "a.txt")
+    legacy = seed_legacy_chunks(vector_db, source, ["服务默认监听8080端口。", "旧版本的片段"])
+    assert knowledge_manager.add_document(source)
+    ids = source_ids(vector_db, source)
+    assert ids and not set(ids) & set(legacy)
+    assert vector_db.keyword_search_knowledge("旧版本的片段") == []
+
+def run_batch(knowledge_manager, folder, capsys):
+    capsys.readouterr()
+    assert knowledge_manager.add_batch_documents(str(folder))
+    return [line for line in capsys.readouterr().out.splitlines() if line.startswith("入库计划")][0]
+
+def test_unchanged_files_are_skipped(knowledge_manager, docs, capsys):
+    assert run_batch(knowledge_manager, docs, capsys) == "入库计划：新增 2，修改 0，移除 0，未变化 0"
+    ids = knowledge_manager.vector_db.knowledge_collection.get()["ids"]
+    assert run_batch(knowledge_manager, docs, capsys) == "入库计划：新增 0，修改 0，移除 0，未变化 2"
+    assert knowledge_manager.vector_db.knowledge_collection.get()["ids"] == ids
+
+def test_touched_file_with_same_content_only_updates_manifest(knowledge_manager, docs, capsys, monkeypatch):
+    run_batch(knowledge_manager, docs, capsys)
+    path = docs / "a.txt"
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    def fail(*args, **kwargs):
+        raise AssertionError("内容未变化的文件不应重新入库")
+    monkeypatch.setattr(knowledge_manager.vector_db, "store_knowledge_chunks", fail)
+    assert run_batch(knowledge_manager, docs, capsys) == "入库计划：新增 0，修改 0，移除 0，未变化 2"
+    size, mtime_ns, _ = knowledge_manager.manifest.entries_in(str(docs))[str(path)]
+    assert mtime_ns == stat.st_mtime_ns + 10**9
+    # 清单已更新：再次运行按大小和修改时间直接跳过
+    assert run_batch(knowledge_manager, docs, capsys) == "入库计划：新增 0，修改 0，移除 0，未变化 2"
+
+def test_modified_file_is_rebuilt(knowledge_manager, docs, capsys):
+    run_batch(knowledge_manager, docs, capsys)
+    vector_db = knowledge_manager.vector_db
+    path = docs / "a.txt"
+    path.write_text("服务改为监听9090端口。", encoding="utf-8")
+    assert run_batch(knowledge_manager, docs, capsys) == "入库计划：新增 0，修改 1，移除 0，未变化 1"
+    contents = vector_db.knowledge_collection.get(where={"source": str(path)})["documents"]
+    assert contents == ["服务改为监听9090端口。"]
+    assert vector_db.keyword_search_knowledge("8080") == []
+
+def test_deleted_file_is_removed(knowledge_manager, docs, capsys):
+    run_batch(knowledge_manager, docs, capsys)
+    vector_db = knowledge_manager.vector_db
+    path = docs / "b.txt"
+    os.remove(path)
+    assert run_batch(knowledge_manager, docs, capsys) == "入库计划：新增 0，修改 0，移除 1，未变化 1"
+    assert source_ids(vector_db, str(path)) == []
+    assert str(path) not in knowledge_manager.manifest.entries_in(str(docs))
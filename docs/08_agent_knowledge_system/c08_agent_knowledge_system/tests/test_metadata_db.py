@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import time
+from structured_memory import MemoryMetadataDB, METADATA_MIGRATIONS
+from config import SQLITE_DB_PATH
+
+def create_legacy_db(path, rows):
+    """按改造前的方式建库：无user_version，时间为本地时间字符串"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(METADATA_MIGRATIONS[0][1][0])
+    conn.executemany(
+        "INSERT INTO memory_metadata (content_hash, type, create_time, user_id, weight, expire_time) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+def local_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+def test_legacy_db_is_migrated_in_place(workdir):
+    now = int(time.time())
+    create_legacy_db(SQLITE_DB_PATH, [
+        ("live", "preference", local_time(now - 3600), "u1", 1.5, local_time(now + 86400)),
+        ("expired", "preference", local_time(now - 7200), "u1", 1.0, local_time(now - 60)),
+    ])
+    db = MemoryMetadataDB(SQLITE_DB_PATH)
+    try:
+        assert db.schema_version == METADATA_MIGRATIONS[-1][0]
+        rows = db.pool.fetchall("SELECT content_hash, create_time, weight, expire_time FROM memory_metadata ORDER BY id")
+        assert rows == [("live", now - 3600, 1.5, now + 86400), ("expired", now - 7200, 1.0, now - 60)]
+        assert db.filter_by_metadata("u1") == ["live"]
+        assert db.get_expired_batch(now, 10) == ["expired"]
+        indexes = {r[0] for r in db.pool.fetchall("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_metadata_user_expire", "idx_metadata_user_type_create", "idx_metadata_expire"} <= indexes
+    finally:
+        db.close()
+
+def test_migration_runs_once(workdir):
+    db = MemoryMetadataDB(SQLITE_DB_PATH)
+    db.add_metadata("h1", "preference", "u1", create_time=1000)
+    db.close()
+    # 已是最新版本：重新打开不再执行迁移，数据保持不变
+    db = MemoryMetadataDB(SQLITE_DB_PATH)
+    try:
+        assert db.schema_version == METADATA_MIGRATIONS[-1][0]
+        assert db.pool.fetchall("SELECT content_hash, create_time FROM memory_metadata") == [("h1", 1000)]
+    finally:
+        db.close()
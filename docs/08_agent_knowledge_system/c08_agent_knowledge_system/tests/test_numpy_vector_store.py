@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from numpy_vector_store import NumpyVectorClient
+
+def make_collection(tmp_path, metadata=None):
+    collection = NumpyVectorClient(str(tmp_path)).get_or_create_collection("test", metadata)
+    rng = np.random.default_rng(0)
+    collection.upsert(
+        ids=[f"id{i}" for i in range(10)],
+        embeddings=rng.standard_normal((10, 8)).astype(np.float32).tolist(),
+        documents=[f"doc{i}" for i in range(10)],
+        metadatas=[{"source": "a" if i < 5 else "b"} for i in range(10)]
+    )
+    return collection
+
+def test_delete_without_filter_raises(tmp_path):
+    collection = make_collection(tmp_path)
+    with pytest.raises(ValueError):
+        collection.delete()
+    assert collection.count() == 10
+
+def test_delete_by_ids_and_where(tmp_path):
+    collection = make_collection(tmp_path)
+    collection.delete(ids=["id0"])
+    collection.delete(where={"source": "b"})
+    assert sorted(collection.get()["ids"]) == ["id1", "id2", "id3", "id4"]
+
+def test_index_parameters_default_to_config(tmp_path):
+    from config import IVF_NPROBE, IVF_NLIST, IVF_MIN_VECTORS
+    collection = make_collection(tmp_path, {"vector_index": "ivf"})
+    assert (collection.nprobe, collection.ivf_nlist, collection.ivf_min_vectors) == (IVF_NPROBE, IVF_NLIST, IVF_MIN_VECTORS)
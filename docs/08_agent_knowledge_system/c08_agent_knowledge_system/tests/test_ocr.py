@@ -0,0 +1,33 @@
+import ocr
+from ocr import OCRCache, ImageOCR
+from config import OCR_CACHE_PATH
+
+def fake_ocr(payload, lang):
+    return f"{payload[0].decode()}:{lang}"
+
+def test_cache_is_keyed_by_lang(workdir):
+    cache = OCRCache(OCR_CACHE_PATH)
+    try:
+        cache.put_many([("h1", "english text")], "eng")
+        assert cache.get_many(["h1"], "eng") == {"h1": "english text"}
+        assert cache.get_many(["h1"], "chi_sim") == {}
+    finally:
+        cache.close()
+
+def test_changing_lang_recognizes_again(workdir, monkeypatch):
+    monkeypatch.setattr(ocr, "ocr_payload", fake_ocr)
+    payloads = [("h1", (b"logo", "L", (1, 1))), ("h1", (b"logo", "L", (1, 1)))]
+    eng = ImageOCR(workers=1, lang="eng")
+    try:
+        assert eng.recognize(payloads) == ["logo:eng", "logo:eng"]
+        assert eng.stats["recognized"] == 1 and eng.stats["duplicates"] == 1
+    finally:
+        eng.close()
+    chi = ImageOCR(workers=1, lang="chi_sim")
+    try:
+        assert chi.recognize(payloads[:1]) == ["logo:chi_sim"]
+        assert chi.stats["cache_hits"] == 0
+        assert chi.recognize(payloads[:1]) == ["logo:chi_sim"]
+        assert chi.stats["cache_hits"] == 1
+    finally:
+        chi.close()
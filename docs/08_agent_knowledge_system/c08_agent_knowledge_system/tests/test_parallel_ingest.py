@@ -0,0 +1,34 @@
+from model_registry import loaded_resources
+from ingest_manifest import IngestManifest
+from parallel_ingest import ParallelIngestor
+from text_splitter import FastTokenizer, get_tokenizer
+from config import INGEST_PARALLEL_MIN_FILES, INGEST_MANIFEST_PATH
+
+def test_get_tokenizer_loads_only_tokenizer(local_tokenizer):
+    tokenizer = get_tokenizer(str(local_tokenizer))
+    assert isinstance(tokenizer, FastTokenizer)
+    assert len(tokenizer.encode("a b c")) == 5
+    assert str(local_tokenizer) not in loaded_resources()["embedding_models"]
+
+def test_pool_path_ingests_all_files(vector_db, local_tokenizer, workdir):
+    docs = workdir / "docs"
+    docs.mkdir()
+    files = []
+    for i in range(INGEST_PARALLEL_MIN_FILES + 2):
+        path = docs / f"doc{i}.txt"
+        path.write_text(f"文档{i}的第一句话，内容足够长。文档{i}的第二句话也足够长。", encoding="utf-8")
+        files.append((str(path), None))
+    ingestor = ParallelIngestor(vector_db, IngestManifest(INGEST_MANIFEST_PATH), workers=2)
+    try:
+        succeeded = ingestor.ingest(files)
+        assert sorted(succeeded) == sorted(path for path, _ in files)
+        assert ingestor.last_ingest_stats["workers"] == 2
+        # 解析子进程只加载了分词器，没有加载嵌入模型
+        worker_resources = ingestor._get_executor().submit(loaded_resources).result()
+        assert worker_resources["embedding_models"] == []
+        # 解析子进程内OCR串行识别，不再各开一个OCR进程池
+        assert worker_resources["image_ocr_options"] == {"workers": 1}
+    finally:
+        ingestor.close()
+    sources = {m["source"] for m in vector_db.knowledge_collection.get()["metadatas"]}
+    assert sources == {path for path, _ in files}
@@ -0,0 +1,70 @@
+import numpy as np
+import query_cache
+from query_cache import QueryResultCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(query_cache, "time", clock)
+    cache = QueryResultCache(max_items=8, ttl=60)
+    cache.put("dense", "端口", 5, "结果", {"a.txt"})
+    clock.now += 59
+    assert cache.get("dense", "端口", 5) == "结果"
+    clock.now += 1
+    assert cache.get("dense", "端口", 5) is None
+    assert cache.stats()["items"] == 0
+
+def test_key_normalizes_query_and_separates_mode_and_top_k():
+    cache = QueryResultCache(max_items=8, ttl=60)
+    cache.put("dense", "Default  Port", 5, "结果", {"a.txt"})
+    assert cache.get("dense", "default port", 5) == "结果"
+    assert cache.get("hybrid", "default port", 5) is None
+    assert cache.get("dense", "default port", 3) is None
+
+def test_lru_evicts_least_recently_used():
+    cache = QueryResultCache(max_items=2, ttl=60)
+    cache.put("dense", "q1", 5, "r1", {"a.txt"})
+    cache.put("dense", "q2", 5, "r2", {"b.txt"})
+    assert cache.get("dense", "q1", 5) == "r1"
+    cache.put("dense", "q3", 5, "r3", {"c.txt"})
+    assert cache.get("dense", "q2", 5) is None
+    assert cache.get("dense", "q1", 5) == "r1"
+    assert cache.get("dense", "q3", 5) == "r3"
+    # 被淘汰条目的来源索引一并移除
+    assert "b.txt" not in cache._by_source
+
+def test_invalidate_sources_only_drops_referencing_entries():
+    cache = QueryResultCache(max_items=8, ttl=60)
+    cache.put("dense", "q1", 5, "r1", {"a.txt"})
+    cache.put("dense", "q2", 5, "r2", {"a.txt", "b.txt"})
+    cache.put("dense", "q3", 5, "r3", {"b.txt"})
+    assert cache.invalidate_sources({"a.txt"}) == 2
+    assert cache.get("dense", "q1", 5) is None
+    assert cache.get("dense", "q2", 5) is None
+    assert cache.get("dense", "q3", 5) == "r3"
+    assert cache.stats()["invalidations"] == 2
+
+def test_semantic_lookup_reuses_close_query():
+    cache = QueryResultCache(max_items=8, ttl=60, semantic_threshold=0.95)
+    cache.put("dense", "默认端口", 5, "结果", {"a.txt"}, np.array([1.0, 0.0], dtype=np.float32))
+    assert cache.get("dense", "默认端口是多少", 5, np.array([0.99, 0.05], dtype=np.float32)) == "结果"
+    assert cache.get("dense", "过期清理", 5, np.array([0.0, 1.0], dtype=np.float32)) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_document_changes_invalidate_cached_retrieval(vector_db, workdir):
+    path = workdir / "deploy.txt"
+    path.write_text("服务默认监听8080端口。", encoding="utf-8")
+    chunks = [{"content": "服务默认监听8080端口。", "metadata": {"source": str(path)}}]
+    assert vector_db.add_knowledge_document(str(path), chunks)
+    first = vector_db.retrieve_knowledge("端口")
+    assert vector_db.retrieve_knowledge("端口") == first
+    assert vector_db.knowledge_cache.stats()["hits"] == 1
+    assert vector_db.delete_knowledge_document(str(path))
+    assert vector_db.knowledge_cache.stats()["items"] == 0
+    assert "8080" not in vector_db.retrieve_knowledge("端口")
@@ -0,0 +1,41 @@
+import time
+from structured_memory import MemoryMetadataDB, build_memory_metadata
+from config import SQLITE_DB_PATH
+
+def put_memory(vector_db, memory_id, content, user_id="u1", memory_type="preference", created_days_ago=0, expires_in_days=30):
+    now = int(time.time())
+    create_time = now - created_days_ago * 86400
+    vector_db.memory_collection.upsert(
+        ids=[memory_id],
+        embeddings=[vector_db.encode(content).tolist()],
+        documents=[content],
+        metadatas=[build_memory_metadata(user_id, memory_type, create_time, now + expires_in_days * 86400)]
+    )
+    vector_db.memory_keywords.add([memory_id], [content], group=user_id)
+
+def test_keyword_search_memory_applies_memory_filter(vector_db):
+    put_memory(vector_db, "live", "我喜欢喝无糖拿铁")
+    put_memory(vector_db, "expired", "我喜欢喝全糖拿铁", expires_in_days=-1)
+    put_memory(vector_db, "task", "拿铁咖啡订单已完成", memory_type="task")
+    put_memory(vector_db, "old", "以前喜欢拿铁加奶", created_days_ago=10)
+    put_memory(vector_db, "other_user", "我也喜欢拿铁", user_id="u2")
+
+    ids = {m["memory_id"] for m in vector_db.keyword_search_memory("拿铁", "u1", top_k=10)}
+    assert ids == {"live", "task", "old"}
+    ids = {m["memory_id"] for m in vector_db.keyword_search_memory("拿铁", "u1", memory_type="preference", days=3, top_k=10)}
+    assert ids == {"live"}
+
+def test_keyword_search_memory_fills_top_k_past_expired_hits(vector_db):
+    for i in range(20):
+        put_memory(vector_db, f"expired{i}", "拿铁 拿铁 拿铁 过期", expires_in_days=-1)
+    put_memory(vector_db, "live", "拿铁")
+    assert [m["memory_id"] for m in vector_db.keyword_search_memory("拿铁", "u1", top_k=1)] == ["live"]
+
+def test_sync_memory_metadata_is_quiet_when_nothing_to_backfill(vector_db, capsys):
+    metadata_db = MemoryMetadataDB(SQLITE_DB_PATH)
+    try:
+        assert vector_db.sync_memory_metadata(metadata_db) == 0
+        assert vector_db.sync_memory_metadata(metadata_db) == 0
+    finally:
+        metadata_db.close()
+    assert "回填" not in capsys.readouterr().out
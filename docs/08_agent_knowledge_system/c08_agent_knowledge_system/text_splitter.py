@@ -1,6 +1,99 @@
+import os
 import re
-from sentence_transformers import SentenceTransformer
-from config import MAX_CHUNK_TOKENS
+import threading
+from collections import OrderedDict
+from model_registry import get_embedding_model, loaded_resources
+from config import MAX_CHUNK_TOKENS, TOKEN_COUNT_CACHE_SIZE
+
+SENTENCE_ENDINGS = "。！？；.!?;"  # 句末标点（中英文）
+
+# ====================== 句子token数缓存 ======================
+class TokenCountCache:
+    def __init__(self, max_items=TOKEN_COUNT_CACHE_SIZE):
+        """
+        句子 -> token数的LRU缓存：页眉页脚、版权声明等样板句子在文档间反复出现，不必重复分词
+        :param max_items: 最大缓存句子数（0为关闭）
+        """
+        self.max_items = max_items
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, sentences):
+        """批量查缓存，未命中的位置为None"""
+        with self._lock:
+            counts = []
+            for sentence in sentences:
+                count = self._counts.get(sentence)
+                if count is not None:
+                    self._counts.move_to_end(sentence)
+                counts.append(count)
+            return counts
+
+    def put_many(self, items):
+        if not self.max_items:
+            return
+        with self._lock:
+            for sentence, count in items:
+                self._counts[sentence] = count
+                self._counts.move_to_end(sentence)
+            while len(self._counts) > self.max_items:
+                self._counts.popitem(last=False)
+
+# 同一模型的所有分割器共享一份缓存（解析器按文件新建分割器）
+_token_count_caches = {}
+_caches_lock = threading.Lock()
+
+def get_token_count_cache(model_name):
+    with _caches_lock:
+        cache = _token_count_caches.get(model_name)
+        if cache is None:
+            cache = _token_count_caches[model_name] = TokenCountCache()
+        return cache
+
+# ====================== 计数用分词器 ======================
+class FastTokenizer:
+    """tokenizers库分词器的适配：提供与HuggingFace分词器一致的 encode / 批量调用接口（含特殊token）"""
+    def __init__(self, tokenizer):
+        # tokenizer.json 里可能带有截断/填充配置（如截断到128），计数时需要完整长度
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        self._tokenizer = tokenizer
+
+    def encode(self, text, add_special_tokens=True):
+        return self._tokenizer.encode(text, add_special_tokens=add_special_tokens).ids
+
+    def __call__(self, texts, add_special_tokens=True, **kwargs):
+        encodings = self._tokenizer.encode_batch(texts, add_special_tokens=add_special_tokens)
+        return {"input_ids": [encoding.ids for encoding in encodings]}
+
+def _load_fast_tokenizer(model_name):
+    """只加载分词器：本地模型目录读取其中的tokenizer.json，否则从模型仓库获取（与SentenceTransformer的名称解析一致）"""
+    from tokenizers import Tokenizer
+    if os.path.isdir(model_name):
+        return FastTokenizer(Tokenizer.from_file(os.path.join(model_name, "tokenizer.json")))
+    repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return FastTokenizer(Tokenizer.from_pretrained(repo_id))
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+def get_tokenizer(model_name):
+    """
+    获取计数用分词器（同一模型在进程内只加载一次）：嵌入模型已加载时直接复用它的分词器；
+    否则只加载分词器，不导入transformers、不加载编码器权重（解析子进程只需计数token）；加载失败时退回加载完整模型
+    """
+    if model_name in loaded_resources()["embedding_models"]:
+        return get_embedding_model(model_name).tokenizer
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(model_name)
+        if tokenizer is None:
+            try:
+                tokenizer = _load_fast_tokenizer(model_name)
+            except Exception as e:
+                print(f"单独加载分词器失败，改为加载嵌入模型：{e}")
+                tokenizer = get_embedding_model(model_name).tokenizer
+            _tokenizers[model_name] = tokenizer
+        return tokenizer
 
 class TextSplitter:
     def __init__(self, model_name="all-MiniLM-L6-v2", max_chunk_tokens=None, tokenizer=None):
@@ -11,42 +104,80 @@ class TextSplitter:
         :param tokenizer: 自定义tokenizer
         """
         self.max_chunk_tokens = max_chunk_tokens or MAX_CHUNK_TOKENS
-        self.model = SentenceTransformer(model_name)
-        self.tokenizer = tokenizer if tokenizer else self.model.tokenizer
+        # 分割只需要计数token，不加载编码器（解析子进程中每个进程都要创建分割器）
+        self.tokenizer = tokenizer if tokenizer else get_tokenizer(model_name)
+        self.count_cache = TokenCountCache() if tokenizer else get_token_count_cache(model_name)
+        # 每个句子单独编码时附加的特殊token数（如[CLS]/[SEP]）
+        self._special_tokens = len(self.tokenizer.encode(""))
 
     def _split_by_sentences(self, text):
         """按句子分割文本"""
         # 适配中英文标点
-        sentence_pattern = r'(?<=[。！？；\.\!\?;])\s*'
+        sentence_pattern = rf'(?<=[{re.escape(SENTENCE_ENDINGS)}])\s*'
         sentences = re.split(sentence_pattern, text)
         # 过滤空句子
         sentences = [s.strip() for s in sentences if s.strip()]
         return sentences
 
-    def _merge_sentences(self, sentences):
-        """合并句子为固定长度片段"""
+    def last_sentence_end(self, text):
+        """
+        文本中最后一个句子边界之后的位置（流式读取时在此切开，余下部分留到下一个缓冲区）
+        没有句末标点时退到最后一个换行（日志等），都没有时返回0
+        """
+        end = max(text.rfind(mark) for mark in SENTENCE_ENDINGS)
+        if end < 0:
+            end = text.rfind("\n")
+        return end + 1
+
+    def _token_upper_bound(self, sentence):
+        """
+        token数上界（不调用tokenizer）：每个token至少对应一个UTF-8字节，
+        另按空白分词的词数加一次余量（SentencePiece类分词器会给词首单独加前缀token）
+        """
+        return len(sentence.encode("utf-8")) + len(sentence.split()) + self._special_tokens
+
+    def _count_tokens(self, sentences):
+        """精确计算每个句子的token数：先查缓存，未命中的句子去重后一次批量分词"""
+        counts = self.count_cache.get_many(sentences)
+        misses = list(dict.fromkeys(s for s, count in zip(sentences, counts) if count is None))
+        if misses:
+            if callable(self.tokenizer):
+                # HuggingFace分词器批量调用（与逐句encode的结果一致，含特殊token）
+                token_ids = self.tokenizer(misses, add_special_tokens=True)["input_ids"]
+            else:
+                token_ids = [self.tokenizer.encode(s) for s in misses]
+            computed = {s: len(ids) for s, ids in zip(misses, token_ids)}
+            self.count_cache.put_many(computed.items())
+            counts = [computed[s] if count is None else count for s, count in zip(sentences, counts)]
+        return counts
+
+    def _merge_sentences(self, sentences, max_chunk_tokens=None):
+        """合并句子为固定长度片段（max_chunk_tokens不传时用分割器的上限）"""
+        max_chunk_tokens = max_chunk_tokens or self.max_chunk_tokens
+        # 快速路径：按字节数估计的上界都放得进一个片段时，结果必然是整段合并，无需分词
+        if sum(self._token_upper_bound(s) for s in sentences) <= max_chunk_tokens:
+            return ["".join(sentences)]
         chunks = []
         current_chunk = []
         current_length = 0
 
-        for sentence in sentences:
-            sentence_tokens = len(self.tokenizer.encode(sentence))
+        for sentence, sentence_tokens in zip(sentences, self._count_tokens(sentences)):
             # 超过阈值则保存当前片段
-            if current_length + sentence_tokens > self.max_chunk_tokens and current_chunk:
+            if current_length + sentence_tokens > max_chunk_tokens and current_chunk:
                 chunks.append("".join(current_chunk))
                 current_chunk = [sentence]
                 current_length = sentence_tokens
             else:
                 current_chunk.append(sentence)
                 current_length += sentence_tokens
-        
+
         # 保存最后一个片段
         if current_chunk:
             chunks.append("".join(current_chunk))
         return chunks
 
-    def split_text(self, text):
-        """核心分割方法"""
+    def split_text(self, text, max_chunk_tokens=None):
+        """核心分割方法（max_chunk_tokens：本次分割的片段上限，调用方要给片段加前缀时传入扣除后的值）"""
         if not text or len(text) < 10:
             return []
         # 1. 按句子分割
@@ -54,7 +185,7 @@ class TextSplitter:
         if not sentences:
             return []
         # 2. 合并句子
-        chunks = self._merge_sentences(sentences)
+        chunks = self._merge_sentences(sentences, max_chunk_tokens)
         # 3. 过滤过短片段
         chunks = [chunk for chunk in chunks if len(chunk) > 10]
-        return chunks
\ No newline at end of file
+        return chunks
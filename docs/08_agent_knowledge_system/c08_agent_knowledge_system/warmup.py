@@ -0,0 +1,47 @@
+import time
+import threading
+
+# ====================== 后台预热 ======================
+class AgentWarmup:
+    def __init__(self, agent_factory):
+        """
+        后台预热：在命令行等待输入期间创建智能体（加载模型、打开向量库、预跑一次编码）
+        :param agent_factory: 无参函数，返回智能体实例
+        """
+        self.agent_factory = agent_factory
+        self.agent = None
+        self.error = None
+        self.elapsed = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            agent = self.agent_factory()
+            # 预跑一次编码，触发模型权重和分词器的首次初始化
+            if agent.vector_db.use_vector_db:
+                agent.vector_db.encode("warmup")
+            self.agent = agent
+        except Exception as e:
+            self.error = e
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self._ready.set()
+
+    def start(self):
+        """启动后台预热线程"""
+        self._thread = threading.Thread(target=self._run, name="agent-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def get(self):
+        """获取智能体（预热未完成时阻塞等待）"""
+        if self._thread is None:
+            self._run()
+        if not self._ready.is_set():
+            print("正在加载模型和知识库，请稍候...")
+        self._ready.wait()
+        if self.error:
+            raise self.error
+        return self.agent
@@ -0,0 +1,61 @@
+import threading
+from config import WEIGHT_FLUSH_INTERVAL, WEIGHT_FLUSH_THRESHOLD
+
+# ====================== 权重写缓冲 ======================
+class WeightUpdateBuffer:
+    def __init__(self, flush_fn, interval=WEIGHT_FLUSH_INTERVAL, max_pending=WEIGHT_FLUSH_THRESHOLD):
+        """
+        权重写缓冲：在内存中累加增量，由后台线程批量落盘
+        :param flush_fn: 落盘函数，接收 {content_hash: 累计增量}
+        :param interval: 定时落盘间隔（秒）
+        :param max_pending: 待落盘条数达到该值时立即唤醒落盘
+        """
+        self._flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="weight-flusher", daemon=True)
+        self._thread.start()
+
+    def add(self, content_hash, delta):
+        """累加一次权重增量（不触碰磁盘）"""
+        with self._lock:
+            self._pending[content_hash] = self._pending.get(content_hash, 0.0) + delta
+            pending_count = len(self._pending)
+        if pending_count >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        """立即落盘全部待写增量，返回落盘条数"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            self._flush_fn(batch)
+            return len(batch)
+        except Exception as e:
+            print(f"权重批量落盘失败：{e}")
+            # 写回缓冲，等待下次落盘
+            with self._lock:
+                for content_hash, delta in batch.items():
+                    self._pending[content_hash] = self._pending.get(content_hash, 0.0) + delta
+            return 0
+
+    def _run(self):
+        """后台落盘循环：定时或达到阈值时唤醒"""
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """停止后台线程并落盘剩余增量"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 1)
+        self.flush()